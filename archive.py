@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from overload import overload_controller
+from services import archive_prayers_batch
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Prayers older than this many days are moved to the archive database, 0 disables archiving
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+
+# Hours between archiving runs
+ARCHIVE_INTERVAL_HOURS = 6
+
+# Prayers moved per transaction and the pause between transactions (in seconds),
+# so users' requests are served between the batches
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE = 0.1
+
+class ArchiveManager:
+    """
+    Keeps the hot prayers table small by moving old prayers to the archive
+    database in small background transactions. Feeds read the archive only
+    when a user pages past the hot prayers.
+    """
+
+    def __init__(self, archive_after_days=ARCHIVE_AFTER_DAYS, interval_hours=ARCHIVE_INTERVAL_HOURS):
+        self.archive_after_days = archive_after_days
+        self.interval_hours = interval_hours
+        self._task = None
+
+    async def start(self):
+        if self._task is None and self.archive_after_days > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def archive_old_prayers(self):
+        created_before = (datetime.now() - timedelta(days=self.archive_after_days)).isoformat()
+        total = 0
+        while True:
+            moved = archive_prayers_batch(created_before, ARCHIVE_BATCH_SIZE)
+            total += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(ARCHIVE_BATCH_PAUSE)
+            await overload_controller.wait_for_normal()
+        if total:
+            logger.info(f"Archived {total} prayers created before {created_before}")
+        return total
+
+    async def _run(self):
+        while True:
+            await overload_controller.wait_for_normal()
+            try:
+                await self.archive_old_prayers()
+            except Exception as e:
+                logger.error(f"Archiving failed: {str(e)}")
+            await asyncio.sleep(self.interval_hours * 3600)
+
+# Shared archive manager
+archive_manager = ArchiveManager()
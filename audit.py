@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime
+
+from services import save_audit_entries, fetch_audit_entries
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) pending entries are written to the database
+AUDIT_FLUSH_INTERVAL = 5.0
+
+# Pending entries are written earlier when there are this many of them
+AUDIT_FLUSH_THRESHOLD = 200
+
+# Actions recorded in the audit log and their labels in /audit
+ACTION_LABELS = {
+    'prayer_edit': 'Редагування молитви',
+    'prayer_delete': 'Видалення молитви',
+    'prayer_restore': 'Відновлення молитви',
+    'duplicates_merge': 'Обʼєднання дублікатів',
+    'whitelist_add': 'Додано користувача',
+    'whitelist_remove': 'Видалено користувача',
+    'admin_add': 'Додано адміністратора',
+    'admin_remove': 'Видалено адміністратора',
+    'category_add': 'Додано категорію',
+    'community_create': 'Створено спільноту',
+    'backup': 'Резервна копія',
+}
+
+class AuditLog:
+    """
+    Append-only log of changes made by admins, the bot owner and authors
+    of prayers.
+
+    Entries are kept in memory and written periodically in one transaction,
+    so recording an action never adds a commit to the handler that made it.
+    Prayer changes store content hashes of the text before and after.
+    """
+
+    def __init__(self, flush_interval=AUDIT_FLUSH_INTERVAL, flush_threshold=AUDIT_FLUSH_THRESHOLD):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = []
+        self._flush_requested = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Stop the periodic flush and write everything that is still pending
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.flush()
+
+    def record(self, community_id, actor_id, action, target_id=None, before_hash=None, after_hash=None, details=None):
+        self._pending.append((
+            community_id, actor_id, action, target_id, before_hash, after_hash, details,
+            datetime.now().isoformat()
+        ))
+        if len(self._pending) >= self.flush_threshold:
+            self._flush_requested.set()
+
+    def fetch(self, community_id, actor_id=None, limit=20):
+        # Write pending entries first so the latest actions are included
+        self.flush()
+        return fetch_audit_entries(community_id, actor_id, limit)
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            save_audit_entries(pending)
+        except Exception:
+            # Keep the entries in their order and try again on the next flush
+            self._pending = pending + self._pending
+            return
+        logger.info(f"Saved {len(pending)} audit entries")
+
+    async def _run(self):
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing audit entries: {str(e)}")
+
+# Shared audit log
+audit_log = AuditLog()
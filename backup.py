@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+from contextlib import suppress
+from datetime import datetime
+
+from database import DATABASE_PATH, get_connection
+from overload import overload_controller
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Directory for database snapshots
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+
+# Hours between scheduled backups, 0 disables them
+BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
+
+# Number of snapshots to keep
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+
+# Pages copied per backup step and the pause between steps (in seconds).
+# The database is locked only while a step runs, so writers are never blocked for long.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.05
+
+BACKUP_PREFIX = 'prayers-'
+ARCHIVE_BACKUP_PREFIX = 'archive-'
+BACKUP_SUFFIX = '.db.gz'
+
+# Check a database file, returns the integrity_check result ('ok' for a healthy database)
+def check_database(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        if result == 'ok' and not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prayers'"
+        ).fetchone():
+            result = 'prayers table is missing'
+        return result
+    finally:
+        conn.close()
+
+# List snapshots, newest first
+def list_backups(backup_dir=BACKUP_DIR, prefix=BACKUP_PREFIX):
+    return sorted(glob.glob(os.path.join(backup_dir, f'{prefix}*{BACKUP_SUFFIX}')), reverse=True)
+
+# Delete old snapshots, keeping the newest ones
+def rotate_backups(backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    for prefix in (BACKUP_PREFIX, ARCHIVE_BACKUP_PREFIX):
+        for path in list_backups(backup_dir, prefix)[keep:]:
+            logger.info(f"Removing old backup {path}")
+            os.remove(path)
+
+# Create a compressed snapshot of the live database (blocking, run it in a thread)
+def create_backup_sync(backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, source=None):
+    """
+    Copies the database with SQLite's online backup API in small page steps,
+    verifies the copy, compresses it and rotates old snapshots.
+
+    The bot's own connection is used as the source, so its writes made during
+    the backup are applied to the copy instead of restarting it.
+
+    The archive database is saved to a separate archive-* snapshot.
+
+    Returns:
+        Path of the new snapshot of the main database
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    source = source or get_connection()
+    has_archive = any(row[1] == 'archive' for row in source.execute('PRAGMA database_list'))
+
+    backup_path = _backup_database(source, 'main', os.path.join(backup_dir, f'{BACKUP_PREFIX}{timestamp}'))
+    if has_archive:
+        _backup_database(source, 'archive', os.path.join(backup_dir, f'{ARCHIVE_BACKUP_PREFIX}{timestamp}'))
+    rotate_backups(backup_dir, keep)
+    return backup_path
+
+# Copy one database of the connection to a verified, compressed snapshot
+def _backup_database(source, name, path_prefix):
+    copy_path = f'{path_prefix}.db.tmp'
+    backup_path = f'{path_prefix}{BACKUP_SUFFIX}'
+
+    started_at = datetime.now()
+    try:
+        target = sqlite3.connect(copy_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, name=name, sleep=BACKUP_STEP_SLEEP)
+        finally:
+            target.close()
+
+        result = check_database(copy_path)
+        if result != 'ok':
+            raise RuntimeError(f"Backup copy failed the integrity check: {result}")
+
+        with open(copy_path, 'rb') as src, gzip.open(backup_path + '.tmp', 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(backup_path + '.tmp', backup_path)
+    finally:
+        for path in (copy_path, backup_path + '.tmp'):
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    duration = (datetime.now() - started_at).total_seconds()
+    logger.info(f"Backup {backup_path} created in {duration:.1f}s ({os.path.getsize(backup_path)} bytes)")
+    return backup_path
+
+# Restore the database from a snapshot. The bot must be stopped.
+def restore_backup(backup_path, target_path=DATABASE_PATH):
+    """
+    Decompresses a snapshot, verifies it and replaces the database with it.
+    The current database is kept next to it with a .before-restore suffix.
+
+    Returns:
+        Path where the previous database was moved, or None if there was none
+    """
+    restored_path = target_path + '.restoring'
+    try:
+        opener = gzip.open if backup_path.endswith('.gz') else open
+        with opener(backup_path, 'rb') as src, open(restored_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        result = check_database(restored_path)
+        if result != 'ok':
+            raise RuntimeError(f"Backup {backup_path} failed the integrity check: {result}")
+
+        previous_path = None
+        if os.path.exists(target_path):
+            previous_path = f"{target_path}.before-restore-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            os.replace(target_path, previous_path)
+            # Journal files of the old database must not be applied to the restored one
+            for suffix in ('-wal', '-shm', '-journal'):
+                with suppress(FileNotFoundError):
+                    os.replace(target_path + suffix, previous_path + suffix)
+        os.replace(restored_path, target_path)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(restored_path)
+
+    logger.info(f"Database {target_path} restored from {backup_path}")
+    return previous_path
+
+class BackupManager:
+    """
+    Runs backups in a worker thread so the event loop keeps serving users,
+    one at a time, on demand and on a schedule.
+    """
+
+    def __init__(self, interval_hours=BACKUP_INTERVAL_HOURS):
+        self.interval_hours = interval_hours
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def create_backup(self):
+        async with self._lock:
+            return await asyncio.to_thread(create_backup_sync)
+
+    async def start(self):
+        if self._task is None and self.interval_hours > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_hours * 3600)
+            await overload_controller.wait_for_normal()
+            try:
+                await self.create_backup()
+            except Exception as e:
+                logger.error(f"Scheduled backup failed: {str(e)}")
+
+# Shared backup manager
+backup_manager = BackupManager()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    parser = argparse.ArgumentParser(description='Backup and restore of the prayers database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create', help='Create a snapshot of the database')
+    subparsers.add_parser('list', help='List snapshots, newest first')
+    # The archive database is restored with: restore archive-<time>.db.gz --target prayers_archive.db
+    restore_parser = subparsers.add_parser('restore', help='Restore the database from a snapshot (stop the bot first)')
+    restore_parser.add_argument('backup', help='Snapshot file, or "latest"')
+    restore_parser.add_argument('--target', default=DATABASE_PATH, help='Database file to restore')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        print(create_backup_sync())
+    elif args.command == 'list':
+        for prefix in (BACKUP_PREFIX, ARCHIVE_BACKUP_PREFIX):
+            for path in list_backups(prefix=prefix):
+                print(f"{path}\t{os.path.getsize(path)} bytes")
+    elif args.command == 'restore':
+        backup_path = args.backup
+        if backup_path == 'latest':
+            backups = list_backups()
+            if not backups:
+                sys.exit(f"No backups found in {BACKUP_DIR}")
+            backup_path = backups[0]
+        try:
+            previous_path = restore_backup(backup_path, args.target)
+        except Exception as e:
+            sys.exit(f"Restore failed: {e}")
+        print(f"Restored {args.target} from {backup_path}")
+        if previous_path:
+            print(f"The previous database was moved to {previous_path}")
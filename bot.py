@@ -1,35 +1,77 @@
 # bot.py
+import time
+
+# Measured before the heavy imports below, used by --startup-profile
+STARTUP_STARTED_AT = time.perf_counter()
 
 # Import necessary libraries
 from dotenv import load_dotenv
 import os
+import sys
+import json
+import hashlib
+import asyncio
+import argparse
 import logging
-import json_log_formatter
-from database import create_table, is_user_whitelisted
+from logs import setup_log_pipeline, LoggingContextMiddleware
+from tracing import tracer, span, TracingMiddleware, HandlerTracingMiddleware, BotRequestTracingMiddleware
+from database import create_table
+from config import ADMIN_USER_ID, ADMIN_USERNAME
+from communities import get_community_by_chat, get_private_community, is_community_admin
+from services import backfill_content_hashes, compress_existing_prayers, backfill_daily_stats
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.utils.token import TokenValidationError
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
-from handlers import register_handlers
+from handlers import register_handlers, resume_draft_previews, cancel_draft_previews, PrayerStates
+from lifecycle import lifecycle
+from sender import sender
+from reminders import reminder_scheduler
+from notifications import notification_manager
+from counters import prayed_counter
+from audit import audit_log
+from inline import INLINE_CACHE_TTL
+from backup import backup_manager
+from archive import archive_manager
+from purge import purge_manager
+from overload import overload_controller
+from scheduling import chat_scheduler, UPDATE_QUEUE_LIMIT
+from storage import fsm_storage
+from profiler import profiler, ProfilingMiddleware
+from callbacks import CallbackKind, decode_callback
 from aiogram.types import BotCommand, BotCommandScopeDefault, BotCommandScopeChat
 from aiogram.methods.set_chat_menu_button import SetChatMenuButton
 from aiogram.types import MenuButtonDefault
 from aiogram.filters import Filter
 from aiogram import BaseMiddleware
 from typing import Callable, Dict, Any, Awaitable, Union
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineQuery
 from aiogram.dispatcher.event.bases import CancelHandler
 
-# Admin user ID
-ADMIN_USER_ID = 282269567
+# Get logger, replaced by the root logger of the log pipeline when the bot is started
+logger = logging.getLogger(__name__)
+
+# Startup phases as (name, finished at) pairs, printed with --startup-profile
+startup_phases = [('imports', time.perf_counter())]
+
+# File with the hash of the last successfully applied commands and menu button setup
+BOT_SETUP_CACHE_FILE = os.getenv('BOT_SETUP_CACHE_FILE', '.bot_setup_cache')
 
-# Custom filter for admin commands
+# Set DROP_PENDING_UPDATES=false to keep updates queued while the bot was restarting
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'true').lower() in ('1', 'true', 'yes')
+
+# Custom filter for admin commands, admins are per community (see WhitelistMiddleware)
 class AdminFilter(Filter):
-    async def __call__(self, message: Message) -> bool:
+    def __init__(self, owner_only=False):
+        self.owner_only = owner_only
+
+    async def __call__(self, message: Message, community=None) -> bool:
         try:
             user_id = message.from_user.id
-            is_admin = user_id == ADMIN_USER_ID
+            if self.owner_only:
+                is_admin = user_id == ADMIN_USER_ID
+            else:
+                is_admin = community is not None and is_community_admin(community.id, user_id)
             
             if not is_admin:
                 logger.warning(f"Non-admin user {user_id} attempted to use admin command: {message.text}")
@@ -39,12 +81,13 @@ class AdminFilter(Filter):
             logger.error(f"Error in AdminFilter: {str(e)}")
             return False
 
-# Middleware for whitelist check
+# Middleware for whitelist check. It also finds the community of the update
+# and passes it to filters and handlers as the "community" argument.
 class WhitelistMiddleware(BaseMiddleware):
     async def __call__(
         self,
-        handler: Callable[[Union[Message, CallbackQuery]], Awaitable[Any]],
-        event: Union[Message, CallbackQuery],
+        handler: Callable[[Union[Message, CallbackQuery, InlineQuery]], Awaitable[Any]],
+        event: Union[Message, CallbackQuery, InlineQuery],
         data: Dict[str, Any]
     ) -> Any:
         # Get user info
@@ -52,19 +95,28 @@ class WhitelistMiddleware(BaseMiddleware):
         user_id = user.id
         username = user.username
         
-        # Always allow admin
-        if user_id == ADMIN_USER_ID:
+        # A group chat is a community of its own, every member of the group has access
+        chat = event.message.chat if isinstance(event, CallbackQuery) and event.message else getattr(event, 'chat', None)
+        if chat is not None and chat.type != 'private':
+            with span('middleware whitelist'):
+                community = get_community_by_chat(chat.id)
+            if community is None:
+                # The bot was not connected to this group (see handlers.bot_added_to_group)
+                return None
+            data['community'] = community
             return await handler(event, data)
         
-        # Check if user is in whitelist
-        if not is_user_whitelisted(user_id, username):
+        # In private chats and inline mode, the user's community (always found for the admin)
+        with span('middleware whitelist'):
+            community = get_private_community(user_id, username)
+        if community is None:
             logger.info(f"Access denied for user {user_id} ({username}): not in whitelist")
             
             try:
                 # Friendly message that access is not yet available
                 friendly_message = (
                     "🙏 Вітаю! Цей бот наразі доступний лише для обмеженого кола користувачів. "
-                    "Якщо ви хочете отримати доступ, будь ласка, зв'яжіться з @suberjin. "
+                    f"Якщо ви хочете отримати доступ, будь ласка, зв'яжіться з @{ADMIN_USERNAME}. "
                     "Дякуємо за розуміння!"
                 )
                 
@@ -74,6 +126,8 @@ class WhitelistMiddleware(BaseMiddleware):
                 elif isinstance(event, CallbackQuery):
                     await event.message.answer(friendly_message)
                     await event.answer()
+                elif isinstance(event, InlineQuery):
+                    await event.answer([], cache_time=INLINE_CACHE_TTL, is_personal=True)
             except Exception as e:
                 logger.error(f"Error sending access denied message: {str(e)}")
             
@@ -81,26 +135,240 @@ class WhitelistMiddleware(BaseMiddleware):
             return None
         
         # If user is whitelisted, proceed to the handler
+        data['community'] = community
         return await handler(event, data)
 
+# Token bucket settings per action: (burst capacity, refill rate in tokens per second)
+THROTTLE_RATES = {
+    'submit': (5, 5 / 60),   # 5 prayers at once, then 5 per minute
+    'page': (10, 1.0),       # pagination and category browsing
+    'edit': (6, 0.2),        # edit/delete buttons
+    'default': (20, 2.0),    # everything else (menus, commands, plain text)
+}
+
+# Identical callback_data from the same user within this window is ignored
+DEBOUNCE_WINDOW = 1.0
+
+# Minimal interval between "slow down" messages sent to the same user
+SLOWDOWN_NOTICE_INTERVAL = 10.0
+
+# Idle buckets older than this are dropped to keep memory bounded
+THROTTLE_IDLE_TTL = 600.0
+
+# Callback kinds grouped by throttling action
+PAGE_CALLBACK_KINDS = {
+    CallbackKind.PRAYERS_PAGE, CallbackKind.CATEGORY_PAGE, CallbackKind.MY_PRAYERS_PAGE,
+    CallbackKind.MY_CATEGORY_PAGE, CallbackKind.ALL_PRAYERS_CATEGORY, CallbackKind.MY_PRAYERS_CATEGORY,
+}
+EDIT_CALLBACK_KINDS = {
+    CallbackKind.EDIT, CallbackKind.EDIT_CATEGORY, CallbackKind.DELETE, CallbackKind.SUBSCRIBE, CallbackKind.UNSUBSCRIBE,
+    CallbackKind.EDIT_SEGMENT,
+}
+
+# Middleware for per-user flood protection
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, rates=None, debounce_window=DEBOUNCE_WINDOW):
+        self.rates = rates or THROTTLE_RATES
+        self.debounce_window = debounce_window
+        # (user_id, action) -> [tokens, last refill time]
+        self._buckets: Dict[tuple, list] = {}
+        # user_id -> (callback_data, time)
+        self._last_callbacks: Dict[int, tuple] = {}
+        # user_id -> time of the last "slow down" message
+        self._last_notices: Dict[int, float] = {}
+        self._last_cleanup = time.monotonic()
+
+    async def _get_action(self, event: Union[Message, CallbackQuery], data: Dict[str, Any]) -> str:
+        if isinstance(event, CallbackQuery):
+            callback = decode_callback(event.data)
+            if callback is None:
+                return 'default'
+            if callback.kind in PAGE_CALLBACK_KINDS:
+                return 'page'
+            if callback.kind in EDIT_CALLBACK_KINDS:
+                return 'edit'
+            # "Done" under a draft stores the prayer, parts of a draft are plain messages
+            if callback.kind == CallbackKind.DRAFT_DONE:
+                return 'submit'
+            return 'default'
+        
+        # A message in the expecting_prayer state is a part of a prayer draft
+        state = data.get('state')
+        if state is not None and await state.get_state() == PrayerStates.expecting_prayer.state:
+            return 'submit'
+        return 'default'
+
+    def _consume(self, user_id: int, action: str, now: float) -> bool:
+        capacity, refill_rate = self.rates.get(action, self.rates['default'])
+        bucket = self._buckets.get((user_id, action))
+        if bucket is None:
+            bucket = [capacity, now]
+            self._buckets[(user_id, action)] = bucket
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+            bucket[1] = now
+        
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _is_duplicate_callback(self, event: CallbackQuery, now: float) -> bool:
+        user_id = event.from_user.id
+        previous = self._last_callbacks.get(user_id)
+        self._last_callbacks[user_id] = (event.data, now)
+        return previous is not None and previous[0] == event.data and now - previous[1] < self.debounce_window
+
+    def _cleanup(self, now: float):
+        # Drop state of users that have been idle for a while
+        if now - self._last_cleanup < THROTTLE_IDLE_TTL:
+            return
+        self._last_cleanup = now
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < THROTTLE_IDLE_TTL}
+        self._last_callbacks = {key: value for key, value in self._last_callbacks.items() if now - value[1] < THROTTLE_IDLE_TTL}
+        self._last_notices = {key: value for key, value in self._last_notices.items() if now - value < THROTTLE_IDLE_TTL}
+
+    async def __call__(
+        self,
+        handler: Callable[[Union[Message, CallbackQuery]], Awaitable[Any]],
+        event: Union[Message, CallbackQuery],
+        data: Dict[str, Any]
+    ) -> Any:
+        user_id = event.from_user.id
+        now = time.monotonic()
+        self._cleanup(now)
+        
+        # Silently drop repeated taps on the same button
+        if isinstance(event, CallbackQuery) and self._is_duplicate_callback(event, now):
+            logger.debug(f"Duplicate callback {event.data} from user {user_id} ignored")
+            try:
+                await event.answer()
+            except Exception as e:
+                logger.error(f"Error answering duplicate callback: {str(e)}")
+            return None
+        
+        action = await self._get_action(event, data)
+        if self._consume(user_id, action, now):
+            return await handler(event, data)
+        
+        logger.warning(f"User {user_id} throttled on action '{action}'")
+        slow_down_message = "⏳ Забагато запитів. Будь ласка, зачекайте трохи та спробуйте знову."
+        try:
+            if isinstance(event, CallbackQuery):
+                # Answering the callback is required anyway, so the notice costs nothing extra
+                await event.answer(slow_down_message, show_alert=False)
+            elif now - self._last_notices.get(user_id, 0.0) >= SLOWDOWN_NOTICE_INTERVAL:
+                self._last_notices[user_id] = now
+                await event.answer(slow_down_message)
+        except Exception as e:
+            logger.error(f"Error sending slow down message: {str(e)}")
+        return None
+
 def setup_logging():
-    # Set up JSON logging
-    formatter = json_log_formatter.JSONFormatter()
-    json_handler = logging.StreamHandler()
-    json_handler.setFormatter(formatter)
-    logger = logging.getLogger()
-    logger.addHandler(json_handler)
-    logger.setLevel(logging.INFO)
-    return logger
+    # Set up JSON logging, records are written by a background thread (see logs.py)
+    return setup_log_pipeline()
+
+def mark_startup_phase(name):
+    startup_phases.append((name, time.perf_counter()))
+
+def format_startup_report():
+    lines = ["Startup profile:"]
+    previous = STARTUP_STARTED_AT
+    for name, finished_at in startup_phases:
+        lines.append(f"  {name:<16} {(finished_at - previous) * 1000:8.1f} ms")
+        previous = finished_at
+    lines.append(f"  {'total':<16} {(previous - STARTUP_STARTED_AT) * 1000:8.1f} ms")
+    return "\n".join(lines)
 
 def on_startup():
     # Log the start of the bot
     logger.info('Bot is starting')
     # Ensure the prayers table is created
     create_table()
-    # Register all handlers
+    backfill_content_hashes()
+    compress_existing_prayers()
+    backfill_daily_stats()
+    mark_startup_phase('database')
+
+def get_bot_setup_hash(bot_id, commands, admin_commands):
+    # Everything that affects the commands and menu button setup
+    payload = json.dumps({
+        'bot_id': bot_id,
+        'admin_user_id': ADMIN_USER_ID,
+        'commands': [command.model_dump() for command in commands],
+        'admin_commands': [command.model_dump() for command in admin_commands],
+        'menu_button': MenuButtonDefault().model_dump(),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
-async def main():
+def read_bot_setup_hash():
+    try:
+        with open(BOT_SETUP_CACHE_FILE, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def write_bot_setup_hash(setup_hash):
+    try:
+        with open(BOT_SETUP_CACHE_FILE, 'w', encoding='utf-8') as f:
+            f.write(setup_hash)
+    except OSError as e:
+        logger.error(f"Failed to write bot setup cache: {str(e)}")
+
+async def setup_bot_commands(bot: Bot):
+    # Set up commands for all users
+    commands = [
+        BotCommand(command="start", description="Розпочати роботу з ботом"),
+        BotCommand(command="send_prayer", description="Надіслати молитву"),
+        BotCommand(command="my_prayers", description="Показати мої молитви"),
+        BotCommand(command="all_prayers", description="Показати всі молитви"),
+        BotCommand(command="community", description="Обрати спільноту")
+    ]
+    
+    # Set up admin commands (only visible to admin)
+    admin_commands = commands + [
+        BotCommand(command="whitelist_add", description="Додати користувача до білого списку"),
+        BotCommand(command="whitelist_remove", description="Видалити користувача з білого списку"),
+        BotCommand(command="whitelist_list", description="Показати список дозволених користувачів"),
+        BotCommand(command="duplicates", description="Знайти повторні молитви (merge — обʼєднати)"),
+        BotCommand(command="stats", description="Статистика спільноти (csv — у файлі)"),
+        BotCommand(command="admin_add", description="Додати адміністратора спільноти"),
+        BotCommand(command="admin_remove", description="Видалити адміністратора спільноти"),
+        BotCommand(command="category_add", description="Додати категорію до спільноти"),
+        BotCommand(command="audit", description="Журнал змін (ID — зміни одного користувача)"),
+        BotCommand(command="backup", description="Створити резервну копію бази даних"),
+        BotCommand(command="profile", description="Профілювати бота (секунди)")
+    ]
+    
+    # Skip the API calls if nothing changed since the last successful setup
+    setup_hash = get_bot_setup_hash(bot.id, commands, admin_commands)
+    if read_bot_setup_hash() == setup_hash:
+        logger.info("Bot commands and menu button are up to date")
+        return
+    
+    # The three calls are independent, so run them concurrently
+    default_result, admin_result, menu_result = await asyncio.gather(
+        bot.set_my_commands(commands, scope=BotCommandScopeDefault()),
+        bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(chat_id=ADMIN_USER_ID)),
+        # Set menu button to default type (hamburger menu)
+        bot.set_chat_menu_button(menu_button=MenuButtonDefault()),
+        return_exceptions=True
+    )
+    
+    if isinstance(default_result, Exception):
+        logger.error(f"Failed to set commands: {str(default_result)}")
+    if isinstance(admin_result, Exception):
+        logger.error(f"Failed to set admin commands: {str(admin_result)}. Admin may need to interact with the bot first.")
+    else:
+        logger.info(f"Admin commands set for user {ADMIN_USER_ID}")
+    if isinstance(menu_result, Exception):
+        logger.error(f"Failed to set menu button: {str(menu_result)}")
+    
+    # Remember the setup only if everything was applied, otherwise retry on next start
+    if not any(isinstance(result, Exception) for result in (default_result, admin_result, menu_result)):
+        write_bot_setup_hash(setup_hash)
+
+async def main(startup_profile=False):
     # Load environment variables from .env file
     load_dotenv()
 
@@ -109,60 +377,123 @@ async def main():
     if not TELEGRAM_TOKEN:
         raise ValueError("TELEGRAM_TOKEN environment variable is not set!")
 
-    # Initialize the bot and storage
-    storage = MemoryStorage()
+    # Initialize the bot and storage, states and drafts are kept in the database across restarts
+    storage = fsm_storage
     bot = Bot(token=TELEGRAM_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     
-    # Initialize the dispatcher with storage (v3 way)
-    dp = Dispatcher(storage=storage)
+    # Initialize the dispatcher with storage, the FSM state of a chat is read under the lock
+    # of the chat, so updates of a chat see the state left by the previous one (see scheduling.py)
+    dp = Dispatcher(storage=storage, events_isolation=chat_scheduler)
+    
+    # Track in-flight updates and drain them on shutdown, updates waiting for the lock
+    # of their chat are counted too
+    lifecycle.setup(dp)
+    
+    # Cheaper modes are switched on while the event loop lags or too many updates are in progress
+    dp.startup.register(overload_controller.start)
+    lifecycle.register_flush(overload_controller.stop)
+    
+    # Every update gets a correlation ID in the logs, and the text the user sent is redacted
+    dp.update.outer_middleware(LoggingContextMiddleware())
+    
+    # Handlers are timed while /profile is running
+    profiling_middleware = ProfilingMiddleware(profiler)
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(profiling_middleware)
+    
+    # Sampled updates are traced: middlewares, handlers, database statements and Bot API calls
+    if tracer.enabled:
+        dp.update.outer_middleware(TracingMiddleware())
+        for observer in (dp.message, dp.callback_query, dp.inline_query):
+            observer.middleware(HandlerTracingMiddleware())
+        bot.session.middleware(BotRequestTracingMiddleware())
+        lifecycle.register_flush(tracer.stop)
+    
+    # Updates of different chats are handled concurrently on a limited number of workers
+    dp.update.outer_middleware(chat_scheduler)
     
     # Register all handlers
-    register_handlers(dp, AdminFilter())
+    register_handlers(dp, AdminFilter(), AdminFilter(owner_only=True))
+    
+    # Both middlewares are outer ones, so the community is known to the admin filters.
+    # Add throttling middleware first so flooding users are rejected before any DB work
+    throttling_middleware = ThrottlingMiddleware()
+    dp.message.outer_middleware(throttling_middleware)
+    dp.callback_query.outer_middleware(throttling_middleware)
     
     # Add whitelist middleware
-    dp.message.middleware(WhitelistMiddleware())
-    dp.callback_query.middleware(WhitelistMiddleware())
+    whitelist_middleware = WhitelistMiddleware()
+    dp.message.outer_middleware(whitelist_middleware)
+    dp.callback_query.outer_middleware(whitelist_middleware)
+    dp.inline_query.outer_middleware(whitelist_middleware)
     
-    # Set up commands for all users
-    commands = [
-        BotCommand(command="start", description="Розпочати роботу з ботом"),
-        BotCommand(command="send_prayer", description="Надіслати молитву"),
-        BotCommand(command="my_prayers", description="Показати мої молитви"),
-        BotCommand(command="all_prayers", description="Показати всі молитви")
-    ]
-    await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
+    # Background messages are sent once polling starts; on shutdown the scheduler
+    # and notifications are stopped first and already queued messages are delivered
+    dp.startup.register(sender.start)
+    dp.startup.register(reminder_scheduler.start)
+    dp.startup.register(notification_manager.start)
+    lifecycle.register_flush(reminder_scheduler.stop)
+    lifecycle.register_flush(notification_manager.stop)
+    lifecycle.register_flush(sender.stop)
     
-    # Set up admin commands (only visible to admin)
-    admin_commands = commands + [
-        BotCommand(command="whitelist_add", description="Додати користувача до білого списку"),
-        BotCommand(command="whitelist_remove", description="Видалити користувача з білого списку"),
-        BotCommand(command="whitelist_list", description="Показати список дозволених користувачів")
-    ]
+    # "I prayed" marks are written in batches, pending ones are saved on shutdown
+    dp.startup.register(prayed_counter.start)
+    lifecycle.register_flush(prayed_counter.stop)
     
-    try:
-        await bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(chat_id=ADMIN_USER_ID))
-        logger.info(f"Admin commands set for user {ADMIN_USER_ID}")
-    except Exception as e:
-        logger.error(f"Failed to set admin commands: {str(e)}. Admin may need to interact with the bot first.")
+    # Audit entries are written in batches, pending ones are saved on shutdown
+    dp.startup.register(audit_log.start)
+    lifecycle.register_flush(audit_log.stop)
+    
+    # Scheduled database backups
+    dp.startup.register(backup_manager.start)
+    lifecycle.register_flush(backup_manager.stop)
     
-    # Set menu button to default type (hamburger menu)
-    await bot.set_chat_menu_button(
-        menu_button=MenuButtonDefault()
+    # Old prayers are moved to the archive database in the background
+    dp.startup.register(archive_manager.start)
+    lifecycle.register_flush(archive_manager.stop)
+    
+    # Deleted prayers are removed for good in background batches once they can't be restored
+    dp.startup.register(purge_manager.start)
+    lifecycle.register_flush(purge_manager.stop)
+    
+    # Previews of drafts are shown after a pause in typing, pending ones are shown again after a restart
+    dp.startup.register(resume_draft_previews)
+    lifecycle.register_flush(cancel_draft_previews)
+    mark_startup_phase('dispatcher')
+    
+    # Set up commands and menu button, and remove the webhook (pending updates are
+    # dropped unless DROP_PENDING_UPDATES is disabled) concurrently
+    await asyncio.gather(
+        setup_bot_commands(bot),
+        bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
     )
+    mark_startup_phase('telegram_setup')
+    
+    # Print the startup profile right before the first update is fetched
+    if startup_profile:
+        @dp.startup()
+        async def print_startup_profile():
+            mark_startup_phase('polling_start')
+            print(format_startup_report(), file=sys.stderr)
     
     # Start polling updates instead of using executor
     logger.info('Starting bot')
     
-    # To skip pending updates if needed:
-    await bot.delete_webhook(drop_pending_updates=True)
+    # Signals are handled by the lifecycle manager so in-flight updates can be drained
+    lifecycle.install_signal_handlers(dp)
     
-    # Start polling (v3 way)
-    await dp.start_polling(bot, skip_updates=False)
+    # Start polling (v3 way), polling pauses while UPDATE_QUEUE_LIMIT updates are not handled yet
+    await dp.start_polling(bot, handle_signals=False, tasks_concurrency_limit=UPDATE_QUEUE_LIMIT)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prayer Telegram bot')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='print a timing breakdown of the startup phases')
+    args = parser.parse_args()
+    
     # Setup logging
     logger = setup_logging()
+    mark_startup_phase('logging')
     # Run the bot
-    import asyncio
     on_startup()
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main(startup_profile=args.startup_profile)) 
\ No newline at end of file
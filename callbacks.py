@@ -0,0 +1,220 @@
+import base64
+import logging
+from enum import IntEnum
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Version of the callback_data layout, bump it on incompatible changes
+CALLBACK_SCHEMA_VERSION = 1
+
+# Telegram limit for callback_data (in bytes)
+MAX_CALLBACK_DATA_LENGTH = 64
+
+# Category argument meaning "all categories"
+ALL_CATEGORIES = 0
+
+# Reminder intervals (REMIND_SET argument, in days) and their labels
+REMINDER_INTERVALS = {
+    1: 'щодня',
+    7: 'щотижня',
+}
+
+# Kinds of callback buttons
+class CallbackKind(IntEnum):
+    MAIN_MENU = 1
+    SEND_PRAY = 2
+    SELECT_CATEGORY = 3          # category_id
+    EDIT = 4                     # prayer_id
+    DELETE = 5                   # prayer_id
+    EDIT_CATEGORY = 6            # prayer_id, category_id
+    CANCEL_EDIT = 7
+    SHOW_MY_PRAYERS = 8
+    MY_PRAYERS_CATEGORY = 9      # category_id or ALL_CATEGORIES
+    MY_PRAYERS_PAGE = 10         # offset
+    MY_CATEGORY_PAGE = 11        # category_id, offset
+    SHOW_ALL_PRAYERS = 12
+    ALL_PRAYERS_CATEGORY = 13    # category_id or ALL_CATEGORIES
+    PRAYERS_PAGE = 14            # offset
+    CATEGORY_PAGE = 15           # category_id, offset
+    REMIND = 16                  # prayer_id
+    REMIND_SET = 17              # prayer_id, interval in days
+    REMIND_STOP = 18             # reminder_id
+    PRAYED = 19                  # prayer_id
+    READ_FULL = 20               # prayer_id
+    SELECT_COMMUNITY = 21        # community_id
+    UNDO_DELETE = 22             # prayer_id
+    SHOW_SUBSCRIPTIONS = 23
+    SUBSCRIBE = 24               # category_id
+    UNSUBSCRIBE = 25             # category_id
+    DRAFT_DONE = 26
+    EDIT_SEGMENT = 27            # prayer_id, segment index
+
+# Number of integer arguments of each kind
+CALLBACK_ARITY = {
+    CallbackKind.MAIN_MENU: 0,
+    CallbackKind.SEND_PRAY: 0,
+    CallbackKind.SELECT_CATEGORY: 1,
+    CallbackKind.EDIT: 1,
+    CallbackKind.DELETE: 1,
+    CallbackKind.EDIT_CATEGORY: 2,
+    CallbackKind.CANCEL_EDIT: 0,
+    CallbackKind.SHOW_MY_PRAYERS: 0,
+    CallbackKind.MY_PRAYERS_CATEGORY: 1,
+    CallbackKind.MY_PRAYERS_PAGE: 1,
+    CallbackKind.MY_CATEGORY_PAGE: 2,
+    CallbackKind.SHOW_ALL_PRAYERS: 0,
+    CallbackKind.ALL_PRAYERS_CATEGORY: 1,
+    CallbackKind.PRAYERS_PAGE: 1,
+    CallbackKind.CATEGORY_PAGE: 2,
+    CallbackKind.REMIND: 1,
+    CallbackKind.REMIND_SET: 2,
+    CallbackKind.REMIND_STOP: 1,
+    CallbackKind.PRAYED: 1,
+    CallbackKind.READ_FULL: 1,
+    CallbackKind.SELECT_COMMUNITY: 1,
+    CallbackKind.UNDO_DELETE: 1,
+    CallbackKind.SHOW_SUBSCRIPTIONS: 0,
+    CallbackKind.SUBSCRIBE: 1,
+    CallbackKind.UNSUBSCRIBE: 1,
+    CallbackKind.DRAFT_DONE: 0,
+    CallbackKind.EDIT_SEGMENT: 2,
+}
+
+# Decoded callback_data
+class Callback(NamedTuple):
+    kind: CallbackKind
+    args: Tuple[int, ...]
+
+def _write_varint(value, out):
+    # Unsigned LEB128
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+def _read_varint(raw, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(raw) or shift > 63:
+            raise ValueError("Truncated varint")
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+@lru_cache(maxsize=4096)
+def encode_callback(kind, *args):
+    """
+    Encodes a callback button payload.
+
+    Layout: schema version byte, kind byte and varint arguments,
+    encoded with URL-safe base64 without padding.
+
+    Args:
+        kind: CallbackKind of the button
+        args: Non-negative integer arguments of the kind
+
+    Returns:
+        String suitable for callback_data
+    """
+    if len(args) != CALLBACK_ARITY[kind]:
+        raise ValueError(f"{kind.name} expects {CALLBACK_ARITY[kind]} arguments, got {len(args)}")
+
+    raw = bytearray((CALLBACK_SCHEMA_VERSION, kind))
+    for arg in args:
+        if arg < 0:
+            raise ValueError(f"Negative callback argument {arg} for {kind.name}")
+        _write_varint(arg, raw)
+
+    data = base64.urlsafe_b64encode(bytes(raw)).rstrip(b'=').decode('ascii')
+    if len(data) > MAX_CALLBACK_DATA_LENGTH:
+        raise ValueError(f"Callback data for {kind.name} is too long: {len(data)} bytes")
+    return data
+
+@lru_cache(maxsize=4096)
+def decode_callback(data) -> Optional[Callback]:
+    """
+    Decodes and validates callback_data created by encode_callback.
+    Buttons sent by older versions of the bot are parsed with the legacy format.
+
+    Args:
+        data: callback_data string
+
+    Returns:
+        Callback or None if the data is invalid or unknown
+    """
+    if not data:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except ValueError:
+        raw = b''
+
+    if len(raw) < 2 or raw[0] != CALLBACK_SCHEMA_VERSION:
+        return _decode_legacy_callback(data)
+
+    try:
+        kind = CallbackKind(raw[1])
+        args = []
+        pos = 2
+        for _ in range(CALLBACK_ARITY[kind]):
+            value, pos = _read_varint(raw, pos)
+            args.append(value)
+        if pos != len(raw):
+            raise ValueError("Unexpected trailing bytes")
+    except ValueError as e:
+        logger.warning(f"Invalid callback data {data!r}: {str(e)}")
+        return None
+
+    return Callback(kind, tuple(args))
+
+# Prefixes of the callback_data format used before the codec was introduced
+_LEGACY_PREFIXES = (
+    ('myprayers_page_', CallbackKind.MY_PRAYERS_PAGE),
+    ('myprayers_cat_', CallbackKind.MY_PRAYERS_CATEGORY),
+    ('allprayers_cat_', CallbackKind.ALL_PRAYERS_CATEGORY),
+    ('prayers_page_', CallbackKind.PRAYERS_PAGE),
+    ('mycat_page_', CallbackKind.MY_CATEGORY_PAGE),
+    ('cat_page_', CallbackKind.CATEGORY_PAGE),
+    ('category_', CallbackKind.SELECT_CATEGORY),
+    ('editcat_', CallbackKind.EDIT_CATEGORY),
+    ('edit_', CallbackKind.EDIT),
+    ('delete_', CallbackKind.DELETE),
+)
+_LEGACY_EXACT = {
+    'main_menu': CallbackKind.MAIN_MENU,
+    'send_pray': CallbackKind.SEND_PRAY,
+    'cancel_edit': CallbackKind.CANCEL_EDIT,
+    'show_my_prayers': CallbackKind.SHOW_MY_PRAYERS,
+    'show_all_prayers': CallbackKind.SHOW_ALL_PRAYERS,
+}
+
+def _decode_legacy_callback(data):
+    kind = _LEGACY_EXACT.get(data)
+    if kind is not None:
+        return Callback(kind, ())
+
+    for prefix, kind in _LEGACY_PREFIXES:
+        if data.startswith(prefix):
+            parts = data[len(prefix):].split('_')
+            if len(parts) != CALLBACK_ARITY[kind]:
+                break
+            try:
+                args = tuple(ALL_CATEGORIES if part == 'all' else int(part) for part in parts)
+            except ValueError:
+                break
+            return Callback(kind, args)
+
+    logger.warning(f"Unknown callback data {data!r}")
+    return None
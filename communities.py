@@ -0,0 +1,162 @@
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from config import ADMIN_USER_ID
+from database import DEFAULT_COMMUNITY_ID, get_connection, get_cursor, is_user_whitelisted
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# A separate prayer space: a group chat, or the default community used in private chats
+class Community(NamedTuple):
+    id: int
+    title: str
+    chat_id: Optional[int]
+
+# Communities change rarely, so they are cached in memory.
+# Chats the bot is not connected to are cached as None.
+_communities = {}
+_communities_by_chat = {}
+
+# community_id -> frozenset of IDs of its admins
+_admins = {}
+
+# user_id -> ID of the community selected for private chats
+_selected = {}
+
+# Get a community by ID
+def get_community(community_id):
+    if community_id not in _communities:
+        cursor = get_cursor()
+        cursor.execute('SELECT id, title, chat_id FROM communities WHERE id = ?', (community_id,))
+        row = cursor.fetchone()
+        _communities[community_id] = Community(*row) if row else None
+    return _communities[community_id]
+
+# Get the community of a group chat, None if the bot is not connected to the chat
+def get_community_by_chat(chat_id):
+    if chat_id not in _communities_by_chat:
+        cursor = get_cursor()
+        cursor.execute('SELECT id, title, chat_id FROM communities WHERE chat_id = ?', (chat_id,))
+        row = cursor.fetchone()
+        _communities_by_chat[chat_id] = Community(*row) if row else None
+    return _communities_by_chat[chat_id]
+
+# Get all communities
+def get_all_communities():
+    cursor = get_cursor()
+    cursor.execute('SELECT id, title, chat_id FROM communities ORDER BY id')
+    return [Community(*row) for row in cursor.fetchall()]
+
+# Create a community for a group chat
+def create_community(chat_id, title):
+    cursor = get_cursor()
+    logger.info(f"Creating community {title} for chat {chat_id}")
+    cursor.execute(
+        'INSERT INTO communities (chat_id, title, created_at) VALUES (?, ?, ?)',
+        (chat_id, title, datetime.now().isoformat())
+    )
+    get_connection().commit()
+    _communities_by_chat.pop(chat_id, None)
+    return get_community(cursor.lastrowid)
+
+# Move a community to a new chat ID, Telegram changes it when a group becomes a supergroup
+def move_community_chat(old_chat_id, new_chat_id):
+    cursor = get_cursor()
+    cursor.execute('UPDATE communities SET chat_id = ? WHERE chat_id = ?', (new_chat_id, old_chat_id))
+    get_connection().commit()
+    community = _communities_by_chat.pop(old_chat_id, None)
+    _communities_by_chat.pop(new_chat_id, None)
+    if community is not None:
+        _communities.pop(community.id, None)
+        logger.info(f"Community {community.id} moved from chat {old_chat_id} to {new_chat_id}")
+
+# Get communities whose whitelist has the user, oldest membership first
+def get_user_communities(user_id, username=None):
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT DISTINCT community_id FROM whitelist
+    WHERE user_id = ? OR (username = ? AND username IS NOT NULL)
+    ORDER BY added_at
+    ''', (user_id, username))
+    communities = [get_community(row[0]) for row in cursor.fetchall()]
+    return [community for community in communities if community is not None]
+
+# Get the community selected by a user for private chats, None if nothing was selected
+def get_selected_community(user_id):
+    if user_id not in _selected:
+        cursor = get_cursor()
+        cursor.execute('SELECT community_id FROM selected_communities WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        _selected[user_id] = row[0] if row else None
+    return _selected[user_id]
+
+# Select the community a user works with in private chats
+def select_community(user_id, community_id):
+    cursor = get_cursor()
+    cursor.execute('''
+    INSERT INTO selected_communities (user_id, community_id) VALUES (?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET community_id = excluded.community_id
+    ''', (user_id, community_id))
+    get_connection().commit()
+    _selected[user_id] = community_id
+
+# Get the community of a user in a private chat
+def get_private_community(user_id, username=None):
+    """
+    Finds the community a user works with in a private chat: the selected one,
+    or the first community whose whitelist has the user. The bot owner can
+    use any community and falls back to the default one.
+
+    Returns:
+        Community, or None if the user has no access to any community
+    """
+    community_id = get_selected_community(user_id)
+    if community_id is not None and (
+        user_id == ADMIN_USER_ID or is_user_whitelisted(community_id, user_id, username)
+    ):
+        community = get_community(community_id)
+        if community is not None:
+            return community
+
+    communities = get_user_communities(user_id, username)
+    if communities:
+        select_community(user_id, communities[0].id)
+        return communities[0]
+    if user_id == ADMIN_USER_ID:
+        return get_community(DEFAULT_COMMUNITY_ID)
+    return None
+
+# Get IDs of admins of a community
+def get_community_admins(community_id):
+    if community_id not in _admins:
+        cursor = get_cursor()
+        cursor.execute('SELECT user_id FROM community_admins WHERE community_id = ?', (community_id,))
+        _admins[community_id] = frozenset(row[0] for row in cursor.fetchall())
+    return _admins[community_id]
+
+# Check if a user is an admin of a community, the bot owner is an admin of every community
+def is_community_admin(community_id, user_id):
+    return user_id == ADMIN_USER_ID or user_id in get_community_admins(community_id)
+
+# Make a user an admin of a community
+def add_community_admin(community_id, user_id):
+    cursor = get_cursor()
+    logger.info(f"Adding admin {user_id} to community {community_id}")
+    cursor.execute(
+        'INSERT OR IGNORE INTO community_admins (community_id, user_id, added_at) VALUES (?, ?, ?)',
+        (community_id, user_id, datetime.now().isoformat())
+    )
+    get_connection().commit()
+    _admins.pop(community_id, None)
+    return cursor.rowcount > 0
+
+# Remove an admin of a community
+def remove_community_admin(community_id, user_id):
+    cursor = get_cursor()
+    logger.info(f"Removing admin {user_id} from community {community_id}")
+    cursor.execute('DELETE FROM community_admins WHERE community_id = ? AND user_id = ?', (community_id, user_id))
+    get_connection().commit()
+    _admins.pop(community_id, None)
+    return cursor.rowcount > 0
@@ -0,0 +1,8 @@
+import os
+
+# Telegram user ID of the bot owner. The owner is an admin of every community
+# and the only one who can connect the bot to new group chats.
+ADMIN_USER_ID = int(os.getenv('ADMIN_USER_ID', '282269567'))
+
+# Username of the bot owner, users without access are asked to contact them
+ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'suberjin')
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import suppress
+from datetime import datetime
+
+from services import has_prayed, fetch_prayed_counts, save_prayed_marks
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) pending marks are written to the database.
+# This is also the most that can be lost if the bot crashes.
+PRAYED_FLUSH_INTERVAL = 5.0
+
+# Pending marks are written earlier when there are this many of them
+PRAYED_FLUSH_THRESHOLD = 500
+
+# Number of prayers whose stored counts are kept in memory
+PRAYED_CACHE_SIZE = 10000
+
+class PrayedCounter:
+    """
+    Counts how many users prayed for each prayer.
+
+    Clicks are deduplicated per (user, prayer) and kept in memory, then
+    written to the database periodically in one transaction, so a burst
+    of clicks costs one commit instead of one per click. Counts are served
+    from memory: stored count plus marks that are not written yet.
+    """
+
+    def __init__(self, flush_interval=PRAYED_FLUSH_INTERVAL, flush_threshold=PRAYED_FLUSH_THRESHOLD,
+                 cache_size=PRAYED_CACHE_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.cache_size = cache_size
+        # (user_id, prayer_id) -> created_at of marks not written yet
+        self._pending = {}
+        # prayer_id -> number of pending marks
+        self._pending_counts = {}
+        # prayer_id -> stored count, least recently used first
+        self._stored_counts = OrderedDict()
+        self._flush_requested = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Stop the periodic flush and write everything that is still pending
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.flush()
+
+    def mark(self, user_id, prayer_id):
+        """
+        Records that a user prayed for a prayer.
+
+        Returns:
+            True if the mark is new, False if the user already prayed for it
+        """
+        key = (user_id, prayer_id)
+        if key in self._pending or has_prayed(user_id, prayer_id):
+            return False
+
+        self._pending[key] = datetime.now().isoformat()
+        self._pending_counts[prayer_id] = self._pending_counts.get(prayer_id, 0) + 1
+        if len(self._pending) >= self.flush_threshold:
+            self._flush_requested.set()
+        return True
+
+    def get_counts(self, prayer_ids):
+        # Returns {prayer_id: count}, loading missing stored counts in one query
+        missing = [prayer_id for prayer_id in prayer_ids if prayer_id not in self._stored_counts]
+        if missing:
+            self._stored_counts.update(fetch_prayed_counts(missing))
+
+        counts = {}
+        for prayer_id in prayer_ids:
+            self._stored_counts.move_to_end(prayer_id)
+            counts[prayer_id] = self._stored_counts[prayer_id] + self._pending_counts.get(prayer_id, 0)
+
+        while len(self._stored_counts) > self.cache_size:
+            self._stored_counts.popitem(last=False)
+        return counts
+
+    def get_count(self, prayer_id):
+        return self.get_counts([prayer_id])[prayer_id]
+
+    def discard(self, prayer_id):
+        # Forget a deleted prayer
+        self._stored_counts.pop(prayer_id, None)
+        if self._pending_counts.pop(prayer_id, None):
+            self._pending = {key: value for key, value in self._pending.items() if key[1] != prayer_id}
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, pending_counts = self._pending, self._pending_counts
+        self._pending, self._pending_counts = {}, {}
+
+        try:
+            deltas = save_prayed_marks([(user_id, prayer_id, created_at) for (user_id, prayer_id), created_at in pending.items()])
+        except Exception:
+            # Keep the marks and try again on the next flush
+            for key, created_at in pending.items():
+                self._pending.setdefault(key, created_at)
+            for prayer_id, count in pending_counts.items():
+                self._pending_counts[prayer_id] = self._pending_counts.get(prayer_id, 0) + count
+            return
+
+        # Move written marks to the stored counts
+        for prayer_id, delta in deltas.items():
+            if prayer_id in self._stored_counts:
+                self._stored_counts[prayer_id] += delta
+        logger.info(f"Saved {len(pending)} prayed marks for {len(pending_counts)} prayers")
+
+    async def _run(self):
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing prayed marks: {str(e)}")
+
+# Shared "I prayed" counter
+prayed_counter = PrayedCounter()
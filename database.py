@@ -1,25 +1,172 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 import logging
+from config import ADMIN_USER_ID, ADMIN_USERNAME
+from tracing import TracedConnection, is_traced
 
 # Get logger
 logger = logging.getLogger(__name__)
 
-# Connect to SQLite database (or create it if it doesn't exist)
-logger.info("Connecting to prayers.db database")
-conn = sqlite3.connect('prayers.db', check_same_thread=False)
-cursor = conn.cursor()
+# Path to the SQLite database file
+DATABASE_PATH = 'prayers.db'
+
+# Path to the archive database with old prayers, attached to the connection as "archive"
+ARCHIVE_DATABASE_PATH = 'prayers_archive.db'
+
+# Columns of the prayers table, the same in main.prayers and archive.prayers
+PRAYER_COLUMNS = (
+    'id, user_id, username, first_name, last_name, prayer, category_id, '
+    'created_at, updated_at, content_hash, compressed, preview, community_id, deleted_at'
+)
+
+# Community of databases created before communities were added, and of private chats
+# of users who are not in any other community
+DEFAULT_COMMUNITY_ID = 1
+
+# Categories with this community ID are shared by all communities
+SHARED_CATEGORIES = 0
+
+# Definitions of tables whose constraints were changed, {name} is the table name (see rebuild_table)
+CATEGORIES_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    community_id INTEGER NOT NULL DEFAULT 0,
+    name TEXT NOT NULL,
+    UNIQUE (community_id, name)
+)
+'''
+WHITELIST_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    community_id INTEGER NOT NULL DEFAULT 1,
+    user_id INTEGER,
+    username TEXT,
+    added_at TEXT,
+    UNIQUE (community_id, user_id),
+    UNIQUE (community_id, username)
+)
+'''
+
+# The connection is opened lazily on first use to keep imports cheap
+_conn = None
+
+# Get the shared database connection, connecting on first use.
+# Queries run on the event loop thread. Worker threads only use the connection through
+# SQLite's backup API (see backup.py), which SQLite serializes with the loop's queries.
+# In traced updates the connection records a span for every statement and commit.
+def get_connection():
+    global _conn
+    if _conn is None:
+        # Connect to SQLite database (or create it if it doesn't exist)
+        logger.info(f"Connecting to {DATABASE_PATH} database")
+        _conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        _conn.execute('ATTACH DATABASE ? AS archive', (ARCHIVE_DATABASE_PATH,))
+    if is_traced():
+        return TracedConnection(_conn)
+    return _conn
+
+# Get a new cursor for one database operation. Every operation has its own cursor,
+# so a query made in the middle of another one (e.g. a cache miss) never replaces
+# the result set the caller is still reading.
+def get_cursor():
+    return get_connection().cursor()
+
+# Run several statements as one transaction on a new cursor: committed when the block
+# finishes, rolled back if it raises. Without the rollback, statements of a failed
+# operation would be committed by the next operation on the shared connection.
+@contextmanager
+def transaction():
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        yield cursor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# Switch a database to incremental auto-vacuum, so pages freed by purged prayers can be returned
+# to the file system in small steps (see purge.py). Databases created by older versions are
+# rebuilt once with VACUUM for the setting to take effect.
+def enable_incremental_vacuum(schema='main'):
+    conn = get_connection()
+    if conn.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0] == 2:
+        return
+    logger.info(f"Enabling incremental vacuum for the {schema} database")
+    conn.commit()
+    conn.execute(f'PRAGMA {schema}.auto_vacuum = INCREMENTAL')
+    conn.execute(f'VACUUM {schema}')
+
+# Check if a table has a column, the table name may be prefixed with the database name
+def has_column(cursor, table, column):
+    schema, _, name = table.rpartition('.')
+    cursor.execute(f'PRAGMA {schema or "main"}.table_info({name})')
+    return column in {row[1] for row in cursor.fetchall()}
+
+# Add a column to an existing table if it is missing
+def add_column_if_missing(cursor, table, column, definition):
+    if has_column(cursor, table, column):
+        return False
+    logger.info(f"Adding column {column} to table {table}")
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+# Recreate a table from its new definition keeping its rows, for migrations that change
+# constraints (SQLite cannot alter them in place). Columns missing in the old table get their defaults.
+def rebuild_table(cursor, table, definition, columns):
+    logger.info(f"Rebuilding table {table}")
+    cursor.execute(definition.format(name=f'{table}_new'))
+    cursor.execute(f'INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}')
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
 
 # Create the prayers and categories tables if they don't exist
 def create_table():
+    cursor = get_cursor()
     logger.info("Creating database tables if they don't exist")
-    # Create categories table if it doesn't exist
+    enable_incremental_vacuum('main')
+    enable_incremental_vacuum('archive')
+    # Create communities table if it doesn't exist. A community is a separate prayer space:
+    # a group chat (chat_id) or the default community used in private chats.
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS categories (
+    CREATE TABLE IF NOT EXISTS communities (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE NOT NULL
+        chat_id INTEGER UNIQUE,
+        title TEXT,
+        created_at TEXT
     )
     ''')
+    cursor.execute(
+        'INSERT OR IGNORE INTO communities (id, title, created_at) VALUES (?, ?, ?)',
+        (DEFAULT_COMMUNITY_ID, 'Спільнота', datetime.now().isoformat())
+    )
+    
+    # Create community admins table if it doesn't exist, the bot owner is an admin everywhere
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS community_admins (
+        community_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        added_at TEXT,
+        PRIMARY KEY (community_id, user_id)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Create selected communities table if it doesn't exist, the community a user works with in a private chat
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS selected_communities (
+        user_id INTEGER PRIMARY KEY,
+        community_id INTEGER NOT NULL
+    )
+    ''')
+    
+    # Create categories table if it doesn't exist
+    cursor.execute(CATEGORIES_TABLE_SQL.format(name='categories'))
+    # Category names of older versions were unique globally, their categories become shared
+    if not has_column(cursor, 'categories', 'community_id'):
+        rebuild_table(cursor, 'categories', CATEGORIES_TABLE_SQL, 'id, name')
 
     # Create prayers table if it doesn't exist
     cursor.execute('''
@@ -33,19 +180,235 @@ def create_table():
         category_id INTEGER,
         created_at TEXT,
         updated_at TEXT,
+        content_hash TEXT,
+        compressed INTEGER NOT NULL DEFAULT 0,
+        preview TEXT,
+        community_id INTEGER NOT NULL DEFAULT 1,
+        deleted_at TEXT,
         FOREIGN KEY (category_id) REFERENCES categories(id)
     )
     ''')
+    # Databases created by older versions have no content hash yet, it is filled in on startup
+    add_column_if_missing(cursor, 'prayers', 'content_hash', 'TEXT')
+    # Long prayers are stored compressed (see services.compress_prayer) with a short preview for lists
+    add_column_if_missing(cursor, 'prayers', 'compressed', 'INTEGER NOT NULL DEFAULT 0')
+    add_column_if_missing(cursor, 'prayers', 'preview', 'TEXT')
+    # Prayers of older versions belong to the default community
+    add_column_if_missing(cursor, 'prayers', 'community_id', f'INTEGER NOT NULL DEFAULT {DEFAULT_COMMUNITY_ID}')
+    # Deleted prayers are kept for a while as tombstones so the deletion can be undone (see purge.py)
+    add_column_if_missing(cursor, 'prayers', 'deleted_at', 'TEXT')
+    # Indexes of older versions without the community or covering deleted prayers
+    for index in ('idx_prayers_created', 'idx_prayers_category_created', 'idx_prayers_user_hash',
+                  'idx_prayers_community_created', 'idx_prayers_community_category_created',
+                  'idx_prayers_community_user_hash'):
+        cursor.execute(f'DROP INDEX IF EXISTS {index}')
+    # Prayers of a community are listed newest first, overall and by category.
+    # Indexes skip deleted prayers, queries must have "deleted_at IS NULL" to use them.
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_live_prayers_community_created ON prayers (community_id, created_at, id)
+    WHERE deleted_at IS NULL
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_live_prayers_community_category_created ON prayers (community_id, category_id, created_at, id)
+    WHERE deleted_at IS NULL
+    ''')
+    # Prayers of a user and duplicates are looked up by author and content hash
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_live_prayers_community_user_hash ON prayers (community_id, user_id, content_hash)
+    WHERE deleted_at IS NULL
+    ''')
+    # Deleted prayers are found by the purge job
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_prayers_deleted ON prayers (deleted_at) WHERE deleted_at IS NOT NULL')
+    
+    # Create the archive prayers table if it doesn't exist, old prayers are moved there (see archive.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS archive.prayers (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        prayer TEXT,
+        category_id INTEGER,
+        created_at TEXT,
+        updated_at TEXT,
+        content_hash TEXT,
+        compressed INTEGER NOT NULL DEFAULT 0,
+        preview TEXT,
+        community_id INTEGER NOT NULL DEFAULT 1,
+        deleted_at TEXT
+    )
+    ''')
+    add_column_if_missing(cursor, 'archive.prayers', 'community_id', f'INTEGER NOT NULL DEFAULT {DEFAULT_COMMUNITY_ID}')
+    add_column_if_missing(cursor, 'archive.prayers', 'deleted_at', 'TEXT')
+    for index in ('idx_archive_prayers_created', 'idx_archive_prayers_category_created', 'idx_archive_prayers_user',
+                  'idx_archive_prayers_community_created', 'idx_archive_prayers_community_category_created',
+                  'idx_archive_prayers_community_user'):
+        cursor.execute(f'DROP INDEX IF EXISTS archive.{index}')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS archive.idx_archive_live_prayers_community_created ON prayers (community_id, created_at, id)
+    WHERE deleted_at IS NULL
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS archive.idx_archive_live_prayers_community_category_created
+    ON prayers (community_id, category_id, created_at, id)
+    WHERE deleted_at IS NULL
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS archive.idx_archive_live_prayers_community_user ON prayers (community_id, user_id, created_at)
+    WHERE deleted_at IS NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS archive.idx_archive_prayers_deleted ON prayers (deleted_at) WHERE deleted_at IS NOT NULL')
+    
+    # Hot and archived prayers together without deleted ones, for lookups by ID or user
+    cursor.execute(f'''
+    CREATE TEMP VIEW IF NOT EXISTS all_prayers AS
+    SELECT {PRAYER_COLUMNS} FROM main.prayers WHERE deleted_at IS NULL
+    UNION ALL
+    SELECT {PRAYER_COLUMNS} FROM archive.prayers WHERE deleted_at IS NULL
+    ''')
+    
+    # Create whitelist table if it doesn't exist, users are whitelisted per community
+    cursor.execute(WHITELIST_TABLE_SQL.format(name='whitelist'))
+    # Whitelisted users of older versions belong to the default community
+    if not has_column(cursor, 'whitelist', 'community_id'):
+        rebuild_table(cursor, 'whitelist', WHITELIST_TABLE_SQL, 'id, user_id, username, added_at')
+    # Communities of a user are looked up in private chats
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_whitelist_user ON whitelist (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_whitelist_username ON whitelist (username)')
+    
+    # Create reminders table if it doesn't exist
+    # next_run_at is a unix timestamp of the next reminder
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        prayer_id INTEGER NOT NULL,
+        interval_seconds INTEGER NOT NULL,
+        next_run_at INTEGER NOT NULL,
+        created_at TEXT,
+        UNIQUE (user_id, prayer_id),
+        FOREIGN KEY (prayer_id) REFERENCES prayers(id)
+    )
+    ''')
+    # The scheduler loads reminders in next_run_at order
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminders_next_run ON reminders (next_run_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminders_prayer ON reminders (prayer_id)')
+
+    # Create prayed marks table if it doesn't exist, one row per user who prayed for a prayer
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS prayed_marks (
+        prayer_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        created_at TEXT,
+        PRIMARY KEY (prayer_id, user_id)
+    ) WITHOUT ROWID
+    ''')
     
-    # Create whitelist table if it doesn't exist
+    # Create prayed counts table if it doesn't exist, aggregated from prayed_marks
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS prayed_counts (
+        prayer_id INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # Create daily stats table if it doesn't exist, the number of prayers per day and category.
+    # It is updated together with the prayers, so /stats never scans the prayers table.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        community_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        prayers INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (community_id, day, category_id)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Create daily active users table if it doesn't exist, users who sent prayers on a day
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_active_users (
+        community_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (community_id, day, user_id)
+    ) WITHOUT ROWID
+    ''')
+
+    # Create audit log table if it doesn't exist, changes made by admins and authors (see audit.py).
+    # before_hash and after_hash are content hashes of the prayer text.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        community_id INTEGER,
+        actor_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        target_id INTEGER,
+        before_hash TEXT,
+        after_hash TEXT,
+        details TEXT,
+        created_at TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_actor_created ON audit_log (actor_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_community_created ON audit_log (community_id, created_at)')
+    # The audit log is append-only
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS audit_log_no_update BEFORE UPDATE ON audit_log
+    BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END
+    ''')
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS whitelist (
+    CREATE TRIGGER IF NOT EXISTS audit_log_no_delete BEFORE DELETE ON audit_log
+    BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END
+    ''')
+
+    # Create subscriptions table if it doesn't exist, categories users get notified about (see notifications.py).
+    # Notifications are sent to the private chat of the user, its ID is the user ID.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        user_id INTEGER NOT NULL,
+        community_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        created_at TEXT,
+        PRIMARY KEY (user_id, community_id, category_id)
+    ) WITHOUT ROWID
+    ''')
+    # Fan-out reads the subscribers of a category in user order
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_category ON subscriptions (community_id, category_id, user_id)')
+
+    # Create FSM states table if it doesn't exist, states and data (e.g. prayer drafts) of conversations
+    # (see storage.py). data is JSON.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)')
+
+    # Create prayer revisions table if it doesn't exist, history of prayer edits (see services.py).
+    # A revision is a delta: `removed` text at `position` of the previous text was replaced with `inserted`.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS prayer_revisions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER UNIQUE,
-        username TEXT UNIQUE,
-        added_at TEXT
+        community_id INTEGER NOT NULL,
+        prayer_id INTEGER NOT NULL,
+        editor_id INTEGER,
+        position INTEGER NOT NULL,
+        removed TEXT NOT NULL,
+        inserted TEXT NOT NULL,
+        created_at TEXT NOT NULL
     )
     ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_prayer_revisions_prayer ON prayer_revisions (prayer_id, id)')
+    # The history is append-only, revisions are removed only together with their prayer
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS prayer_revisions_no_update BEFORE UPDATE ON prayer_revisions
+    BEGIN SELECT RAISE(ABORT, 'prayer_revisions is append-only'); END
+    ''')
 
     # Insert default categories if they don't exist
     categories = [
@@ -58,71 +421,111 @@ def create_table():
     ]
     
     for category in categories:
-        cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
+        cursor.execute('INSERT OR IGNORE INTO categories (community_id, name) VALUES (?, ?)', (SHARED_CATEGORIES, category))
     
     # Insert default whitelisted user - first check if exists
-    admin_id = 282269567
-    admin_username = "suberjin"
+    admin_id = ADMIN_USER_ID
+    admin_username = ADMIN_USERNAME
     
     # Check if admin already exists by ID or username
-    cursor.execute('SELECT 1 FROM whitelist WHERE user_id = ? OR username = ?', (admin_id, admin_username))
+    cursor.execute(
+        'SELECT 1 FROM whitelist WHERE community_id = ? AND (user_id = ? OR username = ?)',
+        (DEFAULT_COMMUNITY_ID, admin_id, admin_username)
+    )
     if not cursor.fetchone():
         # Only insert if admin doesn't exist
         now = datetime.now().isoformat()
         try:
             cursor.execute('''
-            INSERT INTO whitelist (user_id, username, added_at)
-            VALUES (?, ?, ?)
-            ''', (admin_id, admin_username, now))
+            INSERT INTO whitelist (community_id, user_id, username, added_at)
+            VALUES (?, ?, ?, ?)
+            ''', (DEFAULT_COMMUNITY_ID, admin_id, admin_username, now))
             logger.info(f"Added default admin {admin_username} (ID: {admin_id}) to whitelist")
         except Exception as e:
             logger.error(f"Error adding default admin to whitelist: {str(e)}")
     
-    conn.commit()
+    get_connection().commit()
+    invalidate_categories()
     logger.info("Database setup completed")
 
-# Get all categories
-def get_all_categories():
-    logger.debug("Fetching all categories")
-    cursor.execute('SELECT id, name FROM categories ORDER BY name')
-    categories = cursor.fetchall()
-    logger.debug(f"Retrieved {len(categories)} categories")
-    return categories
+# Categories change rarely, so they are cached in memory per community.
+# The version is bumped on every change and lets other caches (e.g. keyboards) rebuild.
+_categories = {}
+_categories_versions = {}
+
+# Drop the cached categories of a community after they were changed, of all communities by default
+def invalidate_categories(community_id=None):
+    community_ids = list(_categories_versions) if community_id is None else [community_id]
+    for cid in community_ids:
+        _categories.pop(cid, None)
+        _categories_versions[cid] = _categories_versions.get(cid, 0) + 1
+
+# Get the current version of the categories set of a community
+def get_categories_version(community_id):
+    return _categories_versions.setdefault(community_id, 0)
+
+# Get all categories of a community: the shared ones and its own
+def get_all_categories(community_id):
+    if community_id not in _categories:
+        cursor = get_cursor()
+        logger.debug(f"Fetching categories of community {community_id}")
+        cursor.execute(
+            'SELECT id, name FROM categories WHERE community_id IN (?, ?) ORDER BY name',
+            (SHARED_CATEGORIES, community_id)
+        )
+        _categories[community_id] = tuple(cursor.fetchall())
+        logger.debug(f"Retrieved {len(_categories[community_id])} categories")
+    return _categories[community_id]
 
-# Get category by ID
-def get_category_by_id(category_id):
+# Add a category to a community
+def add_category(community_id, name):
+    cursor = get_cursor()
+    logger.info(f"Adding category {name} to community {community_id}")
+    if any(cat_name == name for _, cat_name in get_all_categories(community_id)):
+        return False
+    try:
+        cursor.execute('INSERT INTO categories (community_id, name) VALUES (?, ?)', (community_id, name))
+        get_connection().commit()
+    except Exception as e:
+        logger.error(f"Error adding category: {str(e)}")
+        return False
+    invalidate_categories(community_id)
+    return True
+
+# Get category by ID, only categories of the community are found
+def get_category_by_id(community_id, category_id):
     logger.debug(f"Fetching category with ID: {category_id}")
-    cursor.execute('SELECT name FROM categories WHERE id = ?', (category_id,))
-    result = cursor.fetchone()
-    if result:
-        logger.debug(f"Found category: {result[0]}")
-    else:
-        logger.warning(f"Category with ID {category_id} not found")
-    return result[0] if result else None
-
-# Check if user is in whitelist
-def is_user_whitelisted(user_id, username=None):
-    logger.debug(f"Checking if user {user_id} or {username} is whitelisted")
+    for cat_id, cat_name in get_all_categories(community_id):
+        if cat_id == category_id:
+            logger.debug(f"Found category: {cat_name}")
+            return cat_name
+    logger.warning(f"Category with ID {category_id} not found")
+    return None
+
+# Check if user is in whitelist of a community
+def is_user_whitelisted(community_id, user_id, username=None):
+    cursor = get_cursor()
+    logger.debug(f"Checking if user {user_id} or {username} is whitelisted in community {community_id}")
     
     try:
         # Try by user_id first
         if user_id is not None:
-            cursor.execute('SELECT 1 FROM whitelist WHERE user_id = ?', (user_id,))
+            cursor.execute('SELECT 1 FROM whitelist WHERE community_id = ? AND user_id = ?', (community_id, user_id))
             if cursor.fetchone():
                 logger.debug(f"User {user_id} found in whitelist by ID")
                 return True
         
         # If not found and username provided, try by username
         if username:
-            cursor.execute('SELECT 1 FROM whitelist WHERE username = ?', (username,))
+            cursor.execute('SELECT 1 FROM whitelist WHERE community_id = ? AND username = ?', (community_id, username))
             if cursor.fetchone():
                 logger.debug(f"User {username} found in whitelist by username")
                 # Update user_id in whitelist if we only had the username before
                 if user_id is not None:
                     try:
-                        cursor.execute('UPDATE whitelist SET user_id = ? WHERE username = ? AND (user_id IS NULL OR user_id = 0)', 
-                                    (user_id, username))
-                        conn.commit()
+                        cursor.execute('UPDATE whitelist SET user_id = ? WHERE community_id = ? AND username = ? AND (user_id IS NULL OR user_id = 0)', 
+                                    (user_id, community_id, username))
+                        get_connection().commit()
                     except Exception as e:
                         logger.error(f"Error updating user_id for username {username}: {str(e)}")
                 return True
@@ -134,9 +537,10 @@ def is_user_whitelisted(user_id, username=None):
         # In case of error, default to denying access
         return False
 
-# Add user to whitelist
-def add_user_to_whitelist(user_id, username=None):
-    logger.info(f"Adding user {user_id}/{username} to whitelist")
+# Add user to whitelist of a community
+def add_user_to_whitelist(community_id, user_id, username=None):
+    cursor = get_cursor()
+    logger.info(f"Adding user {user_id}/{username} to whitelist of community {community_id}")
     
     # Basic validation
     if user_id is None and (username is None or not username.strip()):
@@ -148,37 +552,38 @@ def add_user_to_whitelist(user_id, username=None):
         
         # Check if user already exists by ID or username
         if user_id is not None:
-            cursor.execute('SELECT id FROM whitelist WHERE user_id = ?', (user_id,))
+            cursor.execute('SELECT id FROM whitelist WHERE community_id = ? AND user_id = ?', (community_id, user_id))
             if cursor.fetchone():
                 logger.info(f"User with ID {user_id} already in whitelist, updating username if provided")
                 if username:
-                    cursor.execute('UPDATE whitelist SET username = ? WHERE user_id = ?', (username, user_id))
-                    conn.commit()
+                    cursor.execute('UPDATE whitelist SET username = ? WHERE community_id = ? AND user_id = ?', (username, community_id, user_id))
+                    get_connection().commit()
                 return True
         
         if username:
-            cursor.execute('SELECT id FROM whitelist WHERE username = ?', (username,))
+            cursor.execute('SELECT id FROM whitelist WHERE community_id = ? AND username = ?', (community_id, username))
             if cursor.fetchone():
                 logger.info(f"User with username {username} already in whitelist, updating user_id if provided")
                 if user_id is not None:
-                    cursor.execute('UPDATE whitelist SET user_id = ? WHERE username = ?', (user_id, username))
-                    conn.commit()
+                    cursor.execute('UPDATE whitelist SET user_id = ? WHERE community_id = ? AND username = ?', (user_id, community_id, username))
+                    get_connection().commit()
                 return True
         
         # Insert new user
         cursor.execute('''
-        INSERT INTO whitelist (user_id, username, added_at)
-        VALUES (?, ?, ?)
-        ''', (user_id, username, now))
-        conn.commit()
+        INSERT INTO whitelist (community_id, user_id, username, added_at)
+        VALUES (?, ?, ?, ?)
+        ''', (community_id, user_id, username, now))
+        get_connection().commit()
         return True
     except Exception as e:
         logger.error(f"Error adding user to whitelist: {str(e)}")
         return False
 
-# Remove user from whitelist
-def remove_user_from_whitelist(user_id=None, username=None):
-    logger.info(f"Removing user {user_id}/{username} from whitelist")
+# Remove user from whitelist of a community
+def remove_user_from_whitelist(community_id, user_id=None, username=None):
+    cursor = get_cursor()
+    logger.info(f"Removing user {user_id}/{username} from whitelist of community {community_id}")
     
     # Basic validation
     if user_id is None and (username is None or not username.strip()):
@@ -186,28 +591,40 @@ def remove_user_from_whitelist(user_id=None, username=None):
         return False
     
     try:
+        # Users without access are no longer notified about new prayers of the community
         if user_id is not None:
-            cursor.execute('DELETE FROM whitelist WHERE user_id = ?', (user_id,))
+            cursor.execute('DELETE FROM subscriptions WHERE community_id = ? AND user_id = ?', (community_id, user_id))
+            cursor.execute('DELETE FROM whitelist WHERE community_id = ? AND user_id = ?', (community_id, user_id))
         elif username:
-            cursor.execute('DELETE FROM whitelist WHERE username = ?', (username,))
+            cursor.execute('''
+            DELETE FROM subscriptions WHERE community_id = ? AND user_id IN (
+                SELECT user_id FROM whitelist WHERE community_id = ? AND username = ?
+            )
+            ''', (community_id, community_id, username))
+            cursor.execute('DELETE FROM whitelist WHERE community_id = ? AND username = ?', (community_id, username))
         else:
             return False
         
-        conn.commit()
+        get_connection().commit()
         return cursor.rowcount > 0
     except Exception as e:
         logger.error(f"Error removing user from whitelist: {str(e)}")
         return False
 
-# Get all whitelisted users
-def get_all_whitelisted_users():
-    logger.debug("Fetching all whitelisted users")
-    cursor.execute('SELECT user_id, username, added_at FROM whitelist ORDER BY added_at DESC')
+# Get all whitelisted users of a community
+def get_all_whitelisted_users(community_id):
+    cursor = get_cursor()
+    logger.debug(f"Fetching whitelisted users of community {community_id}")
+    cursor.execute('SELECT user_id, username, added_at FROM whitelist WHERE community_id = ? ORDER BY added_at DESC', (community_id,))
     users = cursor.fetchall()
     logger.debug(f"Retrieved {len(users)} whitelisted users")
     return users
 
-# Expose the connection and cursor for use in other modules
-__all__ = ['conn', 'cursor', 'create_table', 'get_all_categories', 'get_category_by_id', 
+# Expose the connection and cursor getters for use in other modules
+__all__ = ['DATABASE_PATH', 'ARCHIVE_DATABASE_PATH', 'PRAYER_COLUMNS', 'DEFAULT_COMMUNITY_ID', 'SHARED_CATEGORIES',
+           'get_connection', 'get_cursor', 'transaction', 'enable_incremental_vacuum', 'has_column', 'add_column_if_missing',
+           'rebuild_table', 'create_table',
+           'get_all_categories', 'get_category_by_id', 'add_category',
+           'invalidate_categories', 'get_categories_version',
            'is_user_whitelisted', 'add_user_to_whitelist', 'remove_user_from_whitelist',
            'get_all_whitelisted_users']
@@ -1,29 +1,77 @@
 from aiogram import Bot, Router, F, Dispatcher
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent, ChatMemberUpdated, BufferedInputFile
+)
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, ChatMemberUpdatedFilter, JOIN_TRANSITION
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 import logging
 from services import (
     insert_prayer, fetch_prayers, update_prayer, delete_prayer, get_prayer_by_id, 
     fetch_all_prayers, count_all_prayers, fetch_prayers_by_category, 
-    fetch_all_prayers_by_category, count_prayers_by_category
+    fetch_all_prayers_by_category, count_prayers_by_category, upsert_reminder, delete_reminder,
+    search_prayers, find_duplicate_prayers, merge_duplicate_prayers, prayer_exists,
+    fetch_user_prayers_page, count_user_prayers, get_prayer_owner, get_deleted_prayer_owner, restore_prayer,
+    subscribe, unsubscribe, fetch_user_subscriptions, patch_prayer, split_prayer_segments, is_duplicate_submission,
+    DELETE_UNDO_WINDOW, PRAYER_SEGMENT_LENGTH
 )
 from database import (
-    get_all_categories, get_category_by_id, cursor, 
+    get_category_by_id, add_category,
     add_user_to_whitelist, remove_user_from_whitelist, get_all_whitelisted_users
 )
+from communities import (
+    Community, get_all_communities, get_user_communities, get_community_by_chat, create_community,
+    move_community_chat, select_community, is_community_admin, get_community_admins,
+    add_community_admin, remove_community_admin
+)
+from config import ADMIN_USER_ID, ADMIN_USERNAME
+from callbacks import CallbackKind, ALL_CATEGORIES, REMINDER_INTERVALS, decode_callback
+from keyboards import (
+    main_menu_keyboard, back_to_menu_keyboard, prayer_saved_keyboard, cancel_edit_keyboard,
+    back_to_categories_keyboard, category_select_keyboard, all_prayers_categories_keyboard,
+    my_prayers_categories_keyboard, edit_category_keyboard, prayer_actions_keyboard,
+    prayer_segments_keyboard, segment_saved_keyboard, pagination_keyboard, prayer_card_keyboard, reminder_interval_keyboard,
+    community_select_keyboard, prayer_deleted_keyboard, subscriptions_keyboard, draft_keyboard
+)
+from reminders import reminder_scheduler
+from counters import prayed_counter
+from backup import backup_manager
+from audit import audit_log, ACTION_LABELS
+from storage import SQLiteStorage
+from notifications import notification_manager
+from overload import overload_controller
+from scheduling import chat_scheduler
+from stats import build_stats_report, build_stats_csv
+from profiler import profiler, PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS
+from inline import (
+    INLINE_RESULTS_LIMIT, INLINE_CACHE_TTL, get_inline_results_cache, normalize_inline_query,
+    parse_inline_query, encode_inline_offset, decode_inline_offset
+)
 from datetime import datetime
+import asyncio
+import html
+import os
+import time
 
 # Get logger
 logger = logging.getLogger(__name__)
 
-# Admin user ID - make sure this matches the ID in bot.py
-ADMIN_USER_ID = 282269567
-
 # Create router instance
 router = Router()
 
+# Callback handlers by callback kind, filled by the callback_route decorator
+callback_routes = {}
+
+# Decorator registering a handler for a callback kind.
+# The handler is called with the callback query, FSM context, community and decoded callback arguments.
+def callback_route(kind):
+    def decorator(handler):
+        callback_routes[kind] = handler
+        return handler
+    return decorator
+
 # Define the PrayerStates class
 class PrayerStates(StatesGroup):
     selecting_category = State()
@@ -37,15 +85,163 @@ class PrayerStates(StatesGroup):
             cls.expecting_prayer: "expecting_prayer"
         }
 
+# Telegram message length limit (4096 characters)
+MAX_MESSAGE_LENGTH = 4000  # Slightly less than the limit for safety
+
+# Send a text with a header, splitting it into parts if it is too long for one message.
+# The keyboard is attached to the last message.
+async def send_long_message(message: Message, header, text, reply_markup=None):
+    # Check message length
+    if len(text) + len(header) <= MAX_MESSAGE_LENGTH:
+        # If message is not too long, send it completely with keyboard
+        await message.answer(f"{header}{text}", reply_markup=reply_markup)
+        return
+    
+    # If message is too long, split it into parts
+    # Send header first
+    await message.answer(header)
+    
+    # Split long text into parts
+    remaining_text = text
+    part_number = 1
+    total_parts = (len(text) + MAX_MESSAGE_LENGTH - 1) // MAX_MESSAGE_LENGTH
+    
+    while remaining_text:
+        # Calculate size of next part
+        chunk_size = min(MAX_MESSAGE_LENGTH, len(remaining_text))
+        # Extract part of text
+        chunk = remaining_text[:chunk_size]
+        # Update remaining text
+        remaining_text = remaining_text[chunk_size:]
+        
+        # Add information about part of message
+        part_info = f"<i>Частина {part_number}/{total_parts}</i>\n\n" if total_parts > 1 else ""
+        
+        # Send last part with keyboard, others without keyboard
+        if not remaining_text:  # If this is the last part
+            await message.answer(f"{part_info}{chunk}", reply_markup=reply_markup)
+        else:
+            await message.answer(f"{part_info}{chunk}")
+        
+        part_number += 1
+
+# Format the header of a prayer from the common feed
+def format_prayer_header(prayer, is_admin, prayed_count=0):
+    _, username, created_at_value, first_name, last_name, category_name, _, prayer_user_id, _ = prayer
+    
+    # Get name and surname, or use username if they don't exist
+    author = f"{first_name or ''} {last_name or ''}".strip() or username or "Анонім"
+    
+    # Format date if it exists
+    created_at = ""
+    if created_at_value:
+        try:
+            # Try to convert date string to datetime object
+            date_obj = datetime.fromisoformat(created_at_value)
+            # Format date to more readable form
+            created_at = f" ({date_obj.strftime('%d.%m.%Y')})"
+        except ValueError:
+            # If date couldn't be converted, ignore
+            pass
+    
+    # Format message header
+    header = f"<b>Молитва від {author}{created_at}</b>\n"
+    if is_admin and prayer_user_id:
+        header += f"<b>ID користувача:</b> <code>{prayer_user_id}</code>\n"
+    header += f"<b>Категорія: {category_name or 'Не вказана'}</b>\n"
+    if prayed_count:
+        header += f"🙏 Помолилися: {prayed_count}\n"
+    return header + "\n"
+
+# Send a prayer from the common feed. Admin gets edit/delete buttons, everyone gets "I prayed" and reminder buttons.
+# Long prayers are shown as a preview with a button to read the full text.
+async def send_prayer_card(callback_query: CallbackQuery, prayer, is_admin, prayed_count=0):
+    prayer_text, prayer_id, is_preview = prayer[0], prayer[6], bool(prayer[8])
+    header = format_prayer_header(prayer, is_admin, prayed_count)
+    if is_admin:
+        keyboard = prayer_actions_keyboard(prayer_id, admin=True, read_full=is_preview)
+    else:
+        keyboard = prayer_card_keyboard(prayer_id, read_full=is_preview)
+    await send_long_message(callback_query.message, header, prayer_text, keyboard)
+
+# In the overloaded mode a page is sent as one message, prayers in it are cut to this length
+COMPACT_PRAYER_LENGTH = 600
+
+# How long (in seconds) first pages of the feed are served from the cache in the overloaded mode
+FIRST_PAGE_CACHE_TTL = 15
+
+# First pages of the feed by (community_id, category_id, limit): (expires at, prayers)
+_first_pages = {}
+
+# Fetch a page of the feed of a community, all categories if category_id is None.
+# First pages are cached on every read and served from the cache in the overloaded mode.
+def fetch_feed_page(community_id, category_id, limit, offset):
+    key = (community_id, category_id, limit)
+    if offset == 0 and overload_controller.overloaded:
+        cached = _first_pages.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+    # Under load pages past the hot prayers don't count them
+    count_hot = not overload_controller.degraded
+    if category_id is None:
+        prayers = fetch_all_prayers(community_id, limit=limit, offset=offset, count_hot=count_hot)
+    else:
+        prayers = fetch_all_prayers_by_category(community_id, category_id, limit=limit, offset=offset, count_hot=count_hot)
+    if offset == 0:
+        _first_pages[key] = (time.monotonic() + FIRST_PAGE_CACHE_TTL, prayers)
+    return prayers
+
+# Page information, without the total when the prayers were not counted
+def format_page_info(title, offset, shown, total=None):
+    if total is None:
+        return f"{title} {offset + 1}-{offset + shown}"
+    return f"{title} {offset + 1}-{offset + shown} з {total}"
+
+# Send a page of prayers as one message with the navigation keyboard, items are (header, text) pairs
+async def send_compact_page(message: Message, items, page_info, reply_markup):
+    parts = []
+    for header, text in items:
+        if len(text) > COMPACT_PRAYER_LENGTH:
+            text = text[:COMPACT_PRAYER_LENGTH] + '…'
+        parts.append(f"{header}{text}")
+    await send_long_message(message, f"<b>{page_info}</b>\n\n", '\n\n'.join(parts), reply_markup)
+
+# Send a page of the common feed: a card per prayer and a message with page information and navigation.
+# In the overloaded mode the whole page is one message without the buttons of the cards.
+async def send_feed_prayers(callback_query: CallbackQuery, prayers, is_admin, page_info, keyboard):
+    prayed_counts = prayed_counter.get_counts([prayer[6] for prayer in prayers])
+    if overload_controller.overloaded:
+        items = [(format_prayer_header(prayer, is_admin, prayed_counts[prayer[6]]), prayer[0]) for prayer in prayers]
+        await send_compact_page(callback_query.message, items, page_info, keyboard)
+    else:
+        for prayer in prayers:
+            await send_prayer_card(callback_query, prayer, is_admin, prayed_counts[prayer[6]])
+        await callback_query.message.answer(page_info, reply_markup=keyboard)
+    
+    # Answer callback_query to remove loading clock
+    await callback_query.answer(show_alert=False)
+
+# Send a page of the user's own prayers, the same way as send_feed_prayers
+async def send_my_prayers(callback_query: CallbackQuery, prayers, page_info, keyboard):
+    if overload_controller.overloaded:
+        items = [
+            (f"<b>Категорія: {category_name or 'Не вказана'}</b>\n\n", prayer_text)
+            for _, prayer_text, category_name in prayers
+        ]
+        await send_compact_page(callback_query.message, items, page_info, keyboard)
+    else:
+        for prayer_id, prayer_text, category_name in prayers:
+            # Add category to message
+            category_info = f"<b>Категорія: {category_name or 'Не вказана'}</b>\n\n"
+            await send_long_message(callback_query.message, category_info, prayer_text, prayer_actions_keyboard(prayer_id))
+        await callback_query.message.answer(page_info, reply_markup=keyboard)
+    
+    # Answer callback_query to remove loading clock
+    await callback_query.answer(show_alert=False)
+
 # Function for creating the main menu
 async def show_main_menu(message_or_callback):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='Надіслати молитву', callback_data='send_pray')],
-        [InlineKeyboardButton(text='Показати всі молитви', callback_data='show_all_prayers')],
-        [InlineKeyboardButton(text='Показати мої молитви', callback_data='show_my_prayers')],
-    ])
+    keyboard = main_menu_keyboard()
     
     if isinstance(message_or_callback, Message):
         await message_or_callback.answer("Головне меню:", reply_markup=keyboard)
@@ -59,9 +255,9 @@ async def start_handler(message: Message):
     logger.info(f'User {message.from_user.id} used /start command')
     await start_without_command(message)
 
-# Admin command to add a user to whitelist
+# Admin command to add a user to whitelist of the community
 @router.message(Command("whitelist_add"))
-async def whitelist_add(message: Message, command: CommandObject):
+async def whitelist_add(message: Message, command: CommandObject, community: Community):
     args = command.args
     if not args:
         await message.answer("Використання: /whitelist_add ID_або_username\nНаприклад:\n/whitelist_add 123456789\n/whitelist_add @username")
@@ -72,7 +268,8 @@ async def whitelist_add(message: Message, command: CommandObject):
     if arg.startswith('@'):
         # It's a username
         username = arg[1:]  # Remove @ sign
-        if add_user_to_whitelist(None, username):
+        if add_user_to_whitelist(community.id, None, username):
+            audit_log.record(community.id, message.from_user.id, 'whitelist_add', details=f"@{username}")
             await message.answer(f"✅ Користувача @{username} додано до білого списку.")
         else:
             await message.answer(f"❌ Помилка при додаванні користувача @{username} до білого списку.")
@@ -80,16 +277,17 @@ async def whitelist_add(message: Message, command: CommandObject):
         # It's a user_id
         try:
             user_id = int(arg)
-            if add_user_to_whitelist(user_id):
+            if add_user_to_whitelist(community.id, user_id):
+                audit_log.record(community.id, message.from_user.id, 'whitelist_add', target_id=user_id)
                 await message.answer(f"✅ Користувача з ID {user_id} додано до білого списку.")
             else:
                 await message.answer(f"❌ Помилка при додаванні користувача з ID {user_id} до білого списку.")
         except ValueError:
             await message.answer("❌ Невірний формат ID користувача. ID має бути числом.")
 
-# Admin command to remove a user from whitelist
+# Admin command to remove a user from whitelist of the community
 @router.message(Command("whitelist_remove"))
-async def whitelist_remove(message: Message, command: CommandObject):
+async def whitelist_remove(message: Message, command: CommandObject, community: Community):
     args = command.args
     if not args:
         await message.answer("Використання: /whitelist_remove ID_або_username\nНаприклад:\n/whitelist_remove 123456789\n/whitelist_remove @username")
@@ -100,7 +298,8 @@ async def whitelist_remove(message: Message, command: CommandObject):
     if arg.startswith('@'):
         # It's a username
         username = arg[1:]  # Remove @ sign
-        if remove_user_from_whitelist(username=username):
+        if remove_user_from_whitelist(community.id, username=username):
+            audit_log.record(community.id, message.from_user.id, 'whitelist_remove', details=f"@{username}")
             await message.answer(f"✅ Користувача @{username} видалено з білого списку.")
         else:
             await message.answer(f"❌ Користувача @{username} не знайдено в білому списку.")
@@ -108,23 +307,24 @@ async def whitelist_remove(message: Message, command: CommandObject):
         # It's a user_id
         try:
             user_id = int(arg)
-            if remove_user_from_whitelist(user_id=user_id):
+            if remove_user_from_whitelist(community.id, user_id=user_id):
+                audit_log.record(community.id, message.from_user.id, 'whitelist_remove', target_id=user_id)
                 await message.answer(f"✅ Користувача з ID {user_id} видалено з білого списку.")
             else:
                 await message.answer(f"❌ Користувача з ID {user_id} не знайдено в білому списку.")
         except ValueError:
             await message.answer("❌ Невірний формат ID користувача. ID має бути числом.")
 
-# Admin command to list all whitelisted users
+# Admin command to list all whitelisted users of the community
 @router.message(Command("whitelist_list"))
-async def whitelist_list(message: Message):
-    users = get_all_whitelisted_users()
+async def whitelist_list(message: Message, community: Community):
+    users = get_all_whitelisted_users(community.id)
     if not users:
         await message.answer("Білий список порожній.")
         return
     
     # Format the response
-    response = "📋 <b>Список дозволених користувачів:</b>\n\n"
+    response = f"📋 <b>Список дозволених користувачів спільноти «{html.escape(community.title)}»:</b>\n\n"
     for user_id, username, added_at in users:
         # Format date
         date_str = ""
@@ -144,23 +344,250 @@ async def whitelist_list(message: Message):
     
     await message.answer(response)
 
-@router.message(Command("send_prayer"))
-async def send_prayer_command(message: Message, state: FSMContext):
-    # Similar to the callback handler, but for command
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+# Admin command to find duplicate prayers of the community, "/duplicates merge" keeps only the oldest copy
+@router.message(Command("duplicates"))
+async def duplicates_command(message: Message, command: CommandObject, community: Community):
+    # Write pending "I prayed" marks first so they are moved with the duplicates
+    prayed_counter.flush()
+    groups = find_duplicate_prayers(community.id)
+    if not groups:
+        await message.answer("Повторних молитов не знайдено.")
+        return
     
-    # Get all categories
-    categories = get_all_categories()
+    duplicates_count = sum(len(group) - 1 for group in groups)
+    if (command.args or '').strip() != 'merge':
+        await message.answer(
+            f"Знайдено {duplicates_count} повторних молитов у {len(groups)} групах.\n"
+            f"Щоб залишити лише найстарішу копію, надішліть /duplicates merge"
+        )
+        return
     
-    # Create keyboard with categories
-    buttons = []
-    for category_id, category_name in categories:
-        buttons.append([InlineKeyboardButton(text=category_name, callback_data=f'category_{category_id}')])
+    deleted = merge_duplicate_prayers(groups)
+    audit_log.record(community.id, message.from_user.id, 'duplicates_merge', details=f"{deleted} prayers in {len(groups)} groups")
+    for group in groups:
+        for prayer_id in group:
+            prayed_counter.discard(prayer_id)
+    await message.answer(f"✅ Видалено {deleted} повторних молитов.")
+
+# Admin command to create a database backup now
+@router.message(Command("backup"))
+async def backup_command(message: Message, community: Community):
+    if backup_manager.running:
+        await message.answer("⏳ Резервна копія вже створюється, спробуйте пізніше.")
+        return
     
-    # Add back button
-    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
+    await message.answer("⏳ Створюю резервну копію...")
+    try:
+        # Write pending "I prayed" marks so they are included
+        prayed_counter.flush()
+        backup_path = await backup_manager.create_backup()
+    except Exception as e:
+        logger.error(f"Backup failed: {str(e)}")
+        await message.answer(f"❌ Не вдалося створити резервну копію: {str(e)}")
+        return
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    audit_log.record(community.id, message.from_user.id, 'backup', details=os.path.basename(backup_path))
+    size_kb = os.path.getsize(backup_path) / 1024
+    await message.answer(f"✅ Резервну копію створено: <code>{backup_path}</code> ({size_kb:.0f} КБ)")
+
+# Profiles running in the background, referenced so they are not garbage collected
+_profile_tasks = set()
+
+# Admin command to profile the bot for some seconds, the report is sent back as files
+@router.message(Command("profile"))
+async def profile_command(message: Message, command: CommandObject):
+    args = (command.args or '').strip()
+    try:
+        seconds = int(args) if args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        await message.answer(f"Використання: /profile секунди (від 1 до {PROFILE_MAX_SECONDS})\nНаприклад:\n/profile 30")
+        return
+    if profiler.running or _profile_tasks:
+        await message.answer("⏳ Профілювання вже триває, спробуйте пізніше.")
+        return
+    
+    # The profile runs outside of the update, so it doesn't hold a graceful shutdown
+    task = asyncio.create_task(send_profile(message, seconds))
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
+    await message.answer(f"⏳ Профілюю бота {seconds} с...")
+
+# Run a profile and send its report to the chat of the message
+async def send_profile(message: Message, seconds):
+    try:
+        result = await profiler.profile(seconds)
+        name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        await message.answer_document(
+            BufferedInputFile(result.report.encode('utf-8'), filename=f"{name}.txt"),
+            caption="Звіт профілювання"
+        )
+        await message.answer_document(
+            BufferedInputFile(result.collapsed, filename=f"{name}.folded"),
+            caption="Стеки для flamegraph.pl або speedscope"
+        )
+    except Exception as e:
+        logger.error(f"Profiling failed: {str(e)}")
+        await message.answer(f"❌ Не вдалося виконати профілювання: {str(e)}")
+
+# Admin command to show activity of the community, "/stats csv" sends the daily stats as a file
+@router.message(Command("stats"))
+async def stats_command(message: Message, command: CommandObject, community: Community):
+    if (command.args or '').strip() == 'csv':
+        data = build_stats_csv(community.id)
+        filename = f"stats-{community.id}-{datetime.now().strftime('%Y%m%d')}.csv"
+        await message.answer_document(BufferedInputFile(data, filename=filename))
+        return
+    
+    await message.answer(build_stats_report(community))
+
+# Admin command to make a user an admin of the community
+@router.message(Command("admin_add"))
+async def admin_add(message: Message, command: CommandObject, community: Community):
+    try:
+        user_id = int((command.args or '').strip())
+    except ValueError:
+        admins = ', '.join(f"<code>{admin_id}</code>" for admin_id in sorted(get_community_admins(community.id))) or 'немає'
+        await message.answer(
+            f"Використання: /admin_add ID\nНаприклад:\n/admin_add 123456789\n\n"
+            f"Адміністратори спільноти «{html.escape(community.title)}»: {admins}"
+        )
+        return
+    
+    if add_community_admin(community.id, user_id):
+        audit_log.record(community.id, message.from_user.id, 'admin_add', target_id=user_id)
+        await message.answer(f"✅ Користувач з ID {user_id} тепер адміністратор спільноти «{html.escape(community.title)}».")
+    else:
+        await message.answer(f"Користувач з ID {user_id} вже є адміністратором спільноти «{html.escape(community.title)}».")
+
+# Admin command to remove an admin of the community
+@router.message(Command("admin_remove"))
+async def admin_remove(message: Message, command: CommandObject, community: Community):
+    try:
+        user_id = int((command.args or '').strip())
+    except ValueError:
+        await message.answer("Використання: /admin_remove ID\nНаприклад:\n/admin_remove 123456789")
+        return
+    
+    if remove_community_admin(community.id, user_id):
+        audit_log.record(community.id, message.from_user.id, 'admin_remove', target_id=user_id)
+        await message.answer(f"✅ Користувач з ID {user_id} більше не адміністратор спільноти «{html.escape(community.title)}».")
+    else:
+        await message.answer(f"❌ Користувача з ID {user_id} немає серед адміністраторів спільноти.")
+
+# Admin command to add a category to the community
+@router.message(Command("category_add"))
+async def category_add(message: Message, command: CommandObject, community: Community):
+    name = ' '.join((command.args or '').split())
+    if not name:
+        await message.answer("Використання: /category_add Назва\nНаприклад:\n/category_add Родина")
+        return
+    
+    if add_category(community.id, name):
+        audit_log.record(community.id, message.from_user.id, 'category_add', details=name)
+        await message.answer(f"✅ Категорію «{html.escape(name)}» додано до спільноти «{html.escape(community.title)}».")
+    else:
+        await message.answer(f"❌ Категорія «{html.escape(name)}» вже існує або не може бути додана.")
+
+# Admin command to show the latest changes in the audit log, "/audit ID" shows changes made by one user
+@router.message(Command("audit"))
+async def audit_command(message: Message, command: CommandObject, community: Community):
+    args = (command.args or '').strip()
+    try:
+        actor_id = int(args) if args else None
+    except ValueError:
+        await message.answer("Використання: /audit або /audit ID\nНаприклад:\n/audit 123456789")
+        return
+    
+    entries = audit_log.fetch(community.id, actor_id)
+    if not entries:
+        await message.answer("Журнал змін порожній.")
+        return
+    
+    response = f"📜 <b>Журнал змін спільноти «{html.escape(community.title)}»:</b>\n\n"
+    for actor, action, target_id, before_hash, after_hash, details, created_at in entries:
+        line = f"{datetime.fromisoformat(created_at).strftime('%d.%m.%Y %H:%M')} — <code>{actor}</code>: {ACTION_LABELS.get(action, action)}"
+        if target_id is not None:
+            line += f" #{target_id}"
+        if details:
+            line += f" ({html.escape(details)})"
+        if before_hash or after_hash:
+            line += f"\n    <code>{(before_hash or '—')[:8]}</code> → <code>{(after_hash or '—')[:8]}</code>"
+        response += f"• {line}\n"
+    
+    await message.answer(response)
+
+# Command to show the community and, in private chats, choose another one
+@router.message(Command("community"))
+async def community_command(message: Message, community: Community):
+    if message.chat.type != 'private':
+        await message.answer(f"Ця група — спільнота «{html.escape(community.title)}».")
+        return
+    
+    user = message.from_user
+    communities = get_all_communities() if user.id == ADMIN_USER_ID else get_user_communities(user.id, user.username)
+    if len(communities) < 2:
+        await message.answer(f"Ви у спільноті «{html.escape(community.title)}».", reply_markup=back_to_menu_keyboard())
+        return
+    await message.answer(
+        f"Ви у спільноті «{html.escape(community.title)}». Оберіть спільноту:",
+        reply_markup=community_select_keyboard(communities, community.id)
+    )
+
+@callback_route(CallbackKind.SELECT_COMMUNITY)
+async def select_community_callback(callback_query: CallbackQuery, state: FSMContext, community: Community, community_id):
+    user = callback_query.from_user
+    communities = get_all_communities() if user.id == ADMIN_USER_ID else get_user_communities(user.id, user.username)
+    selected = next((item for item in communities if item.id == community_id), None)
+    if selected is None or callback_query.message.chat.type != 'private':
+        await callback_query.answer("Ця спільнота недоступна.", show_alert=False)
+        return
+    
+    select_community(user.id, selected.id)
+    # Prayer being written or edited belongs to the previous community
+    await state.clear()
+    await callback_query.answer(show_alert=False)
+    await callback_query.message.answer(f"✅ Обрано спільноту «{html.escape(selected.title)}».", reply_markup=main_menu_keyboard())
+
+# The bot was added to a group: the owner connects the group as a new community,
+# groups added by anyone else are left
+@router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=JOIN_TRANSITION))
+async def bot_added_to_group(event: ChatMemberUpdated, bot: Bot):
+    chat = event.chat
+    if chat.type == 'private' or get_community_by_chat(chat.id) is not None:
+        return
+    
+    if event.from_user.id != ADMIN_USER_ID:
+        logger.warning(f"User {event.from_user.id} added the bot to chat {chat.id}, leaving it")
+        try:
+            await bot.send_message(
+                chat.id, f"🙏 Щоб підключити бота до вашої групи, будь ласка, зв'яжіться з @{ADMIN_USERNAME}."
+            )
+            await bot.leave_chat(chat.id)
+        except Exception as e:
+            logger.error(f"Error leaving chat {chat.id}: {str(e)}")
+        return
+    
+    community = create_community(chat.id, chat.title)
+    audit_log.record(community.id, event.from_user.id, 'community_create', details=f"chat {chat.id}")
+    await bot.send_message(
+        chat.id,
+        f"✅ Групу підключено як спільноту «{html.escape(community.title)}». Молитви цієї групи бачать лише її учасники.\n"
+        f"Адміністратори спільноти додаються командою /admin_add ID.",
+        reply_markup=main_menu_keyboard()
+    )
+
+# A group became a supergroup and got a new chat ID
+@router.message(F.migrate_to_chat_id)
+async def group_migrated(message: Message):
+    move_community_chat(message.chat.id, message.migrate_to_chat_id)
+
+@router.message(Command("send_prayer"))
+async def send_prayer_command(message: Message, state: FSMContext, community: Community):
+    # Similar to the callback handler, but for command
+    # Keyboard with categories and back button
+    keyboard = category_select_keyboard(community.id)
     
     # Log user ID for debugging
     user_id = message.from_user.id
@@ -168,28 +595,13 @@ async def send_prayer_command(message: Message, state: FSMContext):
     
     await message.answer("Оберіть категорію молитви:", reply_markup=keyboard)
     await state.set_state(PrayerStates.selecting_category)
-    logger.info('State set to selecting_category')
+    logger.debug('State set to selecting_category')
 
 @router.message(Command("all_prayers"))
-async def all_prayers_command(message: Message):
+async def all_prayers_command(message: Message, community: Community):
     # Similar to the callback handler for all prayers
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    # Get all categories
-    categories = get_all_categories()
-    
-    # Create keyboard with categories
-    buttons = []
-    for category_id, category_name in categories:
-        buttons.append([InlineKeyboardButton(text=category_name, callback_data=f'allprayers_cat_{category_id}')])
-    
-    # Add "All categories" button
-    buttons.append([InlineKeyboardButton(text='Всі', callback_data='allprayers_cat_all')])
-    
-    # Add back button
-    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    # Keyboard with categories, "All" and back buttons
+    keyboard = all_prayers_categories_keyboard(community.id)
     
     logger.info(f'User {message.from_user.id} used /all_prayers command')
     await message.answer("Оберіть категорію молитв для перегляду:", reply_markup=keyboard)
@@ -202,11 +614,15 @@ async def handle_text(message: Message, state: FSMContext):
     
     # Log for debugging
     user_id = message.from_user.id
-    logger.info(f'handle_text triggered for user {user_id}. Current state: {current_state}')
+    logger.debug(f'handle_text triggered for user {user_id}. Current state: {current_state}')
     
     # If user is already in a state, let other handlers process the message
     if current_state is not None:
-        logger.info(f'User {user_id} is in state {current_state}, skipping generic text handler')
+        logger.debug(f'User {user_id} is in state {current_state}, skipping generic text handler')
+        return
+    
+    # In group chats the bot answers only to commands and buttons, not to conversation
+    if message.chat.type != 'private':
         return
     
     # For any text message from a new user, just show the main menu directly
@@ -215,325 +631,504 @@ async def handle_text(message: Message, state: FSMContext):
 
 # Handler for the Start button press
 async def start_without_command(message: Message):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='Надіслати молитву', callback_data='send_pray')],
-        [InlineKeyboardButton(text='Показати всі молитви', callback_data='show_all_prayers')],
-        [InlineKeyboardButton(text='Показати мої молитви', callback_data='show_my_prayers')],
-    ])
+    keyboard = main_menu_keyboard()
     
     await message.answer(
         "Вітаю! Я бот для запису ваших молитов.", 
         reply_markup=keyboard
     )
 
-@router.callback_query(F.data == "main_menu")
-async def main_menu_callback(callback_query: CallbackQuery, state: FSMContext):
+@callback_route(CallbackKind.MAIN_MENU)
+async def main_menu_callback(callback_query: CallbackQuery, state: FSMContext, community: Community):
     # Clear the state if it exists
     await state.clear()
     # Show the main menu
     await show_main_menu(callback_query)
 
-@router.callback_query(F.data == "send_pray")
-async def process_callback_send_pray(callback_query: CallbackQuery, state: FSMContext):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+@callback_route(CallbackKind.SEND_PRAY)
+async def process_callback_send_pray(callback_query: CallbackQuery, state: FSMContext, community: Community):
     await callback_query.answer(show_alert=False)
     
-    # Get all categories
-    categories = get_all_categories()
-    
-    # Create keyboard with categories
-    buttons = []
-    for category_id, category_name in categories:
-        buttons.append([InlineKeyboardButton(text=category_name, callback_data=f'category_{category_id}')])
-    
-    # Add back button
-    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    # Keyboard with categories and back button
+    keyboard = category_select_keyboard(community.id)
     
     # Log user ID for debugging
     user_id = callback_query.from_user.id
-    logger.info(f'User {user_id} is selecting a prayer category')
+    logger.debug(f'User {user_id} is selecting a prayer category')
     
     await callback_query.message.answer("Оберіть категорію молитви:", reply_markup=keyboard)
     await state.set_state(PrayerStates.selecting_category)
-    logger.info('State set to selecting_category')
+    logger.debug('State set to selecting_category')
 
-@router.callback_query(PrayerStates.selecting_category, F.data.startswith("category_"))
-async def process_category_selection(callback_query: CallbackQuery, state: FSMContext):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+@callback_route(CallbackKind.SELECT_CATEGORY)
+async def process_category_selection(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id):
     await callback_query.answer(show_alert=False)
     
-    # Extract category ID from callback data
-    category_id = int(callback_query.data.split("_")[1])
-    category_name = get_category_by_id(category_id)
+    # Category buttons work only while a category is being selected
+    if await state.get_state() != PrayerStates.selecting_category.state:
+        return
+    
+    # Categories of other communities can't be chosen
+    category_name = get_category_by_id(community.id, category_id)
+    if category_name is None:
+        return
     
     # Log category selection for debugging
     user_id = callback_query.from_user.id
     logger.info(f'User {user_id} selected category: {category_name} (ID: {category_id})')
     
-    # Store selected category in state
-    await state.update_data(selected_category_id=category_id, selected_category_name=category_name)
+    # A new prayer starts with an empty draft, data of an abandoned draft or edit is dropped
+    await state.set_data({'selected_category_id': category_id, 'selected_category_name': category_name})
     
     # Create keyboard with back button
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-    ])
+    keyboard = back_to_menu_keyboard()
     
     await callback_query.message.answer(
-        f"Ви обрали категорію: <b>{category_name}</b>\nБудь ласка, введіть вашу молитву:",
+        f"Ви обрали категорію: <b>{category_name}</b>\nБудь ласка, введіть вашу молитву. "
+        f"Довгу молитву можна надіслати кількома повідомленнями, потім натисніть «Готово».",
         reply_markup=keyboard
     )
     
     # Move to next state
     await state.set_state(PrayerStates.expecting_prayer)
-    logger.info(f'State set to expecting_prayer for user {user_id}')
+    logger.debug(f'State set to expecting_prayer for user {user_id}')
+
+# Pause (in seconds) after the last part of a draft before the draft is shown.
+# Telegram splits a long pasted text into several messages sent right after each other.
+DRAFT_DEBOUNCE = 2.0
+
+# Longest draft of a prayer (in characters)
+DRAFT_MAX_LENGTH = 20000
+
+# Length of the beginning of a draft shown in its preview
+DRAFT_PREVIEW_LENGTH = 300
+
+# Timers showing the preview of a draft, by FSM storage key
+_draft_timers = {}
 
 @router.message(PrayerStates.expecting_prayer)
-async def capture_prayer(message: Message, state: FSMContext):
+async def capture_prayer(message: Message, state: FSMContext, community: Community):
     # Log entry into the handler for debugging
-    logger.info(f'CAPTURE_PRAYER HANDLER TRIGGERED for user {message.from_user.id} with text "{message.text[:20]}..."')
+    logger.debug(f'capture_prayer triggered for user {message.from_user.id}')
     
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+    if not message.text:
+        await message.answer("Будь ласка, надішліть текст молитви.")
+        return
     
-    user_id = message.from_user.id
-    username = message.from_user.username or 'unknown'
-    first_name = message.from_user.first_name or ""
-    last_name = message.from_user.last_name or ""
-    prayer_text = message.text
+    # Consecutive messages are parts of one draft, it is saved as one prayer on "Done"
+    state_data = await state.get_data()
+    parts = state_data.get('draft_parts', [])
+    if sum(len(part) for part in parts) + len(message.text) > DRAFT_MAX_LENGTH:
+        await message.answer(
+            f"Молитва не може бути довшою за {DRAFT_MAX_LENGTH} символів. "
+            "Натисніть «Готово», щоб зберегти вже надісланий текст.",
+            reply_markup=draft_keyboard(edit='edit_prayer_id' in state_data)
+        )
+        return
     
-    logger.info(f'Received prayer text from user {user_id}')
+    # Every part is stored right away, so the draft survives a restart of the bot
+    await state.update_data(draft_parts=parts + [message.text])
+    logger.debug(f'Draft of user {message.from_user.id} has {len(parts) + 1} parts')
+    
+    # The preview is shown once the user stops sending parts
+    schedule_draft_preview(message.bot, message.chat.id, state)
+
+# Start the timer showing the preview of a draft, a pending timer of the draft is restarted
+def schedule_draft_preview(bot: Bot, chat_id, state: FSMContext):
+    cancel_draft_preview(state.key)
+    _draft_timers[state.key] = asyncio.create_task(show_draft_preview(bot, chat_id, state))
+
+# Stop the timer showing the preview of a draft
+def cancel_draft_preview(key):
+    timer = _draft_timers.pop(key, None)
+    if timer is not None:
+        timer.cancel()
+
+# Stop all timers on shutdown, their drafts are shown again after the restart (see resume_draft_previews)
+async def cancel_draft_previews():
+    timers = list(_draft_timers.values())
+    _draft_timers.clear()
+    for timer in timers:
+        timer.cancel()
+    await asyncio.gather(*timers, return_exceptions=True)
+
+# Show previews of drafts whose timers were stopped by a restart of the bot
+async def resume_draft_previews(bot: Bot, dispatcher: Dispatcher):
+    storage = dispatcher.fsm.storage
+    if not isinstance(storage, SQLiteStorage):
+        return
+    resumed = 0
+    for key, state_data in storage.find_states(PrayerStates.expecting_prayer.state):
+        parts = state_data.get('draft_parts')
+        if parts and state_data.get('draft_shown_parts') != len(parts):
+            schedule_draft_preview(bot, key.chat_id, FSMContext(storage=storage, key=key))
+            resumed += 1
+    if resumed:
+        logger.info(f"Resumed previews of {resumed} drafts")
+
+# Show the preview of a draft with the "Done" button after DRAFT_DEBOUNCE seconds
+async def show_draft_preview(bot: Bot, chat_id, state: FSMContext):
+    await asyncio.sleep(DRAFT_DEBOUNCE)
+    if _draft_timers.get(state.key) is asyncio.current_task():
+        del _draft_timers[state.key]
     
-    # Get state data
     state_data = await state.get_data()
-    logger.info(f'State data: {state_data}')
+    parts = state_data.get('draft_parts')
+    if await state.get_state() != PrayerStates.expecting_prayer.state or not parts:
+        return
+    
+    text = '\n'.join(parts)
+    beginning = text if len(text) <= DRAFT_PREVIEW_LENGTH else text[:DRAFT_PREVIEW_LENGTH] + '…'
+    try:
+        await bot.send_message(
+            chat_id,
+            f"📝 <b>Чернетка молитви</b> (частин: {len(parts)}, символів: {len(text)})\n\n"
+            f"{html.escape(beginning)}\n\n"
+            f"<i>Надішліть ще текст, щоб продовжити молитву, або натисніть «Готово», щоб зберегти її.</i>",
+            reply_markup=draft_keyboard(edit='edit_prayer_id' in state_data)
+        )
+    except Exception as e:
+        logger.error(f"Error sending draft preview to chat {chat_id}: {str(e)}")
+        return
+    
+    # A draft whose preview was not shown yet gets it after a restart. Updates of the chat
+    # may have saved, cancelled or extended the draft while the preview was being sent
+    async with chat_scheduler.lock(state.key):
+        state_data = await state.get_data()
+        if await state.get_state() != PrayerStates.expecting_prayer.state or state_data.get('draft_parts') != parts:
+            return
+        state_data['draft_shown_parts'] = len(parts)
+        await state.set_data(state_data)
+
+@callback_route(CallbackKind.DRAFT_DONE)
+async def draft_done(callback_query: CallbackQuery, state: FSMContext, community: Community):
+    state_data = await state.get_data()
+    parts = state_data.get('draft_parts')
+    if await state.get_state() != PrayerStates.expecting_prayer.state or not parts:
+        await callback_query.answer("Цю чернетку вже збережено або скасовано.", show_alert=True)
+        return
+    await callback_query.answer(show_alert=False)
+    
+    cancel_draft_preview(state.key)
+    
+    user = callback_query.from_user
+    user_id = user.id
+    username = user.username or 'unknown'
+    first_name = user.first_name or ""
+    last_name = user.last_name or ""
+    prayer_text = '\n'.join(parts)
+    message = callback_query.message
 
+    # Check if we're editing a segment of a long prayer
+    if 'edit_segment' in state_data:
+        prayer_id = state_data['edit_prayer_id']
+        start = state_data['edit_segment_start']
+        
+        logger.debug(f'Updating the segment at {start} of prayer {prayer_id} for user {user_id}')
+        
+        # Only the edited segment is replaced, the rest of the prayer stays as it is
+        try:
+            hashes = patch_prayer(community.id, prayer_id, start, state_data['edit_segment'], prayer_text, editor_id=user_id)
+        except Exception as e:
+            logger.error(f"Error updating the segment of prayer {prayer_id}: {str(e)}")
+            await answer_draft_not_saved(message, edit=True)
+            return
+        if hashes:
+            audit_log.record(
+                community.id, user_id, 'prayer_edit', target_id=prayer_id,
+                before_hash=hashes[0], after_hash=hashes[1], details=f"segment at {start}"
+            )
+            await message.answer(
+                f"✅ <b>Частину молитви оновлено!</b>",
+                reply_markup=segment_saved_keyboard(prayer_id)
+            )
+        else:
+            await message.answer(
+                "⚠️ Цю частину молитви змінено або видалено, поки ви її редагували. "
+                "Оберіть частину ще раз.",
+                reply_markup=segment_saved_keyboard(prayer_id)
+            )
     # Check if we're editing an existing prayer
-    if 'edit_prayer_id' in state_data:
+    elif 'edit_prayer_id' in state_data:
         prayer_id = state_data['edit_prayer_id']
         
         # Check if we need to update the category
         category_id = state_data.get('selected_category_id', None)
         
-        logger.info(f'Updating prayer {prayer_id} for user {user_id}')
+        logger.debug(f'Updating prayer {prayer_id} for user {user_id}')
         
-        # Update the prayer in the database
-        update_prayer(prayer_id, prayer_text, category_id)
+        # Update the prayer in the database, the draft is kept if it could not be saved
+        try:
+            hashes = update_prayer(community.id, prayer_id, prayer_text, category_id, editor_id=user_id)
+        except Exception as e:
+            logger.error(f"Error updating prayer {prayer_id}: {str(e)}")
+            await answer_draft_not_saved(message, edit=True)
+            return
         
         # Add a button to return to the main menu
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_menu_keyboard()
         
-        # Display information about what has been updated
-        await message.answer(
-            f"✅ <b>Молитву оновлено!</b>",
-            reply_markup=keyboard
-        )
+        if hashes:
+            audit_log.record(
+                community.id, user_id, 'prayer_edit', target_id=prayer_id,
+                before_hash=hashes[0], after_hash=hashes[1],
+                details=f"category {category_id}" if category_id is not None else None
+            )
+            
+            # Display information about what has been updated
+            await message.answer(
+                f"✅ <b>Молитву оновлено!</b>",
+                reply_markup=keyboard
+            )
+        else:
+            await message.answer(
+                "⚠️ Молитву не знайдено, можливо, її видалили, поки ви її редагували.",
+                reply_markup=keyboard
+            )
     else:
         # Get selected category from state
         category_id = state_data.get('selected_category_id')
         category_name = state_data.get('selected_category_name', 'Невідома')
         
-        logger.info(f'Inserting new prayer for user {user_id} in category {category_name} (ID: {category_id})')
-        
-        # Insert new prayer with category
-        insert_prayer(user_id, username, prayer_text, category_id, first_name, last_name)
+        logger.debug(f'Inserting new prayer for user {user_id} in category {category_name} (ID: {category_id})')
         
         # Add "Send prayer" button and the main menu button
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='Надіслати ще молитву', callback_data='send_pray')],
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = prayer_saved_keyboard()
+        
+        # The same prayer sent again right away (e.g. pasted twice) is already saved
+        if is_duplicate_submission(community.id, user_id, prayer_text):
+            await message.answer("Цю молитву вже записано.", reply_markup=keyboard)
+            await state.clear()
+            return
+        
+        # Insert new prayer with category, the draft is kept if it could not be saved
+        prayer_id = insert_prayer(community.id, user_id, username, prayer_text, category_id, first_name, last_name)
+        if prayer_id is None:
+            await answer_draft_not_saved(message)
+            return
+        
+        # Subscribers of the category are notified in the background
+        if category_id is not None:
+            notification_manager.enqueue(community.id, category_id, prayer_id, user_id, prayer_text)
         
         await message.answer(
             f"✅ <b>Молитву записано в категорії {category_name}.</b>",
             reply_markup=keyboard
         )
 
-    logger.info(f'Clearing state for user {user_id}')
+    logger.debug(f'Clearing state for user {user_id}')
     await state.clear()
 
+# Tell the user that a draft could not be saved, the draft stays and "Done" can be pressed again
+async def answer_draft_not_saved(message: Message, edit=False):
+    await message.answer(
+        "⚠️ Не вдалося зберегти молитву. Чернетка залишилася, спробуйте натиснути «Готово» ще раз.",
+        reply_markup=draft_keyboard(edit=edit)
+    )
+
 @router.message(Command("my_prayers"))
-async def my_prayers(message: Message):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    # Get all categories
-    categories = get_all_categories()
-    
-    # Create keyboard with categories
-    buttons = []
-    for category_id, category_name in categories:
-        buttons.append([InlineKeyboardButton(text=category_name, callback_data=f'myprayers_cat_{category_id}')])
-    
-    # Add "All categories" button
-    buttons.append([InlineKeyboardButton(text='Всі', callback_data='myprayers_cat_all')])
-    
-    # Add back button
-    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+async def my_prayers(message: Message, community: Community):
+    # Keyboard with categories, "All" and back buttons
+    keyboard = my_prayers_categories_keyboard(community.id)
     
     logger.info(f'User {message.from_user.id} used /my_prayers command')
     await message.answer("Оберіть категорію молитв для перегляду:", reply_markup=keyboard)
 
-@router.callback_query(F.data.startswith(('edit_', 'delete_')))
-async def prayer_callback(callback_query: CallbackQuery, state: FSMContext):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+@callback_route(CallbackKind.EDIT)
+async def edit_prayer(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id):
     await callback_query.answer(show_alert=False)
-    data = callback_query.data
     
     # Check if the user is admin
-    is_admin = callback_query.from_user.id == ADMIN_USER_ID
+    is_admin = is_community_admin(community.id, callback_query.from_user.id)
     
-    if data.startswith('edit_'):
-        prayer_id = int(data.split('_')[1])
-        result = get_prayer_by_id(prayer_id)
+    result = get_prayer_by_id(community.id, prayer_id)
+    
+    if result:
+        prayer_text, category_id, category_name = result
         
-        if result:
-            prayer_text, category_id, category_name = result
-            
-            # Also get the user_id of the prayer owner
-            cursor.execute('SELECT user_id FROM prayers WHERE id = ?', (prayer_id,))
-            owner_result = cursor.fetchone()
+        # Also get the user_id of the prayer owner
+        owner_id = get_prayer_owner(community.id, prayer_id)
+        
+        # Check if the user is the owner of the prayer or admin
+        if is_admin or owner_id == callback_query.from_user.id:
+            if is_admin and owner_id is not None and owner_id != callback_query.from_user.id:
+                admin_notice = f"Ви редагуєте чужу молитву як адміністратор.\n"
+            else:
+                admin_notice = ""
             
-            # Check if the user is the owner of the prayer or admin
-            if is_admin or (owner_result and owner_result[0] == callback_query.from_user.id):
-                # Check the prayer length for editing
-                if len(prayer_text) > 3072:
-                    # Prayer is too long to edit in Telegram
-                    # Create a keyboard with buttons for deletion and return to menu
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [
-                            InlineKeyboardButton(text='Видалити цю молитву', callback_data=f'delete_{prayer_id}'),
-                            InlineKeyboardButton(text='Скасувати', callback_data='cancel_edit')
-                        ],
-                        [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-                    ])
-                    
-                    # Send a warning to the user
-                    await callback_query.message.answer(
-                        text=f"⚠️ <b>Ця молитва занадто довга для редагування</b>\n\n"
-                             f"Через обмеження Telegram, дуже довгі молитви неможливо редагувати.\n"
-                             f"Ви можете видалити цю молитву та створити нову замість неї.",
-                        reply_markup=keyboard
-                    )
-                else:
-                    # Offer to choose a new category or keep the existing one
-                    categories = get_all_categories()
-                    
-                    # Create keyboard with categories and cancel button
-                    buttons = []
-                    for cat_id, cat_name in categories:
-                        if cat_id == category_id:
-                            # Mark the current category
-                            buttons.append([InlineKeyboardButton(text=f"✓ {cat_name}", callback_data=f'editcat_{prayer_id}_{cat_id}')])
-                        else:
-                            buttons.append([InlineKeyboardButton(text=cat_name, callback_data=f'editcat_{prayer_id}_{cat_id}')])
-                    
-                    buttons.append([InlineKeyboardButton(text='Скасувати', callback_data='cancel_edit')])
-                    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
-                    
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-                    
-                    # Send a message with category selection
-                    if is_admin and owner_result and owner_result[0] != callback_query.from_user.id:
-                        admin_notice = f"Ви редагуєте чужу молитву як адміністратор.\n"
-                    else:
-                        admin_notice = ""
-                    
-                    await callback_query.message.answer(
-                        text=f"✏️ <b>Редагування молитви</b>\n\n{admin_notice}"
-                             f"Поточна категорія: <b>{category_name or 'Не вказана'}</b>\n\n"
-                             f"Оберіть нову категорію або залиште поточну:",
-                        reply_markup=keyboard
-                    )
+            # A long prayer doesn't fit one message, it is edited segment by segment
+            if len(prayer_text) > PRAYER_SEGMENT_LENGTH:
+                segments = split_prayer_segments(prayer_text)
+                labels = tuple(format_segment_label(prayer_text[start:end]) for start, end in segments)
+                keyboard = prayer_segments_keyboard(prayer_id, labels)
+                
+                await callback_query.message.answer(
+                    text=f"✏️ <b>Редагування довгої молитви</b>\n\n{admin_notice}"
+                         f"Молитва розділена на частини: {len(segments)}. Оберіть частину, яку хочете змінити:",
+                    reply_markup=keyboard
+                )
             else:
-                # User is not authorized to edit this prayer
-                keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-                ])
+                # Offer to choose a new category or keep the existing one (current one is marked)
+                keyboard = edit_category_keyboard(community.id, prayer_id, category_id)
                 
+                # Send a message with category selection
                 await callback_query.message.answer(
-                    text='Ви не можете редагувати цю молитву, оскільки не є її автором.',
+                    text=f"✏️ <b>Редагування молитви</b>\n\n{admin_notice}"
+                         f"Поточна категорія: <b>{category_name or 'Не вказана'}</b>\n\n"
+                         f"Оберіть нову категорію або залиште поточну:",
                     reply_markup=keyboard
                 )
         else:
-            # Prayer not found
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-            ])
+            # User is not authorized to edit this prayer
+            keyboard = back_to_menu_keyboard()
             
             await callback_query.message.answer(
-                text='Вибачте, молитву не знайдено.',
+                text='Ви не можете редагувати цю молитву, оскільки не є її автором.',
                 reply_markup=keyboard
             )
+    else:
+        # Prayer not found
+        keyboard = back_to_menu_keyboard()
+        
+        await callback_query.message.answer(
+            text='Вибачте, молитву не знайдено.',
+            reply_markup=keyboard
+        )
+
+# Length of the beginning of a segment shown on its button
+SEGMENT_LABEL_LENGTH = 30
+
+# Format the label of a segment button: the beginning of the segment on one line
+def format_segment_label(segment):
+    label = ' '.join(segment.split())
+    return label if len(label) <= SEGMENT_LABEL_LENGTH else label[:SEGMENT_LABEL_LENGTH].rstrip() + '…'
+
+@callback_route(CallbackKind.EDIT_SEGMENT)
+async def edit_prayer_segment(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id, index):
+    await callback_query.answer(show_alert=False)
+    
+    # Check if the user is the owner of the prayer or admin
+    is_admin = is_community_admin(community.id, callback_query.from_user.id)
+    owner_id = get_prayer_owner(community.id, prayer_id)
+    if not is_admin and owner_id != callback_query.from_user.id:
+        await callback_query.message.answer(
+            text='Ви не можете редагувати цю молитву, оскільки не є її автором.',
+            reply_markup=back_to_menu_keyboard()
+        )
+        return
+    
+    # Segments are derived from the current text, a segment is addressed by its index
+    result = get_prayer_by_id(community.id, prayer_id)
+    segments = split_prayer_segments(result[0]) if result else []
+    if index >= len(segments):
+        await callback_query.message.answer(
+            text='Вибачте, цю частину молитви не знайдено.',
+            reply_markup=back_to_menu_keyboard()
+        )
+        return
+    start, end = segments[index]
+    segment = result[0][start:end]
+    
+    # The segment is kept to check that nobody changed it before the new text is saved
+    await state.set_data({
+        'edit_prayer_id': prayer_id,
+        'edit_segment_start': start,
+        'edit_segment': segment,
+    })
+    
+    admin_notice = ""
+    if is_admin and owner_id is not None and owner_id != callback_query.from_user.id:
+        admin_notice = "Ви редагуєте чужу молитву як адміністратор.\n\n"
+    
+    # Only the chosen segment is sent
+    await callback_query.message.answer(
+        text=f"✏️ <b>Частина {index + 1} з {len(segments)}</b>\n\n"
+             f"{admin_notice}{html.escape(segment.strip())}\n\n"
+             f"<i>Надішліть новий текст цієї частини (можна кількома повідомленнями) або натисніть Скасувати.</i>",
+        reply_markup=cancel_edit_keyboard()
+    )
+    
+    # Set state to expect the new text of the segment
+    await state.set_state(PrayerStates.expecting_prayer)
 
-    elif data.startswith('delete_'):
-        prayer_id = int(data.split('_')[1])
+@callback_route(CallbackKind.DELETE)
+async def delete_prayer_callback(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id):
+    await callback_query.answer(show_alert=False)
+    
+    # Check if the user is admin
+    is_admin = is_community_admin(community.id, callback_query.from_user.id)
+    
+    # Get the user_id of the prayer owner
+    owner_id = get_prayer_owner(community.id, prayer_id)
+    
+    # Check if the user is the owner of the prayer or admin
+    if is_admin or owner_id == callback_query.from_user.id:
+        # "I prayed" marks not saved yet are kept, the prayer can be restored until it is purged
+        content_hash = delete_prayer(community.id, prayer_id)
+        if content_hash is None:
+            await callback_query.message.answer(
+                text='Вибачте, молитву не знайдено.',
+                reply_markup=back_to_menu_keyboard()
+            )
+            return
+        audit_log.record(
+            community.id, callback_query.from_user.id, 'prayer_delete', target_id=prayer_id,
+            before_hash=content_hash, details=f"author {owner_id}"
+        )
         
-        # Get the user_id of the prayer owner
-        cursor.execute('SELECT user_id FROM prayers WHERE id = ?', (prayer_id,))
-        owner_result = cursor.fetchone()
+        # The deletion can be undone until the purge job removes the prayer
+        keyboard = prayer_deleted_keyboard(prayer_id)
+        undo_notice = f"\nВидалення можна скасувати протягом {DELETE_UNDO_WINDOW // 60} хв."
         
-        # Check if the user is the owner of the prayer or admin
-        if is_admin or (owner_result and owner_result[0] == callback_query.from_user.id):
-            delete_prayer(prayer_id)
-            
-            # Add a button to return to the main menu
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-            ])
-            
-            # If admin is deleting someone else's prayer, show a special message
-            if is_admin and owner_result and owner_result[0] != callback_query.from_user.id:
-                await callback_query.message.answer(
-                    text='Молитву видалено адміністратором.',
-                    reply_markup=keyboard
-                )
-            else:
-                await callback_query.message.answer(
-                    text='Молитву видалено.',
-                    reply_markup=keyboard
-                )
+        # If admin is deleting someone else's prayer, show a special message
+        if is_admin and owner_id is not None and owner_id != callback_query.from_user.id:
+            await callback_query.message.answer(
+                text='Молитву видалено адміністратором.' + undo_notice,
+                reply_markup=keyboard
+            )
         else:
-            # User is not authorized to delete this prayer
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-            ])
-            
             await callback_query.message.answer(
-                text='Ви не можете видалити цю молитву, оскільки не є її автором.',
+                text='Молитву видалено.' + undo_notice,
                 reply_markup=keyboard
             )
+    else:
+        # User is not authorized to delete this prayer
+        keyboard = back_to_menu_keyboard()
+        
+        await callback_query.message.answer(
+            text='Ви не можете видалити цю молитву, оскільки не є її автором.',
+            reply_markup=keyboard
+        )
 
-@router.callback_query(F.data.startswith("editcat_"))
-async def edit_prayer_category(callback_query: CallbackQuery, state: FSMContext):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+@callback_route(CallbackKind.UNDO_DELETE)
+async def undo_delete_callback(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id):
+    user_id = callback_query.from_user.id
+    owner_id = get_deleted_prayer_owner(community.id, prayer_id)
+    if owner_id is None or not (owner_id == user_id or is_community_admin(community.id, user_id)):
+        await callback_query.answer("Цю молитву вже не можна відновити.", show_alert=True)
+        return
     
-    # Check if the user is admin
-    is_admin = callback_query.from_user.id == ADMIN_USER_ID
+    content_hash = restore_prayer(community.id, prayer_id)
+    if content_hash is None:
+        await callback_query.answer("Цю молитву вже не можна відновити.", show_alert=True)
+        return
+    audit_log.record(community.id, user_id, 'prayer_restore', target_id=prayer_id, after_hash=content_hash)
     
-    # Parse the callback data to get prayer_id and category_id
-    _, prayer_id, category_id = callback_query.data.split("_")
-    prayer_id = int(prayer_id)
-    category_id = int(category_id)
+    await callback_query.answer(show_alert=False)
+    await callback_query.message.answer("↩️ Молитву відновлено.", reply_markup=back_to_menu_keyboard())
+
+@callback_route(CallbackKind.EDIT_CATEGORY)
+async def edit_prayer_category(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id, category_id):
+    # Check if the user is admin
+    is_admin = is_community_admin(community.id, callback_query.from_user.id)
     
     # Get the prayer owner user_id
-    cursor.execute('SELECT user_id FROM prayers WHERE id = ?', (prayer_id,))
-    owner_result = cursor.fetchone()
+    owner_id = get_prayer_owner(community.id, prayer_id)
     
     # Check if the user is the owner of the prayer or admin
-    if not is_admin and (not owner_result or owner_result[0] != callback_query.from_user.id):
+    if not is_admin and owner_id != callback_query.from_user.id:
         # User is not authorized to edit this prayer
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_menu_keyboard()
         
         await callback_query.message.answer(
             text='Ви не можете редагувати цю молитву, оскільки не є її автором.',
@@ -543,36 +1138,34 @@ async def edit_prayer_category(callback_query: CallbackQuery, state: FSMContext)
         return
     
     # Get the category name
-    category_name = get_category_by_id(category_id)
+    category_name = get_category_by_id(community.id, category_id)
     
     # Get the prayer text
-    result = get_prayer_by_id(prayer_id)
-    if result:
+    result = get_prayer_by_id(community.id, prayer_id)
+    if result and category_name is not None:
         prayer_text = result[0]
         
-        # Store the prayer ID and category in state
-        await state.update_data(
-            edit_prayer_id=prayer_id,
-            selected_category_id=category_id,
-            selected_category_name=category_name
-        )
+        # Store the prayer ID and category in state, data of an abandoned draft or edit is dropped
+        await state.set_data({
+            'edit_prayer_id': prayer_id,
+            'selected_category_id': category_id,
+            'selected_category_name': category_name,
+        })
         
         # Create keyboard with back button
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='Скасувати', callback_data='cancel_edit')],
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = cancel_edit_keyboard()
         
         # If admin is editing someone else's prayer, show a notice
         admin_notice = ""
-        if is_admin and owner_result and owner_result[0] != callback_query.from_user.id:
+        if is_admin and owner_id is not None and owner_id != callback_query.from_user.id:
             admin_notice = "Ви редагуєте чужу молитву як адміністратор.\n\n"
         
         # Send a message with category selection
         await callback_query.message.answer(
             text=f"✏️ <b>Редагування молитви в категорії {category_name}</b>\n\n"
                  f"{admin_notice}{prayer_text}\n\n"
-                 f"<i>Будь ласка, надішліть новий текст молитви або натисніть Скасувати.</i>",
+                 f"<i>Будь ласка, надішліть новий текст молитви (можна кількома повідомленнями) "
+                 f"або натисніть Скасувати.</i>",
             reply_markup=keyboard
         )
         
@@ -580,9 +1173,7 @@ async def edit_prayer_category(callback_query: CallbackQuery, state: FSMContext)
         await state.set_state(PrayerStates.expecting_prayer)
     else:
         # Prayer not found
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_menu_keyboard()
         
         await callback_query.message.answer(
             text='Вибачте, молитву не знайдено.',
@@ -591,75 +1182,118 @@ async def edit_prayer_category(callback_query: CallbackQuery, state: FSMContext)
     
     await callback_query.answer(show_alert=False)
 
-@router.callback_query(F.data == "cancel_edit")
-async def cancel_edit(callback_query: CallbackQuery, state: FSMContext):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+@callback_route(CallbackKind.CANCEL_EDIT)
+async def cancel_edit(callback_query: CallbackQuery, state: FSMContext, community: Community):
     await state.clear()
     await callback_query.answer("Редагування скасовано", show_alert=True)
     
     # Add a button to return to the main menu
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-    ])
+    keyboard = back_to_menu_keyboard()
     
     await callback_query.message.answer(
         "Редагування молитви скасовано.",
         reply_markup=keyboard
     )
 
-@router.callback_query(F.data == "show_my_prayers")
-async def show_my_prayers(callback_query: CallbackQuery):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+@callback_route(CallbackKind.REMIND)
+async def choose_reminder_interval(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id):
+    await callback_query.answer(show_alert=False)
     
-    # Get all categories
-    categories = get_all_categories()
+    if not prayer_exists(community.id, prayer_id):
+        await callback_query.message.answer("Молитву не знайдено.", reply_markup=back_to_menu_keyboard())
+        return
     
-    # Create keyboard with categories
-    buttons = []
-    for category_id, category_name in categories:
-        buttons.append([InlineKeyboardButton(text=category_name, callback_data=f'myprayers_cat_{category_id}')])
+    await callback_query.message.answer(
+        "Як часто нагадувати про цю молитву?",
+        reply_markup=reminder_interval_keyboard(prayer_id)
+    )
+
+@callback_route(CallbackKind.REMIND_SET)
+async def set_reminder(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id, days):
+    if days not in REMINDER_INTERVALS or not prayer_exists(community.id, prayer_id):
+        await callback_query.answer("Не вдалося встановити нагадування.", show_alert=True)
+        return
     
-    # Add "All categories" button
-    buttons.append([InlineKeyboardButton(text='Всі', callback_data='myprayers_cat_all')])
+    interval_seconds = days * 24 * 60 * 60
+    next_run_at = int(time.time()) + interval_seconds
+    reminder_id = upsert_reminder(
+        callback_query.from_user.id, callback_query.message.chat.id, prayer_id, interval_seconds, next_run_at
+    )
+    reminder_scheduler.schedule(reminder_id, next_run_at)
     
-    # Add back button
-    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
+    await callback_query.answer(show_alert=False)
+    await callback_query.message.answer(
+        f"🔔 Нагадування встановлено: {REMINDER_INTERVALS[days]}.",
+        reply_markup=back_to_menu_keyboard()
+    )
+
+@callback_route(CallbackKind.REMIND_STOP)
+async def stop_reminder(callback_query: CallbackQuery, state: FSMContext, community: Community, reminder_id):
+    if delete_reminder(reminder_id, callback_query.from_user.id):
+        await callback_query.answer("🔕 Нагадування вимкнено", show_alert=False)
+    else:
+        await callback_query.answer("Нагадування вже вимкнено", show_alert=False)
+
+@callback_route(CallbackKind.READ_FULL)
+async def read_full_prayer(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id):
+    await callback_query.answer(show_alert=False)
+    
+    result = get_prayer_by_id(community.id, prayer_id)
+    if not result:
+        await callback_query.message.answer("Молитву не знайдено.", reply_markup=back_to_menu_keyboard())
+        return
+    
+    prayer_text, _, category_name = result
+    category_info = f"<b>Категорія: {category_name or 'Не вказана'}</b>\n\n"
+    await send_long_message(callback_query.message, category_info, prayer_text, prayer_card_keyboard(prayer_id))
+
+@callback_route(CallbackKind.PRAYED)
+async def mark_prayed(callback_query: CallbackQuery, state: FSMContext, community: Community, prayer_id):
+    if not prayer_exists(community.id, prayer_id):
+        await callback_query.answer("Молитву не знайдено.", show_alert=False)
+        return
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    if prayed_counter.mark(callback_query.from_user.id, prayer_id):
+        text = "🙏 Дякуємо за молитву!"
+    else:
+        text = "Ви вже молилися за цю молитву."
+    await callback_query.answer(f"{text} Помолилися: {prayed_counter.get_count(prayer_id)}", show_alert=False)
+
+@callback_route(CallbackKind.SHOW_MY_PRAYERS)
+async def show_my_prayers(callback_query: CallbackQuery, state: FSMContext, community: Community):
+    # Keyboard with categories, "All" and back buttons
+    keyboard = my_prayers_categories_keyboard(community.id)
     
     await callback_query.message.answer("Оберіть категорію молитв для перегляду:", reply_markup=keyboard)
     await callback_query.answer(show_alert=False)
 
-@router.callback_query(F.data.startswith("myprayers_cat_"))
-async def show_my_prayers_by_category(callback_query: CallbackQuery):
-    category_param = callback_query.data.split("_")[-1]
-    
-    if category_param == 'all':
+@callback_route(CallbackKind.MY_PRAYERS_CATEGORY)
+async def show_my_prayers_by_category(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id):
+    if category_id == ALL_CATEGORIES:
         # Show all prayers from user (using pagination)
-        await show_my_prayers_page(callback_query, 0)
+        await show_my_prayers_page(callback_query, community, 0)
     else:
         # Show prayers from specific category
-        category_id = int(category_param)
-        await show_my_prayers_page_by_category(callback_query, category_id, 0)
+        await show_my_prayers_page_by_category(callback_query, community, category_id, 0)
 
 # Function to show user's prayers with pagination
-async def show_my_prayers_page(callback_query: CallbackQuery, offset=0, batch_size=5):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+async def show_my_prayers_page(callback_query: CallbackQuery, community: Community, offset=0, batch_size=5):
     user_id = callback_query.from_user.id
-    logger.info(f'Fetching user prayers with offset={offset}, batch_size={batch_size}')
+    logger.debug(f'Fetching user prayers with offset={offset}, batch_size={batch_size}')
     
-    # Count total prayers from this user
-    cursor.execute('SELECT COUNT(*) FROM prayers WHERE user_id = ?', (user_id,))
-    total_prayers = cursor.fetchone()[0]
+    # Count total prayers from this user, under load one more prayer is fetched instead to know if there is a next page
+    total_prayers = None if overload_controller.degraded else count_user_prayers(community.id, user_id)
+    
+    # Get prayers with pagination for this user
+    prayers = fetch_user_prayers_page(
+        community.id, user_id, limit=batch_size if total_prayers is not None else batch_size + 1, offset=offset
+    )
+    has_next = offset + batch_size < total_prayers if total_prayers is not None else len(prayers) > batch_size
+    prayers = prayers[:batch_size]
     
-    if total_prayers == 0:
+    if not prayers:
         # If no prayers
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_my_prayers')],
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_categories_keyboard(CallbackKind.SHOW_MY_PRAYERS)
         
         await callback_query.message.answer(
             'У вас немає записаних молитов.',
@@ -668,121 +1302,48 @@ async def show_my_prayers_page(callback_query: CallbackQuery, offset=0, batch_si
         await callback_query.answer(show_alert=False)
         return
     
-    # Get prayers with pagination for this user
-    cursor.execute('''
-    SELECT p.id, p.prayer, c.name
-    FROM prayers p
-    LEFT JOIN categories c ON p.category_id = c.id
-    WHERE p.user_id = ?
-    ORDER BY p.created_at DESC
-    LIMIT ? OFFSET ?
-    ''', (user_id, batch_size, offset))
-    prayers = cursor.fetchall()
-    
-    # Telegram message length limit (4096 characters)
-    MAX_MESSAGE_LENGTH = 4000  # Slightly less than the limit for safety
-    
-    # Show prayers from current page
-    for prayer_id, prayer_text, category_name in prayers:
-        # Create keyboard for actions with prayer
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text='Редагувати', callback_data=f'edit_{prayer_id}'),
-                InlineKeyboardButton(text='Видалити', callback_data=f'delete_{prayer_id}')
-            ]
-        ])
-        
-        # Add category to message
-        category_info = f"<b>Категорія: {category_name or 'Не вказана'}</b>\n\n"
-        
-        # Check message length
-        if len(prayer_text) + len(category_info) <= MAX_MESSAGE_LENGTH:
-            # If message is not too long, send it completely with keyboard
-            await callback_query.message.answer(f"{category_info}{prayer_text}", reply_markup=keyboard)
-        else:
-            # If message is too long, split it into parts
-            # Send header with category first
-            await callback_query.message.answer(category_info)
-            
-            # Split long text into parts
-            remaining_text = prayer_text
-            part_number = 1
-            total_parts = (len(prayer_text) + MAX_MESSAGE_LENGTH - 1) // MAX_MESSAGE_LENGTH
-            
-            while remaining_text:
-                # Calculate size of next part
-                chunk_size = min(MAX_MESSAGE_LENGTH, len(remaining_text))
-                # Extract part of text
-                chunk = remaining_text[:chunk_size]
-                # Update remaining text
-                remaining_text = remaining_text[chunk_size:]
-                
-                # Add information about part of message
-                part_info = f"<i>Частина {part_number}/{total_parts}</i>\n\n" if total_parts > 1 else ""
-                
-                # Send last part with keyboard, others without keyboard
-                if not remaining_text:  # If this is the last part
-                    await callback_query.message.answer(f"{part_info}{chunk}", reply_markup=keyboard)
-                else:
-                    await callback_query.message.answer(f"{part_info}{chunk}")
-                
-                part_number += 1
-    
     # Create navigation buttons
-    nav_buttons = []
+    prev_args = None
+    next_args = None
     
     # "Back" button if this is not the first page
     if offset > 0:
         prev_offset = max(0, offset - batch_size)
-        nav_buttons.append(
-            InlineKeyboardButton(text='⬅️ Попередні', callback_data=f'myprayers_page_{prev_offset}')
-        )
+        prev_args = (prev_offset,)
     
     # "Next" button if there are more prayers
-    if offset + batch_size < total_prayers:
+    if has_next:
         next_offset = offset + batch_size
-        nav_buttons.append(
-            InlineKeyboardButton(text='Наступні ➡️', callback_data=f'myprayers_page_{next_offset}')
-        )
+        next_args = (next_offset,)
     
     # Page information
-    start_idx = offset + 1
-    end_idx = min(offset + batch_size, total_prayers)
-    page_info = f"Ваші молитви {start_idx}-{end_idx} з {total_prayers}"
+    page_info = format_page_info("Ваші молитви", offset, len(prayers), total_prayers)
     
     # Form keyboard
-    keyboard_rows = []
-    if nav_buttons:
-        keyboard_rows.append(nav_buttons)
-    keyboard_rows.append([InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_my_prayers')])
-    keyboard_rows.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
+    keyboard = pagination_keyboard(CallbackKind.SHOW_MY_PRAYERS, CallbackKind.MY_PRAYERS_PAGE, prev_args, next_args)
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    
-    # Send message with navigation and page information
-    await callback_query.message.answer(page_info, reply_markup=keyboard)
-    
-    # Answer callback_query to remove loading clock
-    await callback_query.answer(show_alert=False)
+    await send_my_prayers(callback_query, prayers, page_info, keyboard)
 
 # Function to show user's prayers from specific category with pagination
-async def show_my_prayers_page_by_category(callback_query: CallbackQuery, category_id, offset=0, batch_size=5):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+async def show_my_prayers_page_by_category(callback_query: CallbackQuery, community: Community, category_id, offset=0, batch_size=5):
     user_id = callback_query.from_user.id
-    category_name = get_category_by_id(category_id)
-    logger.info(f'Fetching user prayers for category_id={category_id} with offset={offset}, batch_size={batch_size}')
+    category_name = get_category_by_id(community.id, category_id)
+    logger.debug(f'Fetching user prayers for category_id={category_id} with offset={offset}, batch_size={batch_size}')
     
-    # Count prayers from this user in this category
-    cursor.execute('SELECT COUNT(*) FROM prayers WHERE user_id = ? AND category_id = ?', (user_id, category_id))
-    total_prayers = cursor.fetchone()[0]
+    # Count prayers from this user in this category, under load one more prayer is fetched instead
+    total_prayers = None if overload_controller.degraded else count_user_prayers(community.id, user_id, category_id)
     
-    if total_prayers == 0:
+    # Get prayers with pagination for this user and category
+    prayers = fetch_user_prayers_page(
+        community.id, user_id, category_id, limit=batch_size if total_prayers is not None else batch_size + 1,
+        offset=offset
+    )
+    has_next = offset + batch_size < total_prayers if total_prayers is not None else len(prayers) > batch_size
+    prayers = prayers[:batch_size]
+    
+    if not prayers:
         # If no prayers in this category
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_my_prayers')],
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_categories_keyboard(CallbackKind.SHOW_MY_PRAYERS)
         
         await callback_query.message.answer(
             f'У вас немає записаних молитов в категорії {category_name}.',
@@ -791,175 +1352,114 @@ async def show_my_prayers_page_by_category(callback_query: CallbackQuery, catego
         await callback_query.answer(show_alert=False)
         return
     
-    # Get prayers with pagination for this user and category
-    cursor.execute('''
-    SELECT p.id, p.prayer, c.name
-    FROM prayers p
-    LEFT JOIN categories c ON p.category_id = c.id
-    WHERE p.user_id = ? AND p.category_id = ?
-    ORDER BY p.created_at DESC
-    LIMIT ? OFFSET ?
-    ''', (user_id, category_id, batch_size, offset))
-    prayers = cursor.fetchall()
-    
-    # Telegram message length limit (4096 characters)
-    MAX_MESSAGE_LENGTH = 4000  # Slightly less than the limit for safety
-    
-    # Show prayers from current page
-    for prayer_id, prayer_text, category_name in prayers:
-        # Create keyboard for actions with prayer
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text='Редагувати', callback_data=f'edit_{prayer_id}'),
-                InlineKeyboardButton(text='Видалити', callback_data=f'delete_{prayer_id}')
-            ]
-        ])
-        
-        # Add category to message
-        category_info = f"<b>Категорія: {category_name or 'Не вказана'}</b>\n\n"
-        
-        # Check message length
-        if len(prayer_text) + len(category_info) <= MAX_MESSAGE_LENGTH:
-            # If message is not too long, send it completely with keyboard
-            await callback_query.message.answer(f"{category_info}{prayer_text}", reply_markup=keyboard)
-        else:
-            # If message is too long, split it into parts
-            # Send header with category first
-            await callback_query.message.answer(category_info)
-            
-            # Split long text into parts
-            remaining_text = prayer_text
-            part_number = 1
-            total_parts = (len(prayer_text) + MAX_MESSAGE_LENGTH - 1) // MAX_MESSAGE_LENGTH
-            
-            while remaining_text:
-                # Calculate size of next part
-                chunk_size = min(MAX_MESSAGE_LENGTH, len(remaining_text))
-                # Extract part of text
-                chunk = remaining_text[:chunk_size]
-                # Update remaining text
-                remaining_text = remaining_text[chunk_size:]
-                
-                # Add information about part of message
-                part_info = f"<i>Частина {part_number}/{total_parts}</i>\n\n" if total_parts > 1 else ""
-                
-                # Send last part with keyboard, others without keyboard
-                if not remaining_text:  # If this is the last part
-                    await callback_query.message.answer(f"{part_info}{chunk}", reply_markup=keyboard)
-                else:
-                    await callback_query.message.answer(f"{part_info}{chunk}")
-                
-                part_number += 1
-    
     # Create navigation buttons
-    nav_buttons = []
+    prev_args = None
+    next_args = None
     
     # "Back" button if this is not the first page
     if offset > 0:
         prev_offset = max(0, offset - batch_size)
-        nav_buttons.append(
-            InlineKeyboardButton(text='⬅️ Попередні', callback_data=f'mycat_page_{category_id}_{prev_offset}')
-        )
+        prev_args = (category_id, prev_offset)
     
     # "Next" button if there are more prayers
-    if offset + batch_size < total_prayers:
+    if has_next:
         next_offset = offset + batch_size
-        nav_buttons.append(
-            InlineKeyboardButton(text='Наступні ➡️', callback_data=f'mycat_page_{category_id}_{next_offset}')
-        )
+        next_args = (category_id, next_offset)
     
     # Page information
-    start_idx = offset + 1
-    end_idx = min(offset + batch_size, total_prayers)
-    page_info = f"Ваші молитви {start_idx}-{end_idx} з {total_prayers} в категорії {category_name}"
+    page_info = f"{format_page_info('Ваші молитви', offset, len(prayers), total_prayers)} в категорії {category_name}"
     
     # Form keyboard
-    keyboard_rows = []
-    if nav_buttons:
-        keyboard_rows.append(nav_buttons)
-    keyboard_rows.append([InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_my_prayers')])
-    keyboard_rows.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    
-    # Send message with navigation and page information
-    await callback_query.message.answer(page_info, reply_markup=keyboard)
+    keyboard = pagination_keyboard(CallbackKind.SHOW_MY_PRAYERS, CallbackKind.MY_CATEGORY_PAGE, prev_args, next_args)
     
-    # Answer callback_query to remove loading clock
-    await callback_query.answer(show_alert=False)
+    await send_my_prayers(callback_query, prayers, page_info, keyboard)
 
 # Handler for switching between user prayer pages
-@router.callback_query(F.data.startswith("myprayers_page_"))
-async def handle_my_prayers_pagination(callback_query: CallbackQuery):
-    # Extract page number from callback_data
-    offset = int(callback_query.data.split("_")[-1])
+@callback_route(CallbackKind.MY_PRAYERS_PAGE)
+async def handle_my_prayers_pagination(callback_query: CallbackQuery, state: FSMContext, community: Community, offset):
     # Show next page
-    await show_my_prayers_page(callback_query, offset)
+    await show_my_prayers_page(callback_query, community, offset)
 
 # Handler for switching between user prayer pages by category
-@router.callback_query(F.data.startswith("mycat_page_"))
-async def handle_my_category_prayer_pagination(callback_query: CallbackQuery):
-    # Extract category_id and page number from callback_data
-    parts = callback_query.data.split("_")
-    category_id = int(parts[2])
-    offset = int(parts[3])
+@callback_route(CallbackKind.MY_CATEGORY_PAGE)
+async def handle_my_category_prayer_pagination(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id, offset):
     # Show next page for specific category
-    await show_my_prayers_page_by_category(callback_query, category_id, offset)
+    await show_my_prayers_page_by_category(callback_query, community, category_id, offset)
 
-@router.callback_query(F.data == "show_all_prayers")
-async def show_all_prayers(callback_query: CallbackQuery):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    # Get all categories
-    categories = get_all_categories()
-    
-    # Create keyboard with categories
-    buttons = []
-    for category_id, category_name in categories:
-        buttons.append([InlineKeyboardButton(text=category_name, callback_data=f'allprayers_cat_{category_id}')])
-    
-    # Add "All categories" button
-    buttons.append([InlineKeyboardButton(text='Всі', callback_data='allprayers_cat_all')])
-    
-    # Add back button
-    buttons.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+@callback_route(CallbackKind.SHOW_ALL_PRAYERS)
+async def show_all_prayers(callback_query: CallbackQuery, state: FSMContext, community: Community):
+    # Keyboard with categories, "All" and back buttons
+    keyboard = all_prayers_categories_keyboard(community.id)
     
     await callback_query.message.answer("Оберіть категорію молитв для перегляду:", reply_markup=keyboard)
     await callback_query.answer(show_alert=False)
 
-@router.callback_query(F.data.startswith("allprayers_cat_"))
-async def show_all_prayers_by_category(callback_query: CallbackQuery):
-    category_param = callback_query.data.split("_")[-1]
-    
-    if category_param == 'all':
+@callback_route(CallbackKind.SHOW_SUBSCRIPTIONS)
+async def show_subscriptions(callback_query: CallbackQuery, state: FSMContext, community: Community):
+    subscribed = fetch_user_subscriptions(callback_query.from_user.id, community.id)
+    await callback_query.message.answer(
+        "Оберіть категорії, про нові молитви в яких ви хочете отримувати сповіщення. "
+        "Позначені категорії вже обрано, натисніть ще раз, щоб відписатися.",
+        reply_markup=subscriptions_keyboard(community.id, subscribed)
+    )
+    await callback_query.answer(show_alert=False)
+
+@callback_route(CallbackKind.SUBSCRIBE)
+async def subscribe_callback(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id):
+    category_name = get_category_by_id(community.id, category_id)
+    if category_name is None:
+        await callback_query.answer("Категорію не знайдено.", show_alert=True)
+        return
+    subscribe(callback_query.from_user.id, community.id, category_id)
+    await update_subscriptions_keyboard(callback_query, community)
+    await callback_query.answer(f"🔔 Ви отримуватимете сповіщення про нові молитви в категорії {category_name}.")
+
+@callback_route(CallbackKind.UNSUBSCRIBE)
+async def unsubscribe_callback(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id):
+    category_name = get_category_by_id(community.id, category_id) or 'Невідома'
+    unsubscribe(callback_query.from_user.id, community.id, category_id)
+    await update_subscriptions_keyboard(callback_query, community)
+    await callback_query.answer(f"🔕 Сповіщення про нові молитви в категорії {category_name} вимкнено.")
+
+# Mark the current subscriptions of the user in the keyboard of the message
+async def update_subscriptions_keyboard(callback_query: CallbackQuery, community: Community):
+    subscribed = fetch_user_subscriptions(callback_query.from_user.id, community.id)
+    try:
+        await callback_query.message.edit_reply_markup(reply_markup=subscriptions_keyboard(community.id, subscribed))
+    except TelegramBadRequest:
+        # The keyboard already shows these subscriptions
+        pass
+
+@callback_route(CallbackKind.ALL_PRAYERS_CATEGORY)
+async def show_all_prayers_by_category(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id):
+    if category_id == ALL_CATEGORIES:
         # Show all prayers from all categories (using existing pagination)
-        await show_prayers_page(callback_query, 0)
+        await show_prayers_page(callback_query, community, 0)
     else:
         # Show prayers from specific category
-        category_id = int(category_param)
-        await show_prayers_page_by_category(callback_query, category_id, 0)
+        await show_prayers_page_by_category(callback_query, community, category_id, 0)
 
 # Modified function to show prayers with pagination filtered by category
-async def show_prayers_page_by_category(callback_query: CallbackQuery, category_id, offset=0, batch_size=5):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+async def show_prayers_page_by_category(callback_query: CallbackQuery, community: Community, category_id, offset=0, batch_size=5):
     # Check if the user is admin
-    is_admin = callback_query.from_user.id == ADMIN_USER_ID
+    is_admin = is_community_admin(community.id, callback_query.from_user.id)
+    
+    category_name = get_category_by_id(community.id, category_id)
+    logger.debug(f'Fetching prayers for category_id={category_id} with offset={offset}, batch_size={batch_size}')
     
-    category_name = get_category_by_id(category_id)
-    logger.info(f'Fetching prayers for category_id={category_id} with offset={offset}, batch_size={batch_size}')
+    # Count prayers in this category, under load one more prayer is fetched instead to know if there is a next page
+    total_prayers = None if overload_controller.degraded else count_prayers_by_category(community.id, category_id)
     
-    # Count prayers in this category
-    total_prayers = count_prayers_by_category(category_id)
+    # Get prayers with pagination for specific category
+    prayers = fetch_feed_page(
+        community.id, category_id, batch_size if total_prayers is not None else batch_size + 1, offset
+    )
+    has_next = offset + batch_size < total_prayers if total_prayers is not None else len(prayers) > batch_size
+    prayers = prayers[:batch_size]
     
-    if total_prayers == 0:
+    if not prayers:
         # If no prayers in this category
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_all_prayers')],
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_categories_keyboard(CallbackKind.SHOW_ALL_PRAYERS)
         
         await callback_query.message.answer(
             f'Поки що немає жодної молитви в категорії {category_name}.',
@@ -968,183 +1468,57 @@ async def show_prayers_page_by_category(callback_query: CallbackQuery, category_
         await callback_query.answer(show_alert=False)
         return
     
-    # Get prayers with pagination for specific category
-    prayers = fetch_all_prayers_by_category(category_id, limit=batch_size, offset=offset)
-    
-    # Telegram message length limit (4096 characters)
-    MAX_MESSAGE_LENGTH = 4000  # Slightly less than the limit for safety
-    
-    # Show prayers from current page
-    for prayer in prayers:
-        prayer_text = prayer[0]  # Prayer text is first element
-        prayer_username = prayer[1]  # Username is the second element
-        prayer_user_id = None  # We need to query for the user_id
-        category_name = prayer[5] if len(prayer) > 5 else "Не вказана"  # Category is sixth element
-        
-        # Get prayer_id to enable admin edit/delete functionality
-        if is_admin:
-            # Get the id of this prayer by querying the database
-            cursor.execute('''
-            SELECT id, user_id FROM prayers 
-            WHERE prayer = ? AND username = ? AND category_id = ?
-            ''', (prayer_text, prayer_username, category_id))
-            result = cursor.fetchone()
-            prayer_id = result[0] if result else None
-            prayer_user_id = result[1] if result else None
-            
-            # Create keyboard with edit/delete buttons for admin
-            admin_keyboard = None
-            if prayer_id:
-                admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text='✏️ Редагувати', callback_data=f'edit_{prayer_id}'),
-                        InlineKeyboardButton(text='🗑️ Видалити', callback_data=f'delete_{prayer_id}')
-                    ]
-                ])
-        
-        # Get name and surname, or use username if they don't exist
-        author = "Анонім"
-        
-        # Check first_name and last_name fields
-        if len(prayer) > 3:  # If first_name exists
-            first_name = prayer[3] if prayer[3] else ""
-            last_name = ""
-            if len(prayer) > 4:  # If last_name exists
-                last_name = prayer[4] if prayer[4] else ""
-            
-            # If name or surname exists, use them
-            if first_name or last_name:
-                author = f"{first_name} {last_name}".strip()
-        
-        # If author couldn't be formed from name and surname, use username
-        if author == "Анонім" and prayer[1]:
-            author = prayer[1]
-        
-        # Format date if it exists
-        created_at = ""
-        if len(prayer) > 2 and prayer[2]:
-            try:
-                # Try to convert date string to datetime object
-                date_obj = datetime.fromisoformat(prayer[2])
-                # Format date to more readable form
-                created_at = f" ({date_obj.strftime('%d.%m.%Y')})"
-            except:
-                # If date couldn't be converted, ignore
-                pass
-        
-        # Format message header
-        header = f"<b>Молитва від {author}{created_at}</b>\n"
-        if is_admin and prayer_user_id:
-            header += f"<b>ID користувача:</b> <code>{prayer_user_id}</code>\n"
-        header += f"<b>Категорія: {category_name}</b>\n\n"
-        
-        # Check message length
-        if len(prayer_text) + len(header) <= MAX_MESSAGE_LENGTH:
-            # If message is not too long, send it completely
-            if is_admin and admin_keyboard:
-                await callback_query.message.answer(f"{header}{prayer_text}", reply_markup=admin_keyboard)
-            else:
-                await callback_query.message.answer(f"{header}{prayer_text}")
-        else:
-            # If message is too long, split it into parts
-            # Send header first
-            await callback_query.message.answer(header)
-            
-            # Split long text into parts
-            remaining_text = prayer_text
-            part_number = 1
-            total_parts = (len(prayer_text) + MAX_MESSAGE_LENGTH - 1) // MAX_MESSAGE_LENGTH
-            
-            while remaining_text:
-                # Calculate size of next part
-                chunk_size = min(MAX_MESSAGE_LENGTH, len(remaining_text))
-                # Extract part of text
-                chunk = remaining_text[:chunk_size]
-                # Update remaining text
-                remaining_text = remaining_text[chunk_size:]
-                
-                # Add information about part of message
-                part_info = f"<i>Частина {part_number}/{total_parts}</i>\n\n" if total_parts > 1 else ""
-                
-                # Only add admin keyboard to the last chunk if we're admin
-                if not remaining_text and is_admin and admin_keyboard:
-                    await callback_query.message.answer(f"{part_info}{chunk}", reply_markup=admin_keyboard)
-                else:
-                    await callback_query.message.answer(f"{part_info}{chunk}")
-                part_number += 1
-    
     # Create navigation buttons
-    nav_buttons = []
+    prev_args = None
+    next_args = None
     
     # "Back" button if this is not the first page
     if offset > 0:
         prev_offset = max(0, offset - batch_size)
-        nav_buttons.append(
-            InlineKeyboardButton(text='⬅️ Попередні', callback_data=f'cat_page_{category_id}_{prev_offset}')
-        )
+        prev_args = (category_id, prev_offset)
     
     # "Next" button if there are more prayers
-    if offset + batch_size < total_prayers:
+    if has_next:
         next_offset = offset + batch_size
-        nav_buttons.append(
-            InlineKeyboardButton(text='Наступні ➡️', callback_data=f'cat_page_{category_id}_{next_offset}')
-        )
+        next_args = (category_id, next_offset)
     
     # Page information
-    start_idx = offset + 1
-    end_idx = min(offset + batch_size, total_prayers)
-    page_info = f"Молитви {start_idx}-{end_idx} з {total_prayers} в категорії {category_name}"
+    page_info = f"{format_page_info('Молитви', offset, len(prayers), total_prayers)} в категорії {category_name}"
     
     # Form keyboard
-    keyboard_rows = []
-    if nav_buttons:
-        keyboard_rows.append(nav_buttons)
-    keyboard_rows.append([InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_all_prayers')])
-    keyboard_rows.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
+    keyboard = pagination_keyboard(CallbackKind.SHOW_ALL_PRAYERS, CallbackKind.CATEGORY_PAGE, prev_args, next_args)
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    
-    # Send message with navigation and page information
-    await callback_query.message.answer(page_info, reply_markup=keyboard)
-    
-    # Answer callback_query to remove loading clock
-    await callback_query.answer(show_alert=False)
+    await send_feed_prayers(callback_query, prayers, is_admin, page_info, keyboard)
 
 # Handler for switching between prayer pages by category
-@router.callback_query(F.data.startswith("cat_page_"))
-async def handle_category_prayer_pagination(callback_query: CallbackQuery):
-    # Extract category_id and page number from callback_data
-    parts = callback_query.data.split("_")
-    category_id = int(parts[2])
-    offset = int(parts[3])
+@callback_route(CallbackKind.CATEGORY_PAGE)
+async def handle_category_prayer_pagination(callback_query: CallbackQuery, state: FSMContext, community: Community, category_id, offset):
     # Show next page for specific category
-    await show_prayers_page_by_category(callback_query, category_id, offset)
+    await show_prayers_page_by_category(callback_query, community, category_id, offset)
 
-@router.callback_query(F.data.startswith("prayers_page_"))
-async def handle_prayer_pagination(callback_query: CallbackQuery):
-    # Extract the page number from callback_data
-    offset = int(callback_query.data.split("_")[-1])
+@callback_route(CallbackKind.PRAYERS_PAGE)
+async def handle_prayer_pagination(callback_query: CallbackQuery, state: FSMContext, community: Community, offset):
     # Show next page
-    await show_prayers_page(callback_query, offset)
+    await show_prayers_page(callback_query, community, offset)
 
 # Function for gradual display of all prayers with pagination
-async def show_prayers_page(callback_query: CallbackQuery, offset=0, batch_size=5):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
+async def show_prayers_page(callback_query: CallbackQuery, community: Community, offset=0, batch_size=5):
     # Check if the user is admin
-    is_admin = callback_query.from_user.id == ADMIN_USER_ID
+    is_admin = is_community_admin(community.id, callback_query.from_user.id)
+    
+    logger.debug(f'Fetching prayers with offset={offset}, batch_size={batch_size}')
     
-    logger.info(f'Fetching prayers with offset={offset}, batch_size={batch_size}')
+    # Get the total number of prayers for pagination, under load one more prayer is fetched instead
+    total_prayers = None if overload_controller.degraded else count_all_prayers(community.id)
     
-    # Get the total number of prayers for pagination
-    total_prayers = count_all_prayers()
+    # Get a portion of prayers with pagination
+    prayers = fetch_feed_page(community.id, None, batch_size if total_prayers is not None else batch_size + 1, offset)
+    has_next = offset + batch_size < total_prayers if total_prayers is not None else len(prayers) > batch_size
+    prayers = prayers[:batch_size]
     
-    if total_prayers == 0:
+    if not prayers:
         # If there are no prayers
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_all_prayers')],
-            [InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')]
-        ])
+        keyboard = back_to_categories_keyboard(CallbackKind.SHOW_ALL_PRAYERS)
         
         await callback_query.message.answer(
             'Поки що немає жодної молитви.',
@@ -1153,149 +1527,79 @@ async def show_prayers_page(callback_query: CallbackQuery, offset=0, batch_size=
         await callback_query.answer(show_alert=False)
         return
     
-    # Get a portion of prayers with pagination
-    prayers = fetch_all_prayers(limit=batch_size, offset=offset)
-    
-    # Telegram message length limit (4096 characters)
-    MAX_MESSAGE_LENGTH = 4000  # Slightly less than the limit for safety
-    
-    # Show prayers from the current page
-    for prayer in prayers:
-        prayer_text = prayer[0]  # Prayer text is the first element
-        prayer_username = prayer[1]  # Username is the second element
-        prayer_user_id = None  # We need to query for the user_id
-        category_name = prayer[5] if len(prayer) > 5 else "Не вказана"  # Category is the sixth element
-        
-        # Get prayer_id to enable admin edit/delete functionality
-        if is_admin:
-            # Get the id of this prayer by querying the database
-            cursor.execute('''
-            SELECT id, user_id, category_id FROM prayers 
-            WHERE prayer = ? AND username = ?
-            ''', (prayer_text, prayer_username))
-            result = cursor.fetchone()
-            prayer_id = result[0] if result else None
-            prayer_user_id = result[1] if result else None
-            
-            # Create keyboard with edit/delete buttons for admin
-            admin_keyboard = None
-            if prayer_id:
-                admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text='✏️ Редагувати', callback_data=f'edit_{prayer_id}'),
-                        InlineKeyboardButton(text='🗑️ Видалити', callback_data=f'delete_{prayer_id}')
-                    ]
-                ])
-        
-        # Get name and surname, or use username if they don't exist
-        author = "Анонім"
-        
-        # Check first_name and last_name fields
-        if len(prayer) > 3:  # If first_name exists
-            first_name = prayer[3] if prayer[3] else ""
-            last_name = ""
-            if len(prayer) > 4:  # If last_name exists
-                last_name = prayer[4] if prayer[4] else ""
-            
-            # If name or surname exists, use them
-            if first_name or last_name:
-                author = f"{first_name} {last_name}".strip()
-        
-        # If author couldn't be formed from name and surname, use username
-        if author == "Анонім" and prayer[1]:
-            author = prayer[1]
-        
-        # Format date if it exists
-        created_at = ""
-        if len(prayer) > 2 and prayer[2]:
-            try:
-                # Try to convert date string to datetime object
-                date_obj = datetime.fromisoformat(prayer[2])
-                # Format date to more readable form
-                created_at = f" ({date_obj.strftime('%d.%m.%Y')})"
-            except:
-                # If date couldn't be converted, ignore
-                pass
-        
-        # Format message header
-        header = f"<b>Молитва від {author}{created_at}</b>\n"
-        if is_admin and prayer_user_id:
-            header += f"<b>ID користувача:</b> <code>{prayer_user_id}</code>\n"
-        header += f"<b>Категорія: {category_name}</b>\n\n"
-        
-        # Check message length
-        if len(prayer_text) + len(header) <= MAX_MESSAGE_LENGTH:
-            # If message is not too long, send it completely
-            if is_admin and admin_keyboard:
-                await callback_query.message.answer(f"{header}{prayer_text}", reply_markup=admin_keyboard)
-            else:
-                await callback_query.message.answer(f"{header}{prayer_text}")
-        else:
-            # If message is too long, split it into parts
-            # Send header first
-            await callback_query.message.answer(header)
-            
-            # Split long text into parts
-            remaining_text = prayer_text
-            part_number = 1
-            total_parts = (len(prayer_text) + MAX_MESSAGE_LENGTH - 1) // MAX_MESSAGE_LENGTH
-            
-            while remaining_text:
-                # Calculate size of next part
-                chunk_size = min(MAX_MESSAGE_LENGTH, len(remaining_text))
-                # Extract part of text
-                chunk = remaining_text[:chunk_size]
-                # Update remaining text
-                remaining_text = remaining_text[chunk_size:]
-                
-                # Add information about part of message
-                part_info = f"<i>Частина {part_number}/{total_parts}</i>\n\n" if total_parts > 1 else ""
-                
-                # Only add admin keyboard to the last chunk if we're admin
-                if not remaining_text and is_admin and admin_keyboard:
-                    await callback_query.message.answer(f"{part_info}{chunk}", reply_markup=admin_keyboard)
-                else:
-                    await callback_query.message.answer(f"{part_info}{chunk}")
-                part_number += 1
-    
     # Create navigation buttons
-    nav_buttons = []
+    prev_args = None
+    next_args = None
     
     # "Back" button if this is not the first page
     if offset > 0:
         prev_offset = max(0, offset - batch_size)
-        nav_buttons.append(
-            InlineKeyboardButton(text='⬅️ Попередні', callback_data=f'prayers_page_{prev_offset}')
-        )
+        prev_args = (prev_offset,)
     
     # "Next" button if there are more prayers
-    if offset + batch_size < total_prayers:
+    if has_next:
         next_offset = offset + batch_size
-        nav_buttons.append(
-            InlineKeyboardButton(text='Наступні ➡️', callback_data=f'prayers_page_{next_offset}')
-        )
+        next_args = (next_offset,)
     
     # Page information
-    start_idx = offset + 1
-    end_idx = min(offset + batch_size, total_prayers)
-    page_info = f"Молитви {start_idx}-{end_idx} з {total_prayers}"
+    page_info = format_page_info("Молитви", offset, len(prayers), total_prayers)
     
     # Form the keyboard
-    keyboard_rows = []
-    if nav_buttons:
-        keyboard_rows.append(nav_buttons)
-    keyboard_rows.append([InlineKeyboardButton(text='↩️ Назад до категорій', callback_data='show_all_prayers')])
-    keyboard_rows.append([InlineKeyboardButton(text='🏠 До головного меню', callback_data='main_menu')])
+    keyboard = pagination_keyboard(CallbackKind.SHOW_ALL_PRAYERS, CallbackKind.PRAYERS_PAGE, prev_args, next_args)
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
-    
-    # Send a message with navigation and page information
-    await callback_query.message.answer(page_info, reply_markup=keyboard)
+    await send_feed_prayers(callback_query, prayers, is_admin, page_info, keyboard)
+
+# Build an inline result for a prayer, long prayers are cut to fit into one message
+def build_inline_result(prayer):
+    prayer_text, category_name, prayer_id = prayer[0], prayer[5], prayer[6]
+    header = format_prayer_header(prayer, is_admin=False)
+    if len(header) + len(prayer_text) > MAX_MESSAGE_LENGTH:
+        prayer_text = prayer_text[:MAX_MESSAGE_LENGTH - len(header) - 1] + '…'
+    
+    return InlineQueryResultArticle(
+        id=str(prayer_id),
+        title=f"{category_name or 'Без категорії'}: {prayer_text[:50]}",
+        description=prayer_text[:200],
+        input_message_content=InputTextMessageContent(message_text=f"{header}{prayer_text}")
+    )
+
+# Inline mode: "@bot <category or text>" shows matching prayers of the user's community, newest first
+@router.inline_query()
+async def inline_prayers(inline_query: InlineQuery, community: Community):
+    query = normalize_inline_query(inline_query.query)
+    cache_key = (query, inline_query.offset)
+    inline_results_cache = get_inline_results_cache(community.id)
+    
+    cached = inline_results_cache.get(cache_key)
+    if cached is None:
+        category_id, text = parse_inline_query(community.id, query)
+        prayers = search_prayers(
+            community.id, category_id, text, decode_inline_offset(inline_query.offset), limit=INLINE_RESULTS_LIMIT
+        )
+        results = [build_inline_result(prayer) for prayer in prayers]
+        # Position after the last prayer, Telegram sends it back for the next page
+        next_offset = encode_inline_offset(prayers[-1]) if len(prayers) == INLINE_RESULTS_LIMIT else ''
+        cached = (results, next_offset)
+        inline_results_cache.set(cache_key, cached)
+    
+    results, next_offset = cached
+    # Results are personal so Telegram does not show them to users outside the whitelist
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TTL, is_personal=True, next_offset=next_offset)
+
+# Single entry point for all callback buttons, routed by the decoded callback kind
+@router.callback_query()
+async def dispatch_callback(callback_query: CallbackQuery, state: FSMContext, community: Community):
+    callback = decode_callback(callback_query.data)
+    handler = callback_routes.get(callback.kind) if callback else None
+    
+    if handler is None:
+        logger.warning(f'Unhandled callback data {callback_query.data!r} from user {callback_query.from_user.id}')
+        await callback_query.answer("Ця кнопка застаріла. Будь ласка, відкрийте меню знову.", show_alert=False)
+        return
     
-    # Answer callback_query to remove loading clock
-    await callback_query.answer(show_alert=False)
+    await handler(callback_query, state, community, *callback.args)
 
-def register_handlers(dp: Dispatcher, admin_filter=None):
+def register_handlers(dp: Dispatcher, admin_filter=None, owner_filter=None):
     # Log the handlers registration
     logger.info('Registering message handlers')
     
@@ -1309,12 +1613,24 @@ def register_handlers(dp: Dispatcher, admin_filter=None):
     command_router.message.register(send_prayer_command, Command("send_prayer"))
     command_router.message.register(my_prayers, Command("my_prayers"))
     command_router.message.register(all_prayers_command, Command("all_prayers"))
+    command_router.message.register(community_command, Command("community"))
     
     # Register admin commands with admin filter
     if admin_filter:
         admin_router.message.register(whitelist_add, Command("whitelist_add"), admin_filter)
         admin_router.message.register(whitelist_remove, Command("whitelist_remove"), admin_filter)
         admin_router.message.register(whitelist_list, Command("whitelist_list"), admin_filter)
+        admin_router.message.register(duplicates_command, Command("duplicates"), admin_filter)
+        admin_router.message.register(stats_command, Command("stats"), admin_filter)
+        admin_router.message.register(admin_add, Command("admin_add"), admin_filter)
+        admin_router.message.register(admin_remove, Command("admin_remove"), admin_filter)
+        admin_router.message.register(category_add, Command("category_add"), admin_filter)
+        admin_router.message.register(audit_command, Command("audit"), admin_filter)
+    
+    # Backups cover all communities, only the bot owner can create them
+    if owner_filter:
+        admin_router.message.register(backup_command, Command("backup"), owner_filter)
+        admin_router.message.register(profile_command, Command("profile"), owner_filter)
     
     # Add the PrayerStates.expecting_prayer handler first (high priority)
     priority_router.message.register(capture_prayer, PrayerStates.expecting_prayer)
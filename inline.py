@@ -0,0 +1,91 @@
+import logging
+import time
+from collections import OrderedDict
+
+from database import get_all_categories
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Number of prayers in one page of inline results
+INLINE_RESULTS_LIMIT = 20
+
+# How long (in seconds) inline results are cached by the bot and by Telegram
+INLINE_CACHE_TTL = 30
+
+# Maximum number of cached inline queries
+INLINE_CACHE_SIZE = 1024
+
+class InlineResultsCache:
+    """
+    Caches inline results by (query, offset) for a short time.
+    Telegram sends a new inline query on almost every typed character,
+    so repeated queries are served without touching the database.
+    Each community has its own cache (see get_inline_results_cache).
+    """
+
+    def __init__(self, ttl=INLINE_CACHE_TTL, max_size=INLINE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+# Normalize an inline query so that equivalent queries share a cache entry
+def normalize_inline_query(query):
+    return ' '.join(query.split()).lower()
+
+# Parse a normalized inline query: a category name of the community or a text to search for.
+# Returns (category_id, text), both None for an empty query.
+def parse_inline_query(community_id, query):
+    if not query:
+        return None, None
+    for category_id, category_name in get_all_categories(community_id):
+        if category_name.lower() == query:
+            return category_id, None
+    return None, query
+
+# Encode the position after the last prayer of a page as next_offset
+def encode_inline_offset(prayer):
+    created_at, prayer_id = prayer[2], prayer[6]
+    return f"{created_at or ''}|{prayer_id}"
+
+# Decode next_offset into (created_at, prayer_id), None for the first page
+def decode_inline_offset(offset):
+    if not offset:
+        return None
+    created_at, _, prayer_id = offset.rpartition('|')
+    try:
+        return created_at, int(prayer_id)
+    except ValueError:
+        logger.warning(f"Invalid inline offset {offset!r}")
+        return None
+
+# Inline results caches by community ID, so queries of a large community
+# never evict cached results of the others
+_inline_results_caches = {}
+
+# Get the inline results cache of a community
+def get_inline_results_cache(community_id):
+    cache = _inline_results_caches.get(community_id)
+    if cache is None:
+        cache = _inline_results_caches[community_id] = InlineResultsCache()
+    return cache
@@ -0,0 +1,239 @@
+from functools import lru_cache
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from database import get_all_categories, get_categories_version
+from callbacks import CallbackKind, ALL_CATEGORIES, REMINDER_INTERVALS, encode_callback
+
+# Keyboards are built once and shared between all handlers and users.
+# Keyboards that depend on categories are cached per community and its categories version,
+# so they are rebuilt automatically when the categories change.
+# Cached markups must never be modified by callers.
+
+# Common buttons
+MAIN_MENU_BUTTON_TEXT = '🏠 До головного меню'
+BACK_TO_CATEGORIES_BUTTON_TEXT = '↩️ Назад до категорій'
+
+def _button(text, kind, *args):
+    return InlineKeyboardButton(text=text, callback_data=encode_callback(kind, *args))
+
+def _main_menu_row():
+    return [_button(MAIN_MENU_BUTTON_TEXT, CallbackKind.MAIN_MENU)]
+
+# Main menu keyboard
+@lru_cache(maxsize=None)
+def main_menu_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button('Надіслати молитву', CallbackKind.SEND_PRAY)],
+        [_button('Показати всі молитви', CallbackKind.SHOW_ALL_PRAYERS)],
+        [_button('Показати мої молитви', CallbackKind.SHOW_MY_PRAYERS)],
+    ])
+
+# Keyboard with a single button to return to the main menu
+@lru_cache(maxsize=None)
+def back_to_menu_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[_main_menu_row()])
+
+# Keyboard shown after a prayer was recorded
+@lru_cache(maxsize=None)
+def prayer_saved_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button('Надіслати ще молитву', CallbackKind.SEND_PRAY)],
+        _main_menu_row(),
+    ])
+
+# Keyboard shown while a prayer is being edited
+@lru_cache(maxsize=None)
+def cancel_edit_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button('Скасувати', CallbackKind.CANCEL_EDIT)],
+        _main_menu_row(),
+    ])
+
+# Keyboard to return to the categories list (SHOW_MY_PRAYERS or SHOW_ALL_PRAYERS)
+@lru_cache(maxsize=None)
+def back_to_categories_keyboard(categories_kind):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button(BACK_TO_CATEGORIES_BUTTON_TEXT, categories_kind)],
+        _main_menu_row(),
+    ])
+
+# Keyboard for choosing a category of a new prayer
+def category_select_keyboard(community_id):
+    return _category_select_keyboard(community_id, get_categories_version(community_id))
+
+@lru_cache(maxsize=256)
+def _category_select_keyboard(community_id, version):
+    buttons = [
+        [_button(category_name, CallbackKind.SELECT_CATEGORY, category_id)]
+        for category_id, category_name in get_all_categories(community_id)
+    ]
+    buttons.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+# Keyboard for browsing all prayers by category
+def all_prayers_categories_keyboard(community_id):
+    return _browse_categories_keyboard(CallbackKind.ALL_PRAYERS_CATEGORY, community_id, get_categories_version(community_id))
+
+# Keyboard for browsing user's own prayers by category
+def my_prayers_categories_keyboard(community_id):
+    return _browse_categories_keyboard(CallbackKind.MY_PRAYERS_CATEGORY, community_id, get_categories_version(community_id))
+
+@lru_cache(maxsize=512)
+def _browse_categories_keyboard(kind, community_id, version):
+    buttons = [[_button(category_name, kind, category_id)] for category_id, category_name in get_all_categories(community_id)]
+    # Add "All categories" button
+    buttons.append([_button('Всі', kind, ALL_CATEGORIES)])
+    if kind == CallbackKind.ALL_PRAYERS_CATEGORY:
+        buttons.append([_button('🔔 Сповіщення про нові молитви', CallbackKind.SHOW_SUBSCRIPTIONS)])
+    buttons.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+# Keyboard for subscribing to new prayers of categories, subscribed categories are marked
+def subscriptions_keyboard(community_id, subscribed):
+    return _subscriptions_keyboard(community_id, subscribed, get_categories_version(community_id))
+
+@lru_cache(maxsize=512)
+def _subscriptions_keyboard(community_id, subscribed, version):
+    buttons = [
+        [_button(f"✓ {category_name}", CallbackKind.UNSUBSCRIBE, category_id)] if category_id in subscribed
+        else [_button(category_name, CallbackKind.SUBSCRIBE, category_id)]
+        for category_id, category_name in get_all_categories(community_id)
+    ]
+    buttons.append([_button(BACK_TO_CATEGORIES_BUTTON_TEXT, CallbackKind.SHOW_ALL_PRAYERS)])
+    buttons.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+# Keyboard for changing the category of an existing prayer, the current category is marked
+def edit_category_keyboard(community_id, prayer_id, current_category_id):
+    return _edit_category_keyboard(community_id, prayer_id, current_category_id, get_categories_version(community_id))
+
+@lru_cache(maxsize=256)
+def _edit_category_keyboard(community_id, prayer_id, current_category_id, version):
+    buttons = [
+        [_button(text, CallbackKind.EDIT_CATEGORY, prayer_id, cat_id)]
+        for cat_id, text in _edit_category_template(community_id, current_category_id, version)
+    ]
+    buttons.append([_button('Скасувати', CallbackKind.CANCEL_EDIT)])
+    buttons.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@lru_cache(maxsize=256)
+def _edit_category_template(community_id, current_category_id, version):
+    # Button texts do not depend on the prayer, only on the current category
+    return tuple(
+        (cat_id, f"✓ {cat_name}" if cat_id == current_category_id else cat_name)
+        for cat_id, cat_name in get_all_categories(community_id)
+    )
+
+REMIND_BUTTON_TEXT = '🔔 Нагадувати'
+PRAYED_BUTTON_TEXT = '🙏 Я помолився'
+READ_FULL_BUTTON_TEXT = '📖 Читати повністю'
+
+def _prayer_card_row(prayer_id):
+    return [
+        _button(PRAYED_BUTTON_TEXT, CallbackKind.PRAYED, prayer_id),
+        _button(REMIND_BUTTON_TEXT, CallbackKind.REMIND, prayer_id),
+    ]
+
+# Keyboard with edit/delete buttons under a prayer
+@lru_cache(maxsize=1024)
+def prayer_actions_keyboard(prayer_id, admin=False, read_full=False):
+    if admin:
+        edit_text, delete_text = '✏️ Редагувати', '🗑️ Видалити'
+    else:
+        edit_text, delete_text = 'Редагувати', 'Видалити'
+    rows = [
+        [
+            _button(edit_text, CallbackKind.EDIT, prayer_id),
+            _button(delete_text, CallbackKind.DELETE, prayer_id),
+        ],
+        _prayer_card_row(prayer_id),
+    ]
+    if read_full:
+        rows.insert(0, [_button(READ_FULL_BUTTON_TEXT, CallbackKind.READ_FULL, prayer_id)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+# Keyboard under a prayer of another user in the prayers list,
+# read_full adds a button to read a long prayer shown as a preview
+@lru_cache(maxsize=1024)
+def prayer_card_keyboard(prayer_id, read_full=False):
+    rows = [_prayer_card_row(prayer_id)]
+    if read_full:
+        rows.insert(0, [_button(READ_FULL_BUTTON_TEXT, CallbackKind.READ_FULL, prayer_id)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+# Keyboard for choosing how often to remind about a prayer
+@lru_cache(maxsize=128)
+def reminder_interval_keyboard(prayer_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            _button(f"🔔 {label.capitalize()}", CallbackKind.REMIND_SET, prayer_id, days)
+            for days, label in REMINDER_INTERVALS.items()
+        ],
+        _main_menu_row(),
+    ])
+
+# Keyboard under a reminder message
+@lru_cache(maxsize=1024)
+def reminder_message_keyboard(reminder_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button('🔕 Зупинити нагадування', CallbackKind.REMIND_STOP, reminder_id)],
+    ])
+
+# Keyboard under the preview of a prayer draft, edit adds a button to cancel editing
+@lru_cache(maxsize=None)
+def draft_keyboard(edit=False):
+    rows = [[_button('✅ Готово', CallbackKind.DRAFT_DONE)]]
+    if edit:
+        rows[0].append(_button('Скасувати', CallbackKind.CANCEL_EDIT))
+    rows.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+# Keyboard for choosing a segment of a long prayer to edit, labels are the beginnings of the segments
+def prayer_segments_keyboard(prayer_id, labels):
+    rows = [
+        [_button(f"{index + 1}. {label}", CallbackKind.EDIT_SEGMENT, prayer_id, index)]
+        for index, label in enumerate(labels)
+    ]
+    rows.append([_button('Скасувати', CallbackKind.CANCEL_EDIT)])
+    rows.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+# Keyboard shown after a segment of a long prayer was saved
+@lru_cache(maxsize=128)
+def segment_saved_keyboard(prayer_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button('✏️ Редагувати іншу частину', CallbackKind.EDIT, prayer_id)],
+        _main_menu_row(),
+    ])
+
+# Keyboard shown after a prayer was deleted, the deletion can be undone for a while
+@lru_cache(maxsize=1024)
+def prayer_deleted_keyboard(prayer_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button('↩️ Скасувати видалення', CallbackKind.UNDO_DELETE, prayer_id)],
+        _main_menu_row(),
+    ])
+
+# Keyboard with page navigation under a list of prayers.
+# prev_args/next_args are callback arguments of page_kind, or None if there is no such page.
+@lru_cache(maxsize=1024)
+def pagination_keyboard(categories_kind, page_kind, prev_args=None, next_args=None):
+    nav_buttons = []
+    if prev_args is not None:
+        nav_buttons.append(_button('⬅️ Попередні', page_kind, *prev_args))
+    if next_args is not None:
+        nav_buttons.append(_button('Наступні ➡️', page_kind, *next_args))
+
+    keyboard_rows = []
+    if nav_buttons:
+        keyboard_rows.append(nav_buttons)
+    keyboard_rows.append([_button(BACK_TO_CATEGORIES_BUTTON_TEXT, categories_kind)])
+    keyboard_rows.append(_main_menu_row())
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+
+# Keyboard for choosing the community to work with in private chats, the current one is marked
+def community_select_keyboard(communities, current_community_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button(f"✓ {title}" if community_id == current_community_id else title, CallbackKind.SELECT_COMMUNITY, community_id)]
+        for community_id, title, _ in communities
+    ] + [_main_menu_row()])
@@ -0,0 +1,124 @@
+import asyncio
+import inspect
+import logging
+import os
+import signal
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Maximum time (in seconds) to wait for in-flight updates to finish on shutdown
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', '25'))
+
+# Middleware that keeps track of updates which are currently being processed
+class InFlightMiddleware(BaseMiddleware):
+    def __init__(self, lifecycle: 'Lifecycle'):
+        self.lifecycle = lifecycle
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.lifecycle._update_started()
+        try:
+            return await handler(event, data)
+        finally:
+            self.lifecycle._update_finished()
+
+class Lifecycle:
+    """
+    Manages graceful shutdown of the bot.
+
+    On SIGTERM/SIGINT polling is stopped, in-flight updates are given
+    DRAIN_TIMEOUT seconds to finish, and then all registered flush callbacks
+    are called so that pending write batches reach the database.
+    """
+
+    def __init__(self, drain_timeout=DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._flush_callbacks = []
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _update_started(self):
+        self._in_flight += 1
+        self._idle.clear()
+
+    def _update_finished(self):
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+    def register_flush(self, callback: Callable[[], Any]):
+        """
+        Registers a callback (sync or async) that flushes pending writes on shutdown.
+        Callbacks are called in registration order after in-flight updates are drained.
+        """
+        self._flush_callbacks.append(callback)
+        return callback
+
+    def setup(self, dp: Dispatcher):
+        # Track every update before any other middleware or handler runs, including the
+        # built-in ones of the dispatcher: the FSM middleware waits for the lock of the chat
+        middlewares = list(dp.update.outer_middleware)
+        for middleware in middlewares:
+            dp.update.outer_middleware.unregister(middleware)
+        dp.update.outer_middleware(InFlightMiddleware(self))
+        for middleware in middlewares:
+            dp.update.outer_middleware(middleware)
+        dp.shutdown.register(self.on_shutdown)
+
+    def install_signal_handlers(self, dp: Dispatcher):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            # Signals handling is not supported on Windows
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(sig, self._on_signal, dp, sig)
+
+    def _on_signal(self, dp: Dispatcher, sig: signal.Signals):
+        if self.draining:
+            logger.warning(f"Received {sig.name} again, shutdown is already in progress")
+            return
+        logger.warning(f"Received {sig.name}, stopping polling and draining {self._in_flight} in-flight updates")
+        self.draining = True
+        asyncio.get_running_loop().create_task(dp.stop_polling())
+
+    async def drain(self):
+        self.draining = True
+        if self._in_flight:
+            logger.info(f"Waiting up to {self.drain_timeout}s for {self._in_flight} in-flight updates")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            logger.info("All in-flight updates finished")
+        except asyncio.TimeoutError:
+            logger.error(f"Drain timeout exceeded, {self._in_flight} updates are still in progress")
+
+    async def flush(self):
+        for callback in self._flush_callbacks:
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error in shutdown flush callback {callback!r}: {str(e)}")
+
+    async def on_shutdown(self):
+        await self.drain()
+        await self.flush()
+        logger.info("Bot is stopped")
+
+# Shared lifecycle manager
+lifecycle = Lifecycle()
@@ -0,0 +1,196 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+import json_log_formatter
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+# Level of the root logger
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Share of INFO and DEBUG records kept per logger, e.g. LOG_SAMPLING="handlers=0.1,services=0.5".
+# Warnings and errors are always kept.
+LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+
+# Most INFO and DEBUG records per second written for each logger, the rest are dropped
+# and counted in a summary record
+LOG_RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', '50'))
+
+# Records waiting for the writer thread, when the queue is full new records are dropped
+LOG_QUEUE_SIZE = 10000
+
+# Texts shorter than this are not redacted (commands, button labels)
+REDACT_MIN_LENGTH = 8
+
+# Correlation ID of the update being processed, '-' outside of updates (background jobs)
+correlation_id: ContextVar[str] = ContextVar('correlation_id', default='-')
+
+# Text sent by the user in the update being processed, it may be a prayer and is never logged
+sensitive_text: ContextVar[str] = ContextVar('sensitive_text', default='')
+
+# Replace the text and any cut of it at least REDACT_MIN_LENGTH characters long in a message
+def redact(message, text):
+    if len(text) < REDACT_MIN_LENGTH:
+        return message
+    probe = text[:REDACT_MIN_LENGTH]
+    start = message.find(probe)
+    while start != -1:
+        end = start + len(probe)
+        while end < len(message) and end - start < len(text) and message[end] == text[end - start]:
+            end += 1
+        replacement = f'[redacted {len(text)} chars]'
+        message = message[:start] + replacement + message[end:]
+        start = message.find(probe, start + len(replacement))
+    return message
+
+# Parse LOG_SAMPLING into {logger name: share of records kept}
+def parse_sampling(value):
+    rates = {}
+    for item in value.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the correlation ID of the current update to records and redacts
+    the text the user sent. Runs on the thread that logs, where the context
+    of the update is known.
+    """
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        text = sensitive_text.get()
+        if text:
+            message = record.getMessage()
+            redacted = redact(message, text)
+            if redacted is not message:
+                record.msg, record.args = redacted, None
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a share of INFO and DEBUG records of chosen loggers and at most
+    rate_limit of them per second for each logger. Dropped records are
+    reported in one summary record per logger once it is allowed again.
+    """
+
+    def __init__(self, rates=None, rate_limit=LOG_RATE_LIMIT):
+        super().__init__()
+        self.rates = rates or {}
+        self.rate_limit = rate_limit
+        # logger name -> [tokens, last refill time, dropped records]
+        self._buckets = {}
+
+    def _sample_rate(self, name):
+        # The most specific configured logger wins: "handlers" also covers "handlers.x"
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._sample_rate(record.name)
+        if rate < 1.0 and random.random() >= rate:
+            return False
+        if self.rate_limit <= 0:
+            return True
+
+        now = time.monotonic()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [self.rate_limit, now, 0]
+        bucket[0] = min(self.rate_limit, bucket[0] + (now - bucket[1]) * self.rate_limit)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.msg = f"{record.getMessage()} ({bucket[2]} records of this logger dropped by the rate limit)"
+            record.args = None
+            bucket[2] = 0
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # A full queue means the writer can't keep up, records are dropped instead of blocking the loop
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+class LoggingContextMiddleware(BaseMiddleware):
+    """
+    Sets the correlation ID and the text to redact for every update,
+    so all records of one update can be found together.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        text = ''
+        if event.message is not None:
+            text = event.message.text or event.message.caption or ''
+        elif event.inline_query is not None:
+            text = event.inline_query.query
+        id_token = correlation_id.set(f'u{event.update_id}')
+        text_token = sensitive_text.set('' if text.startswith('/') else text)
+        try:
+            return await handler(event, data)
+        finally:
+            sensitive_text.reset(text_token)
+            correlation_id.reset(id_token)
+
+# Listener of the log queue, started by setup_log_pipeline
+_listener = None
+
+# Route all logging through a queue to a writer thread
+def setup_log_pipeline(level=LOG_LEVEL, sampling=LOG_SAMPLING):
+    """
+    Sends records of the root logger to a queue. JSON formatting and writing
+    to stderr happen on a separate thread, so the event loop only puts
+    records into the queue.
+
+    Returns:
+        Root logger
+    """
+    global _listener
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(json_log_formatter.JSONFormatter())
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(sampling)))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Records still in the queue are written when the process exits
+    atexit.register(stop_log_pipeline)
+    return root
+
+# Write the records left in the queue and stop the writer thread
+def stop_log_pipeline():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
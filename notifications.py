@@ -0,0 +1,147 @@
+import asyncio
+import html
+import logging
+from contextlib import suppress
+
+from communities import get_community
+from database import get_category_by_id
+from overload import overload_controller
+from sender import sender
+from services import fetch_subscribers, delete_user_subscriptions, get_prayer_owner
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# New prayers are collected for this long (in seconds) after the first one,
+# a subscriber gets one message for all of them
+NOTIFICATION_WINDOW = 60.0
+
+# Subscriptions loaded from the database at once during a fan-out
+SUBSCRIBERS_PAGE_SIZE = 1000
+
+# Length of the prayer text quoted in a notification about a single prayer
+NOTIFICATION_PREVIEW_LENGTH = 200
+
+class NotificationManager:
+    """
+    Notifies subscribers of a category about new prayers in it.
+
+    New prayers are collected for NOTIFICATION_WINDOW seconds, then the
+    subscribers are read page by page and every subscriber gets a single
+    message: the prayer itself, or a summary of a burst of prayers. Messages
+    go through the bulk queue of the sender, so a fan-out to thousands of
+    subscribers is paced by the sender and never delays reminders or
+    interactive replies.
+    """
+
+    def __init__(self, window=NOTIFICATION_WINDOW, page_size=SUBSCRIBERS_PAGE_SIZE):
+        self.window = window
+        self.page_size = page_size
+        # community_id -> list of (category_id, prayer_id, author_id, preview)
+        self._pending = {}
+        self._has_pending = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            # Users who blocked the bot are unsubscribed
+            sender.add_blocked_listener(delete_user_subscriptions)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        pending = sum(len(prayers) for prayers in self._pending.values())
+        if pending:
+            logger.warning(f"Notifications about {pending} new prayers were not sent")
+
+    def enqueue(self, community_id, category_id, prayer_id, author_id, text):
+        preview = text if len(text) <= NOTIFICATION_PREVIEW_LENGTH else text[:NOTIFICATION_PREVIEW_LENGTH] + '…'
+        self._pending.setdefault(community_id, []).append((category_id, prayer_id, author_id, preview))
+        self._has_pending.set()
+
+    async def fan_out(self, community_id, prayers):
+        """
+        Sends notifications about new prayers of a community to the subscribers
+        of their categories, one message per subscriber.
+
+        Returns:
+            Number of notified subscribers
+        """
+        # Prayers deleted while waiting for the window are not announced
+        prayers = [prayer for prayer in prayers if get_prayer_owner(community_id, prayer[1]) is not None]
+        by_category = {}
+        for prayer in prayers:
+            by_category.setdefault(prayer[0], []).append(prayer)
+        category_ids = tuple(by_category)
+        if not category_ids:
+            return 0
+
+        notified = 0
+        user_id, user_prayers = None, []
+        after = (0, 0)
+        while True:
+            subscriptions = fetch_subscribers(community_id, category_ids, after, self.page_size)
+            # Subscriptions of a user come one after another, possibly across pages
+            for subscriber_id, category_id in subscriptions:
+                if subscriber_id != user_id:
+                    notified += await self._notify(community_id, user_id, user_prayers)
+                    user_id, user_prayers = subscriber_id, []
+                user_prayers += [prayer for prayer in by_category[category_id] if prayer[2] != subscriber_id]
+            if len(subscriptions) < self.page_size:
+                break
+            after = subscriptions[-1]
+        notified += await self._notify(community_id, user_id, user_prayers)
+        return notified
+
+    async def _notify(self, community_id, user_id, prayers):
+        if not prayers:
+            return 0
+        # The private chat with a user has the ID of the user
+        await sender.send_message(user_id, format_notification(community_id, prayers), bulk=True)
+        return 1
+
+    async def _run(self):
+        while True:
+            await self._has_pending.wait()
+            await asyncio.sleep(self.window)
+            # Prayers sent meanwhile are announced together once the load drops
+            await overload_controller.wait_for_normal()
+            self._has_pending.clear()
+            pending, self._pending = self._pending, {}
+            for community_id, prayers in pending.items():
+                try:
+                    notified = await self.fan_out(community_id, prayers)
+                    logger.info(f"Notified {notified} subscribers about {len(prayers)} new prayers in community {community_id}")
+                except Exception as e:
+                    logger.error(f"Error notifying subscribers of community {community_id}: {str(e)}")
+
+# Format the text of a notification about new prayers of a community
+def format_notification(community_id, prayers):
+    community = get_community(community_id)
+    footer = f"\n\n<i>Спільнота: {html.escape(community.title)}</i>" if community and community.title else ''
+    if len(prayers) == 1:
+        category_id, _, _, preview = prayers[0]
+        category_name = get_category_by_id(community_id, category_id) or 'Не вказана'
+        return (
+            f"🔔 <b>Нова молитва в категорії {html.escape(category_name)}</b>\n\n"
+            f"{html.escape(preview)}{footer}"
+        )
+
+    counts = {}
+    for category_id, _, _, _ in prayers:
+        counts[category_id] = counts.get(category_id, 0) + 1
+    lines = [f"🔔 <b>Нових молитв: {len(prayers)}</b>", ""]
+    for category_id, count in counts.items():
+        category_name = get_category_by_id(community_id, category_id) or 'Не вказана'
+        lines.append(f"• {html.escape(category_name)}: {count}")
+    lines.append("")
+    lines.append("Перегляньте їх у меню «Показати всі молитви».")
+    return '\n'.join(lines) + footer
+
+# Shared notification manager
+notification_manager = NotificationManager()
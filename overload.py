@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import suppress
+
+from lifecycle import lifecycle
+from scheduling import chat_scheduler
+from sender import sender
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Modes of the bot, each one cheaper to serve than the previous one:
+# degraded - page headers are shown without totals, background jobs wait for the load to drop;
+# overloaded - also pages are sent as a single message and first pages of the feed are cached
+MODE_NORMAL = 0
+MODE_DEGRADED = 1
+MODE_OVERLOADED = 2
+MODE_NAMES = {MODE_NORMAL: 'normal', MODE_DEGRADED: 'degraded', MODE_OVERLOADED: 'overloaded'}
+
+# Event loop lag (in seconds) at which the degraded and the overloaded modes are entered
+OVERLOAD_DEGRADED_LAG = float(os.getenv('OVERLOAD_DEGRADED_LAG', '0.1'))
+OVERLOAD_OVERLOADED_LAG = float(os.getenv('OVERLOAD_OVERLOADED_LAG', '0.5'))
+
+# Updates in progress at which the degraded and the overloaded modes are entered
+OVERLOAD_DEGRADED_IN_FLIGHT = int(os.getenv('OVERLOAD_DEGRADED_IN_FLIGHT', '50'))
+OVERLOAD_OVERLOADED_IN_FLIGHT = int(os.getenv('OVERLOAD_OVERLOADED_IN_FLIGHT', '200'))
+
+# How often (in seconds) the event loop lag is measured
+OVERLOAD_CHECK_INTERVAL = 0.5
+
+# Weight of the latest lag measurement, single slow iterations (e.g. garbage collection) are smoothed out
+OVERLOAD_LAG_SMOOTHING = 0.3
+
+# The load must stay low for this long (in seconds) before the bot steps down to a cheaper mode
+OVERLOAD_RECOVERY_SECONDS = 30
+
+# Background jobs are postponed at most this long (in seconds), then run even under load
+OVERLOAD_MAX_POSTPONE = 3600
+
+# How often (in seconds) the load metrics are logged
+OVERLOAD_METRICS_INTERVAL = 60
+
+class OverloadController:
+    """
+    Watches the event loop lag and the number of updates in progress and
+    switches the bot to cheaper modes when users start waiting. A more
+    expensive mode is entered as soon as the load grows, and the bot steps
+    back one mode at a time after the load stayed low for
+    OVERLOAD_RECOVERY_SECONDS, so it does not flap at the threshold.
+    """
+
+    def __init__(self, check_interval=OVERLOAD_CHECK_INTERVAL, recovery_seconds=OVERLOAD_RECOVERY_SECONDS):
+        self.check_interval = check_interval
+        self.recovery_seconds = recovery_seconds
+        self.mode = MODE_NORMAL
+        self.lag = 0.0
+        self._max_lag = 0.0
+        self._mode_changes = 0
+        self._calm_since = None
+        self._normal = asyncio.Event()
+        self._normal.set()
+        self._task = None
+
+    @property
+    def degraded(self) -> bool:
+        return self.mode >= MODE_DEGRADED
+
+    @property
+    def overloaded(self) -> bool:
+        return self.mode >= MODE_OVERLOADED
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def wait_for_normal(self, timeout=OVERLOAD_MAX_POSTPONE):
+        # Called by background jobs before they start, returns at once in the normal mode
+        if self.mode == MODE_NORMAL:
+            return
+        logger.info(f"Background job postponed in the {MODE_NAMES[self.mode]} mode")
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._normal.wait(), timeout=timeout)
+
+    def metrics(self):
+        return {
+            'mode': MODE_NAMES[self.mode],
+            'event_loop_lag_ms': round(self.lag * 1000, 1),
+            'max_event_loop_lag_ms': round(self._max_lag * 1000, 1),
+            'updates_in_flight': lifecycle.in_flight,
+            'updates_waiting': chat_scheduler.waiting,
+            'sender_queue': sender.queue_size,
+            'mode_changes': self._mode_changes,
+        }
+
+    def update(self, lag, in_flight, now=None):
+        """
+        Takes a new measurement of the load and changes the mode if needed.
+
+        Args:
+            lag: Delay of the event loop in the last check (in seconds)
+            in_flight: Number of updates in progress
+            now: Monotonic time of the measurement
+        """
+        now = time.monotonic() if now is None else now
+        self.lag = OVERLOAD_LAG_SMOOTHING * lag + (1 - OVERLOAD_LAG_SMOOTHING) * self.lag
+        self._max_lag = max(self._max_lag, lag)
+
+        if self.lag >= OVERLOAD_OVERLOADED_LAG or in_flight >= OVERLOAD_OVERLOADED_IN_FLIGHT:
+            target = MODE_OVERLOADED
+        elif self.lag >= OVERLOAD_DEGRADED_LAG or in_flight >= OVERLOAD_DEGRADED_IN_FLIGHT:
+            target = MODE_DEGRADED
+        else:
+            target = MODE_NORMAL
+
+        if target > self.mode:
+            self._set_mode(target, in_flight)
+            self._calm_since = None
+        elif target < self.mode:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.recovery_seconds:
+                self._set_mode(self.mode - 1, in_flight)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+
+    def _set_mode(self, mode, in_flight):
+        logger.warning(
+            f"Switching from the {MODE_NAMES[self.mode]} to the {MODE_NAMES[mode]} mode: "
+            f"event loop lag {self.lag * 1000:.0f} ms, {in_flight} updates in progress"
+        )
+        self.mode = mode
+        self._mode_changes += 1
+        if mode == MODE_NORMAL:
+            self._normal.set()
+        else:
+            self._normal.clear()
+
+    async def _run(self):
+        metrics_at = time.monotonic() + OVERLOAD_METRICS_INTERVAL
+        while True:
+            started_at = time.monotonic()
+            await asyncio.sleep(self.check_interval)
+            now = time.monotonic()
+            self.update(max(0.0, now - started_at - self.check_interval), lifecycle.in_flight, now)
+            if now >= metrics_at:
+                logger.info(f"Load metrics: {self.metrics()}")
+                self._max_lag = 0.0
+                metrics_at = now + OVERLOAD_METRICS_INTERVAL
+
+# Shared overload controller
+overload_controller = OverloadController()
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, NamedTuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from callbacks import decode_callback
+from overload import overload_controller
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Duration of a profile (in seconds) when none is given, and the longest allowed one
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+
+# Interval between stack samples (in seconds)
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Number of rows in each table of the report
+PROFILE_TOP = 15
+
+# Result of a profile: collapsed stacks for flame graph tools and a text report
+class ProfileResult(NamedTuple):
+    collapsed: bytes
+    report: str
+
+# Name of a stack frame in collapsed stacks, e.g. "services.py:fetch_all_prayers"
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class SamplingProfiler:
+    """
+    Samples the stack of the event loop thread from a background thread
+    while a profile is running, and times handlers (see ProfilingMiddleware).
+    Nothing is recorded between profiles.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._stacks = Counter()
+        # handler name -> [calls, total time, max time]
+        self._handlers = {}
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def record_handler(self, name, duration):
+        stats = self._handlers.get(name)
+        if stats is None:
+            stats = self._handlers[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+
+    async def profile(self, seconds):
+        """
+        Profiles the process for the given number of seconds.
+
+        Returns:
+            ProfileResult
+        """
+        if self._running:
+            raise RuntimeError("A profile is already running")
+        self._running = True
+        self._stacks = Counter()
+        self._handlers = {}
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample, args=(threading.get_ident(), stop), name='profiler', daemon=True
+        )
+        started_at = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            self._running = False
+        duration = time.perf_counter() - started_at
+        collapsed = ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+        return ProfileResult(collapsed.encode('utf-8'), self._build_report(duration))
+
+    def _sample(self, thread_id, stop):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                self._stacks[';'.join(reversed(names))] += 1
+
+    def _build_report(self, duration):
+        total = sum(self._stacks.values())
+        self_counts = Counter()
+        inclusive_counts = Counter()
+        for stack, count in self._stacks.items():
+            names = stack.split(';')
+            self_counts[names[-1]] += count
+            for name in set(names):
+                inclusive_counts[name] += count
+
+        lines = [f"Profile of {duration:.1f} s, {total} samples every {self.interval * 1000:.0f} ms"]
+        lines.append("Load: " + ', '.join(f"{name} {value}" for name, value in overload_controller.metrics().items()))
+        lines.append("")
+        lines.append("Functions by own samples:")
+        for name, count in self_counts.most_common(PROFILE_TOP):
+            lines.append(f"  {count * 100 / total:5.1f}%  {name}")
+        lines += ["", "Functions by samples including callees:"]
+        for name, count in inclusive_counts.most_common(PROFILE_TOP):
+            lines.append(f"  {count * 100 / total:5.1f}%  {name}")
+
+        lines += ["", "Slowest handlers (calls, average ms, max ms, total ms):"]
+        handlers = sorted(self._handlers.items(), key=lambda item: -item[1][1])
+        for name, (calls, total_time, max_time) in handlers[:PROFILE_TOP]:
+            lines.append(f"  {name}: {calls}, {total_time * 1000 / calls:.1f}, {max_time * 1000:.1f}, {total_time * 1000:.0f}")
+        if not handlers:
+            lines.append("  no updates were handled")
+
+        tasks = Counter(
+            getattr(task.get_coro(), '__qualname__', repr(task.get_coro())) for task in asyncio.all_tasks()
+        )
+        lines += ["", f"Asyncio tasks at the end ({sum(tasks.values())}):"]
+        for name, count in tasks.most_common(PROFILE_TOP):
+            lines.append(f"  {count}  {name}")
+        return '\n'.join(lines) + '\n'
+
+# Middleware that times handlers while a profile is running
+class ProfilingMiddleware(BaseMiddleware):
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not self.profiler.running:
+            return await handler(event, data)
+
+        # Callback buttons share one entry point, they are told apart by the callback kind
+        callback = decode_callback(event.data) if isinstance(event, CallbackQuery) else None
+        if callback is not None:
+            name = f"callback {callback.kind.name}"
+        else:
+            name = getattr(getattr(data.get('handler'), 'callback', None), '__name__', type(event).__name__)
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.profiler.record_handler(name, time.perf_counter() - started_at)
+
+# Shared profiler
+profiler = SamplingProfiler()
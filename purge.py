@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from counters import prayed_counter
+from overload import overload_controller
+from storage import fsm_storage
+from services import DELETE_UNDO_WINDOW, purge_deleted_prayers, vacuum_free_pages
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Minutes between purge runs
+PURGE_INTERVAL_MINUTES = 30
+
+# Prayers removed per transaction and the pause between transactions (in seconds)
+PURGE_BATCH_SIZE = 1000
+PURGE_BATCH_PAUSE = 0.1
+
+# Pages returned to the file system per incremental vacuum step
+VACUUM_PAGES_PER_STEP = 1000
+
+# Conversation states (e.g. unfinished drafts) not changed for this many days are removed
+FSM_STATE_TTL_DAYS = 30
+
+class PurgeManager:
+    """
+    Removes deleted prayers for good once they can no longer be restored,
+    in large background batches, then shrinks the database files with
+    incremental vacuum steps. Deleting a prayer is a single small update,
+    the expensive removal is done here for many prayers at once.
+    """
+
+    def __init__(self, interval_minutes=PURGE_INTERVAL_MINUTES):
+        self.interval_minutes = interval_minutes
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def purge(self):
+        stale = fsm_storage.delete_stale((datetime.now() - timedelta(days=FSM_STATE_TTL_DAYS)).isoformat())
+        if stale:
+            logger.info(f"Removed {stale} abandoned conversation states")
+
+        deleted_before = (datetime.now() - timedelta(seconds=DELETE_UNDO_WINDOW)).isoformat()
+        total = 0
+        while True:
+            prayer_ids = purge_deleted_prayers(deleted_before, PURGE_BATCH_SIZE)
+            # Marks not saved yet belong to prayers that are gone now
+            for prayer_id in prayer_ids:
+                prayed_counter.discard(prayer_id)
+            total += len(prayer_ids)
+            if len(prayer_ids) < PURGE_BATCH_SIZE:
+                break
+            await asyncio.sleep(PURGE_BATCH_PAUSE)
+            await overload_controller.wait_for_normal()
+        if not total:
+            return 0
+
+        freed = 0
+        while True:
+            pages = vacuum_free_pages(VACUUM_PAGES_PER_STEP)
+            freed += pages
+            if pages < VACUUM_PAGES_PER_STEP:
+                break
+            await asyncio.sleep(PURGE_BATCH_PAUSE)
+        logger.info(f"Purged {total} deleted prayers, freed {freed} pages")
+        return total
+
+    async def _run(self):
+        while True:
+            await overload_controller.wait_for_normal()
+            try:
+                await self.purge()
+            except Exception as e:
+                logger.error(f"Purging deleted prayers failed: {str(e)}")
+            await asyncio.sleep(self.interval_minutes * 60)
+
+# Shared purge manager
+purge_manager = PurgeManager()
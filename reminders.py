@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import logging
+import time
+from contextlib import suppress
+
+from services import fetch_reminders_until, fetch_reminders_by_ids, claim_reminders, delete_reminders
+from keyboards import reminder_message_keyboard
+from sender import sender
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# How far ahead (in seconds) reminders are loaded into memory
+REMINDER_LOOKAHEAD = 300
+
+# Maximum number of reminders loaded from the database at once
+REMINDER_LOAD_BATCH = 500
+
+# Long prayers are cut in reminders to fit into one message
+REMINDER_TEXT_LIMIT = 3500
+
+# Key greater than any reminder ID, used to mark a fully loaded time window
+_MAX_ID = 2 ** 63 - 1
+
+class ReminderScheduler:
+    """
+    Sends due reminders.
+
+    Only reminders due within REMINDER_LOOKAHEAD are kept in an in-memory heap,
+    loaded from the next_run_at index in keyset order in batches of at most
+    REMINDER_LOAD_BATCH, so memory does not depend on the number of reminders.
+    Each reminder is moved to its next run in the database before it is sent,
+    so it is never sent twice, even after a restart.
+    """
+
+    def __init__(self, lookahead=REMINDER_LOOKAHEAD, batch_size=REMINDER_LOAD_BATCH):
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        # (next_run_at, reminder_id)
+        self._heap = []
+        # Every reminder with a (next_run_at, id) key not greater than this was loaded
+        self._cursor = (0, 0)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def schedule(self, reminder_id, next_run_at):
+        # Reminders after the cursor are loaded from the database when their time comes
+        if (next_run_at, reminder_id) <= self._cursor:
+            heapq.heappush(self._heap, (next_run_at, reminder_id))
+            self._wakeup.set()
+
+    def _load(self, now):
+        until = int(now) + self.lookahead
+        rows = fetch_reminders_until(until, after=self._cursor, limit=self.batch_size)
+        for reminder_id, next_run_at in rows:
+            heapq.heappush(self._heap, (next_run_at, reminder_id))
+        if len(rows) < self.batch_size:
+            # The whole window is loaded
+            self._cursor = max(self._cursor, (until, _MAX_ID))
+        else:
+            self._cursor = (rows[-1][1], rows[-1][0])
+        logger.debug(f"Loaded {len(rows)} reminders, cursor: {self._cursor}")
+
+    async def _run(self):
+        while True:
+            try:
+                now = time.time()
+
+                # Extend the loaded window, keeping at most about two batches in memory
+                if self._cursor[0] < now + self.lookahead / 2 and len(self._heap) < self.batch_size:
+                    self._load(now)
+
+                due = []
+                while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                    due.append(heapq.heappop(self._heap))
+                if due:
+                    await self._fire(due, now)
+                    continue
+
+                # Sleep until the next reminder, the window extension or a new reminder
+                wake_at = self._cursor[0] - self.lookahead / 2
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                self._wakeup.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(wake_at - now, 0.1))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in reminder scheduler: {str(e)}")
+                await asyncio.sleep(5)
+
+    async def _fire(self, due, now):
+        reminders = {row[0]: row for row in fetch_reminders_by_ids([reminder_id for _, reminder_id in due])}
+
+        claims = []
+        orphaned = []
+        for run_at, reminder_id in due:
+            reminder = reminders.get(reminder_id)
+            # Skip deleted reminders and stale heap entries of changed reminders
+            if reminder is None or reminder[4] != run_at:
+                continue
+            if reminder[5] is None and not reminder[7]:
+                # The prayer was purged
+                orphaned.append(reminder_id)
+                continue
+
+            # Next run in the future, reminders missed while the bot was down are sent once
+            interval = reminder[3]
+            next_run_at = run_at + interval
+            if next_run_at <= now:
+                next_run_at += (int(now - next_run_at) // interval + 1) * interval
+            claims.append((reminder_id, run_at, next_run_at))
+
+        delete_reminders(orphaned)
+        claimed = claim_reminders(claims)
+
+        sent = 0
+        for reminder_id, _, next_run_at in claims:
+            if reminder_id not in claimed:
+                continue
+            _, chat_id, _, _, _, prayer_text, category_name, deleted = reminders[reminder_id]
+            if deleted:
+                # The prayer can still be restored, the reminder is kept for its next run
+                self.schedule(reminder_id, next_run_at)
+                continue
+            await sender.send_message(
+                chat_id,
+                format_reminder(prayer_text, category_name),
+                reply_markup=reminder_message_keyboard(reminder_id)
+            )
+            self.schedule(reminder_id, next_run_at)
+            sent += 1
+
+        if sent:
+            logger.info(f"Sent {sent} reminders")
+
+# Format the text of a reminder message
+def format_reminder(prayer_text, category_name):
+    if len(prayer_text) > REMINDER_TEXT_LIMIT:
+        prayer_text = prayer_text[:REMINDER_TEXT_LIMIT] + '…'
+    return (
+        f"🔔 <b>Нагадування про молитву</b>\n"
+        f"<b>Категорія: {category_name or 'Не вказана'}</b>\n\n"
+        f"{prayer_text}"
+    )
+
+# Shared reminder scheduler
+reminder_scheduler = ReminderScheduler()
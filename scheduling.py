@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import TelegramObject, Update
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Updates handled at the same time, updates of other chats wait for a free worker
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '64'))
+
+# Updates received but not handled yet, polling pauses while there are this many
+UPDATE_QUEUE_LIMIT = int(os.getenv('UPDATE_QUEUE_LIMIT', '1000'))
+
+class ChatScheduler(BaseEventIsolation, BaseMiddleware):
+    """
+    Handles updates of one chat one at a time, in the order Telegram sent
+    them, and updates of different chats concurrently on at most `workers`
+    workers. Handlers can rely on the FSM state and data written by the
+    previous update of the chat, and a double tap is handled after the
+    first tap has finished.
+
+    The scheduler is the events isolation of the dispatcher: the FSM
+    middleware takes the lock of the chat before it reads the state, so
+    state filters see the state left by the previous update. As an update
+    middleware it then takes a worker, so a chat that sends many updates at
+    once holds a single worker and never blocks other chats.
+    """
+
+    def __init__(self, workers=UPDATE_WORKERS):
+        self.workers = workers
+        self._workers = asyncio.Semaphore(workers)
+        # chat ID -> [lock, updates of the chat being handled or waiting]
+        self._chats = {}
+        self._active = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return sum(updates for _, updates in self._chats.values()) - self._active
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        # All users of a group chat share its lock, the FSM key of a private chat has the ID of the user
+        entry = self._chats.get(key.chat_id)
+        if entry is None:
+            entry = self._chats[key.chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # Waiters of a lock are woken in the order they came
+            await entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key.chat_id]
+
+    async def close(self) -> None:
+        pass
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Updates with a chat or a user already hold the lock of their chat (see lock)
+        async with self._workers:
+            self._active += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self._active -= 1
+
+# Shared update scheduler
+chat_scheduler = ChatScheduler()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from contextlib import suppress
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Rate of background (non-interactive) messages, per second.
+# Telegram allows about 30 messages per second in total, the rest is left for interactive replies.
+BACKGROUND_MESSAGES_PER_SECOND = float(os.getenv('BACKGROUND_MESSAGES_PER_SECOND', '15'))
+
+# Maximum number of queued messages, producers wait while the queue is full
+SENDER_QUEUE_SIZE = 1000
+
+# Maximum number of queued bulk messages (notification fan-outs)
+BULK_QUEUE_SIZE = 1000
+
+# Attempts to deliver a message when Telegram asks to retry later
+SEND_ATTEMPTS = 3
+
+class RateLimitedSender:
+    """
+    Sends background messages (reminders, notifications) from a queue
+    at a fixed rate, so they never compete with interactive replies
+    for the bot's flood limits.
+
+    Bulk messages have a queue of their own and are sent only while no
+    other background message is waiting, so a large fan-out never delays
+    reminders.
+    """
+
+    def __init__(self, rate=BACKGROUND_MESSAGES_PER_SECOND, queue_size=SENDER_QUEUE_SIZE,
+                 bulk_queue_size=BULK_QUEUE_SIZE):
+        self.rate = rate
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._bulk_queue = asyncio.Queue(maxsize=bulk_queue_size)
+        self._ready = asyncio.Event()
+        self._blocked_listeners = []
+        self._bot = None
+        self._worker = None
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() + self._bulk_queue.qsize()
+
+    # Call the listener with the chat ID when a chat turns out to have blocked the bot
+    def add_blocked_listener(self, listener):
+        self._blocked_listeners.append(listener)
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def send_message(self, chat_id, text, bulk=False, **kwargs):
+        # Waits while the queue is full, which slows producers down
+        await (self._bulk_queue if bulk else self._queue).put((chat_id, text, kwargs))
+        self._ready.set()
+
+    async def _next(self):
+        # The next message to send and its queue, bulk messages go last
+        while True:
+            for queue in (self._queue, self._bulk_queue):
+                if not queue.empty():
+                    return queue, queue.get_nowait()
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def _run(self):
+        interval = 1 / self.rate
+        while True:
+            queue, (chat_id, text, kwargs) = await self._next()
+            try:
+                await self._deliver(chat_id, text, kwargs)
+            finally:
+                queue.task_done()
+            await asyncio.sleep(interval)
+
+    async def _deliver(self, chat_id, text, kwargs):
+        for attempt in range(SEND_ATTEMPTS):
+            try:
+                await self._bot.send_message(chat_id, text, **kwargs)
+                return True
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood limit reached, retrying message to chat {chat_id} in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                logger.info(f"Chat {chat_id} blocked the bot, message dropped")
+                for listener in self._blocked_listeners:
+                    try:
+                        listener(chat_id)
+                    except Exception as e:
+                        logger.error(f"Error handling blocked chat {chat_id}: {str(e)}")
+                return False
+            except Exception as e:
+                logger.error(f"Error sending message to chat {chat_id}: {str(e)}")
+                return False
+        logger.error(f"Message to chat {chat_id} dropped after {SEND_ATTEMPTS} attempts")
+        return False
+
+    async def stop(self, timeout=10):
+        # Deliver already queued messages, then stop the worker
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(self._queue.join(), self._bulk_queue.join()), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Sender stopped with {self.queue_size} undelivered messages")
+        self._worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._worker
+        self._worker = None
+
+# Shared sender for background messages
+sender = RateLimitedSender()
@@ -1,150 +1,1229 @@
-from database import conn, cursor
-from datetime import datetime
+from database import get_connection, get_cursor, transaction, PRAYER_COLUMNS
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import hashlib
 import logging
+import os
+import time
+import unicodedata
+import zlib
+
+try:
+    # Optional: better and faster compression than zlib
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Get logger
 logger = logging.getLogger(__name__)
 
-# Function to insert a prayer into the database
-def insert_prayer(user_id, username, prayer, category_id, first_name="", last_name=""):
-    logger.info(f"Inserting prayer for user {user_id} in category {category_id}")
+# The same prayer sent again by the same user within this window (in seconds)
+# is a double tap or a client retry and is merged with the first one
+DUPLICATE_WINDOW = 60
+
+# A deleted prayer can be restored within this window (in seconds),
+# after it the purge job removes it for good (see purge.py)
+DELETE_UNDO_WINDOW = 5 * 60
+
+# (community_id, user_id, content_hash) -> time of the submission, oldest first
+_recent_hashes = OrderedDict()
+
+# Values of the prayers.compressed flag
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+# Prayers longer than this (in characters) are stored compressed
+COMPRESSION_THRESHOLD = 1024
+
+# Length of the preview stored next to a compressed prayer
+PREVIEW_LENGTH = 300
+
+# Long prayers are edited in segments of at most this many characters (see split_prayer_segments)
+PRAYER_SEGMENT_LENGTH = 3000
+
+# Edits of prayers are kept in prayer_revisions as deltas, set to false to keep no history
+PRAYER_REVISIONS = os.getenv('PRAYER_REVISIONS', 'true').lower() in ('1', 'true', 'yes')
+
+# Prayer text as shown in lists: the text itself, or the preview of a compressed prayer
+LIST_TEXT_COLUMN = 'CASE WHEN p.compressed = 0 THEN p.prayer ELSE p.preview END'
+
+# Function to prepare a prayer text for storage
+def compress_prayer(text):
+    """
+    Compresses a long prayer text, short and incompressible texts are stored as is.
+    
+    Args:
+        text: Prayer text
+        
+    Returns:
+        Tuple (stored value, compression flag, preview or None)
+    """
+    if text is None or len(text) <= COMPRESSION_THRESHOLD:
+        return text, COMPRESSION_NONE, None
+    
+    raw = text.encode('utf-8')
+    if zstandard is not None:
+        data, flag = zstandard.ZstdCompressor(level=10).compress(raw), COMPRESSION_ZSTD
+    else:
+        data, flag = zlib.compress(raw, 9), COMPRESSION_ZLIB
+    if len(data) >= len(raw):
+        return text, COMPRESSION_NONE, None
+    return data, flag, text[:PREVIEW_LENGTH].rstrip() + '…'
+
+# Function to restore a prayer text from storage
+def decompress_prayer(value, flag):
+    if flag == COMPRESSION_ZLIB:
+        return zlib.decompress(value).decode('utf-8')
+    if flag == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read prayers compressed with zstd")
+        return zstandard.ZstdDecompressor().decompress(value).decode('utf-8')
+    return value
+
+# Prayer tables, newest prayers first. Old prayers are moved to the archive (see archive.py),
+# all_prayers is a view over both for lookups by ID or user.
+PRAYER_TABLES = ('main.prayers', 'archive.prayers')
+
+# Function to compute the hash of a prayer text, ignoring case, Unicode form and whitespace
+def compute_content_hash(text):
+    normalized = ' '.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+# Function to check if the same user just submitted the same prayer
+def _is_recent_duplicate(key):
+    now = time.monotonic()
+    # Drop submissions that are out of the window
+    while _recent_hashes and now - next(iter(_recent_hashes.values())) > DUPLICATE_WINDOW:
+        _recent_hashes.popitem(last=False)
+    return key in _recent_hashes
+
+# Function to check if the same user has just submitted the same prayer in a community,
+# insert_prayer would merge it with the previous one
+def is_duplicate_submission(community_id, user_id, prayer):
+    return _is_recent_duplicate((community_id, user_id, compute_content_hash(prayer)))
+
+# Function to remember a submitted prayer for the duplicate check
+def _remember_hash(key):
+    _recent_hashes[key] = time.monotonic()
+    _recent_hashes.move_to_end(key)
+
+# Function to insert a prayer into the database.
+# Returns the ID of the new prayer, None if it was merged with a duplicate or could not be saved.
+def insert_prayer(community_id, user_id, username, prayer, category_id, first_name="", last_name=""):
+    content_hash = compute_content_hash(prayer)
+    if _is_recent_duplicate((community_id, user_id, content_hash)):
+        logger.info(f"Duplicate prayer from user {user_id} merged with the previous one")
+        return None
+    
+    logger.debug(f"Inserting prayer for user {user_id} in community {community_id}, category {category_id}")
     try:
-        now = datetime.now().isoformat()
-        cursor.execute('''
-        INSERT INTO prayers (user_id, username, first_name, last_name, prayer, category_id, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, username, first_name, last_name, prayer, category_id, now, now))
-        conn.commit()
-        logger.info(f"Prayer inserted successfully for user {user_id}, rowid: {cursor.lastrowid}")
-        return True
+        with transaction() as cursor:
+            now = datetime.now().isoformat()
+            stored, compressed, preview = compress_prayer(prayer)
+            cursor.execute('''
+            INSERT INTO prayers (user_id, username, first_name, last_name, prayer, category_id, created_at, updated_at,
+                                 content_hash, compressed, preview, community_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, username, first_name, last_name, stored, category_id, now, now, content_hash, compressed, preview,
+                  community_id))
+            prayer_id = cursor.lastrowid
+            _update_daily_stats(cursor, community_id, now, category_id, 1)
+            cursor.execute(
+                'INSERT OR IGNORE INTO daily_active_users (community_id, day, user_id) VALUES (?, ?, ?)',
+                (community_id, now[:10], user_id)
+            )
     except Exception as e:
         logger.error(f"Error inserting prayer: {str(e)}")
-        return False
+        return None
+    invalidate_hot_counts(community_id)
+    _remember_hash((community_id, user_id, content_hash))
+    logger.info(f"Prayer inserted successfully for user {user_id}, rowid: {prayer_id}")
+    return prayer_id
 
-# Function to fetch all prayers for a user
-def fetch_prayers(user_id):
+# Function to fetch all prayers for a user in a community
+def fetch_prayers(community_id, user_id):
+    cursor = get_cursor()
     cursor.execute('''
-    SELECT p.id, p.prayer, c.name 
-    FROM prayers p
+    SELECT p.id, p.prayer, p.compressed, c.name 
+    FROM all_prayers p
     LEFT JOIN categories c ON p.category_id = c.id
-    WHERE p.user_id = ? 
+    WHERE p.community_id = ? AND p.user_id = ? 
     ORDER BY p.created_at DESC
-    ''', (user_id,))
-    return cursor.fetchall()
+    ''', (community_id, user_id))
+    return [(prayer_id, decompress_prayer(prayer, compressed), name) for prayer_id, prayer, compressed, name in cursor.fetchall()]
 
-# Function to fetch prayers for a user filtered by category
-def fetch_prayers_by_category(user_id, category_id):
+# Function to fetch prayers for a user in a community filtered by category
+def fetch_prayers_by_category(community_id, user_id, category_id):
+    cursor = get_cursor()
     cursor.execute('''
-    SELECT p.id, p.prayer, c.name 
-    FROM prayers p
+    SELECT p.id, p.prayer, p.compressed, c.name 
+    FROM all_prayers p
     LEFT JOIN categories c ON p.category_id = c.id
-    WHERE p.user_id = ? AND p.category_id = ?
+    WHERE p.community_id = ? AND p.user_id = ? AND p.category_id = ?
     ORDER BY p.created_at DESC
-    ''', (user_id, category_id))
-    return cursor.fetchall()
+    ''', (community_id, user_id, category_id))
+    return [(prayer_id, decompress_prayer(prayer, compressed), name) for prayer_id, prayer, compressed, name in cursor.fetchall()]
 
-# Function to update a prayer in the database
-def update_prayer(prayer_id, new_text, category_id=None):
-    now = datetime.now().isoformat()
+# Function to fetch a page of prayers of a user, optionally filtered by category
+def fetch_user_prayers_page(community_id, user_id, category_id=None, limit=5, offset=0):
+    """
+    Gets prayers of a user in a community with pagination, newest first.
+    
+    Args:
+        community_id: Community ID
+        user_id: User ID
+        category_id: Category ID or None for all categories
+        limit: Maximum number of prayers to load at once
+        offset: Offset from the beginning of the list
+        
+    Returns:
+        List of prayers (id, text, category name)
+    """
+    cursor = get_cursor()
+    category_filter = 'AND p.category_id = ?' if category_id is not None else ''
+    params = (community_id, user_id, category_id) if category_id is not None else (community_id, user_id)
+    cursor.execute(f'''
+    SELECT p.id, p.prayer, p.compressed, c.name
+    FROM all_prayers p
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE p.community_id = ? AND p.user_id = ? {category_filter}
+    ORDER BY p.created_at DESC
+    LIMIT ? OFFSET ?
+    ''', (*params, limit, offset))
+    return [(prayer_id, decompress_prayer(prayer, compressed), name) for prayer_id, prayer, compressed, name in cursor.fetchall()]
+
+# Function to count prayers of a user in a community, optionally filtered by category
+def count_user_prayers(community_id, user_id, category_id=None):
+    cursor = get_cursor()
     if category_id is not None:
-        cursor.execute('''
-        UPDATE prayers 
-        SET prayer = ?, category_id = ?, updated_at = ? 
-        WHERE id = ?
-        ''', (new_text, category_id, now, prayer_id))
+        cursor.execute(
+            'SELECT COUNT(*) FROM all_prayers WHERE community_id = ? AND user_id = ? AND category_id = ?',
+            (community_id, user_id, category_id)
+        )
     else:
-        cursor.execute('''
-        UPDATE prayers 
-        SET prayer = ?, updated_at = ? 
-        WHERE id = ?
-        ''', (new_text, now, prayer_id))
-    conn.commit()
-
-# Function to delete a prayer from the database
-def delete_prayer(prayer_id):
-    cursor.execute('DELETE FROM prayers WHERE id = ?', (prayer_id,))
-    conn.commit()
-
-# Function to fetch a single prayer by ID
-def get_prayer_by_id(prayer_id):
+        cursor.execute('SELECT COUNT(*) FROM all_prayers WHERE community_id = ? AND user_id = ?', (community_id, user_id))
+    return cursor.fetchone()[0]
+
+# Function to split a prayer text into segments for editing
+def split_prayer_segments(text, length=PRAYER_SEGMENT_LENGTH):
+    """
+    Splits a long prayer into segments of at most `length` characters, at a
+    line break or a space where possible. The segments depend only on the
+    text, so a segment can be addressed by its index.
+    
+    Returns:
+        List of (start, end) offsets of the segments
+    """
+    segments = []
+    start = 0
+    while len(text) - start > length:
+        window = text[start:start + length]
+        for separator in ('\n', ' '):
+            cut = window.rfind(separator) + 1
+            if cut > length // 2:
+                break
+        else:
+            cut = length
+        segments.append((start, start + cut))
+        start += cut
+    segments.append((start, len(text)))
+    return segments
+
+# Function to find the smallest single replacement that turns one text into another.
+# Returns (position, removed text, inserted text).
+def _text_delta(old, new):
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]
+
+# Function to append an edit of a prayer to its revision history
+def _record_revision(cursor, community_id, prayer_id, editor_id, position, removed, inserted, now):
+    if not PRAYER_REVISIONS or removed == inserted:
+        return
     cursor.execute('''
-    SELECT p.prayer, p.category_id, c.name
-    FROM prayers p
-    LEFT JOIN categories c ON p.category_id = c.id
-    WHERE p.id = ?
-    ''', (prayer_id,))
-    result = cursor.fetchone()
-    return result if result else None
+    INSERT INTO prayer_revisions (community_id, prayer_id, editor_id, position, removed, inserted, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (community_id, prayer_id, editor_id, position, removed, inserted, now))
+
+# Function to store a new text and optionally a new category of a prayer.
+# Returns the content hash of the new text.
+def _store_prayer_text(cursor, community_id, prayer_id, text, category_id, now):
+    content_hash = compute_content_hash(text)
+    stored, compressed, preview = compress_prayer(text)
+    # The prayer is in one of the tables, archived prayers are updated in place
+    for table in PRAYER_TABLES:
+        if category_id is not None:
+            cursor.execute(f'''
+            UPDATE {table} 
+            SET prayer = ?, compressed = ?, preview = ?, category_id = ?, updated_at = ?, content_hash = ? 
+            WHERE id = ? AND community_id = ?
+            ''', (stored, compressed, preview, category_id, now, content_hash, prayer_id, community_id))
+        else:
+            cursor.execute(f'''
+            UPDATE {table} 
+            SET prayer = ?, compressed = ?, preview = ?, updated_at = ?, content_hash = ? 
+            WHERE id = ? AND community_id = ?
+            ''', (stored, compressed, preview, now, content_hash, prayer_id, community_id))
+        if cursor.rowcount:
+            break
+    return content_hash
 
-# Function to fetch all prayers from all users
-def fetch_all_prayers(limit=10, offset=0):
+# Function to update a prayer of a community in the database
+def update_prayer(community_id, prayer_id, new_text, category_id=None, editor_id=None):
     """
-    Gets all prayers with pagination to avoid loading too much data at once.
+    Updates the text and optionally the category of a prayer.
+    
+    Returns:
+        Tuple (previous content hash, new content hash), or None if the prayer was not found
+    """
+    now = datetime.now().isoformat()
+    with transaction() as cursor:
+        # The previous category is needed to move the prayer between categories in the daily stats
+        cursor.execute(
+            'SELECT created_at, category_id, content_hash, prayer, compressed FROM all_prayers WHERE id = ? AND community_id = ?',
+            (prayer_id, community_id)
+        )
+        previous = cursor.fetchone()
+        if not previous:
+            return None
+        content_hash = _store_prayer_text(cursor, community_id, prayer_id, new_text, category_id, now)
+        if PRAYER_REVISIONS:
+            position, removed, inserted = _text_delta(decompress_prayer(previous[3], previous[4]), new_text)
+            _record_revision(cursor, community_id, prayer_id, editor_id, position, removed, inserted, now)
+        if category_id is not None and category_id != previous[1]:
+            _update_daily_stats(cursor, community_id, previous[0], previous[1], -1)
+            _update_daily_stats(cursor, community_id, previous[0], category_id, 1)
+    if category_id is not None:
+        invalidate_archive_counts(community_id)
+        invalidate_hot_counts(community_id)
+    return previous[2], content_hash
+
+# Function to replace one segment of a prayer of a community
+def patch_prayer(community_id, prayer_id, start, old_segment, new_segment, editor_id=None):
+    """
+    Replaces one segment of a long prayer (see split_prayer_segments). Whitespace
+    around the segment is kept, Telegram strips it from messages.
     
     Args:
-        limit: Maximum number of prayers to load at once
-        offset: Offset from the beginning of the list
+        community_id: ID of the community
+        prayer_id: ID of the prayer
+        start: Offset of the segment in the prayer text
+        old_segment: Segment as the user saw it, the patch is refused if it has changed since
+        new_segment: New text of the segment
+        editor_id: ID of the user who made the change, for the revision history
+        
+    Returns:
+        Tuple (previous content hash, new content hash), or None if the prayer was not found
+        or the segment has changed
+    """
+    now = datetime.now().isoformat()
+    with transaction() as cursor:
+        cursor.execute(
+            'SELECT prayer, compressed, content_hash FROM all_prayers WHERE id = ? AND community_id = ?',
+            (prayer_id, community_id)
+        )
+        previous = cursor.fetchone()
+        if not previous:
+            return None
+        text = decompress_prayer(previous[0], previous[1])
+        end = start + len(old_segment)
+        if text[start:end] != old_segment:
+            return None
+        
+        core = old_segment.strip()
+        if core:
+            leading = old_segment[:old_segment.index(core)]
+            new_segment = leading + new_segment.strip() + old_segment[len(leading) + len(core):]
+        position, removed, inserted = _text_delta(old_segment, new_segment)
+        content_hash = _store_prayer_text(cursor, community_id, prayer_id, text[:start] + new_segment + text[end:], None, now)
+        _record_revision(cursor, community_id, prayer_id, editor_id, start + position, removed, inserted, now)
+    return previous[2], content_hash
+
+# Function to delete a prayer of a community from the database
+def delete_prayer(community_id, prayer_id):
+    """
+    Marks a prayer as deleted. The prayer disappears from all lists but stays
+    in its table with its reminders and "I prayed" marks until the purge job
+    removes it, so the deletion can be undone with restore_prayer.
+    
+    Returns:
+        Content hash of the deleted prayer, or None if the prayer was not found
+    """
+    now = datetime.now().isoformat()
+    with transaction() as cursor:
+        cursor.execute(
+            'SELECT created_at, category_id, content_hash FROM all_prayers WHERE id = ? AND community_id = ?',
+            (prayer_id, community_id)
+        )
+        prayer = cursor.fetchone()
+        if not prayer:
+            return None
+        archived = False
+        for table in PRAYER_TABLES:
+            cursor.execute(
+                f'UPDATE {table} SET deleted_at = ? WHERE id = ? AND community_id = ? AND deleted_at IS NULL',
+                (now, prayer_id, community_id)
+            )
+            if cursor.rowcount:
+                archived = table == 'archive.prayers'
+                break
+        _update_daily_stats(cursor, community_id, prayer[0], prayer[1], -1)
+    if archived:
+        invalidate_archive_counts(community_id)
+        invalidate_hot_counts(community_id)
+    return prayer[2]
+
+# Function to get the ID of the user who wrote a deleted prayer that can still be restored
+def get_deleted_prayer_owner(community_id, prayer_id):
+    cursor = get_cursor()
+    deleted_after = (datetime.now() - timedelta(seconds=DELETE_UNDO_WINDOW)).isoformat()
+    for table in PRAYER_TABLES:
+        cursor.execute(
+            f'SELECT user_id FROM {table} WHERE id = ? AND community_id = ? AND deleted_at >= ?',
+            (prayer_id, community_id, deleted_after)
+        )
+        result = cursor.fetchone()
+        if result:
+            return result[0]
+    return None
+
+# Function to undo the deletion of a prayer of a community
+def restore_prayer(community_id, prayer_id):
+    """
+    Restores a prayer deleted less than DELETE_UNDO_WINDOW seconds ago.
+    
+    Returns:
+        Content hash of the restored prayer, or None if there is no such deleted prayer
+    """
+    deleted_after = (datetime.now() - timedelta(seconds=DELETE_UNDO_WINDOW)).isoformat()
+    with transaction() as cursor:
+        for table in PRAYER_TABLES:
+            cursor.execute(
+                f'SELECT created_at, category_id, content_hash FROM {table} WHERE id = ? AND community_id = ? AND deleted_at >= ?',
+                (prayer_id, community_id, deleted_after)
+            )
+            prayer = cursor.fetchone()
+            if prayer:
+                cursor.execute(f'UPDATE {table} SET deleted_at = NULL WHERE id = ?', (prayer_id,))
+                _update_daily_stats(cursor, community_id, prayer[0], prayer[1], 1)
+                break
+    if not prayer:
+        return None
+    if table == 'archive.prayers':
+        invalidate_archive_counts(community_id)
+        invalidate_hot_counts(community_id)
+    return prayer[2]
+
+# Function to remove deleted prayers for good
+def purge_deleted_prayers(deleted_before, batch_size=1000):
+    """
+    Removes prayers deleted before the given time together with their reminders,
+    "I prayed" marks and revisions in one transaction.
+    
+    Args:
+        deleted_before: ISO timestamp, prayers deleted earlier are removed
+        batch_size: Maximum number of prayers to remove at once
         
     Returns:
-        List of prayers with the specified limit and offset
+        List of IDs of removed prayers
     """
-    query = '''
-    SELECT p.prayer, p.username, p.created_at, p.first_name, p.last_name, c.name
-    FROM prayers p
+    purged = []
+    try:
+        with transaction() as cursor:
+            for table in PRAYER_TABLES:
+                cursor.execute(
+                    f'SELECT id FROM {table} WHERE deleted_at < ? LIMIT ?', (deleted_before, batch_size - len(purged))
+                )
+                prayer_ids = tuple(row[0] for row in cursor.fetchall())
+                if not prayer_ids:
+                    continue
+                placeholders = ','.join('?' * len(prayer_ids))
+                cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', prayer_ids)
+                for related_table in ('reminders', 'prayed_marks', 'prayed_counts', 'prayer_revisions'):
+                    cursor.execute(f'DELETE FROM {related_table} WHERE prayer_id IN ({placeholders})', prayer_ids)
+                purged.extend(prayer_ids)
+                if len(purged) >= batch_size:
+                    break
+    except Exception as e:
+        logger.error(f"Error purging deleted prayers: {str(e)}")
+        raise
+    return purged
+
+# Function to return free pages of the prayer databases to the file system
+def vacuum_free_pages(max_pages=1000):
+    """
+    Runs an incremental vacuum step on the main and archive databases.
+    
+    Returns:
+        Number of freed pages
+    """
+    cursor = get_cursor()
+    freed = 0
+    for schema in ('main', 'archive'):
+        cursor.execute(f'PRAGMA {schema}.freelist_count')
+        before = cursor.fetchone()[0]
+        if not before:
+            continue
+        cursor.execute(f'PRAGMA {schema}.incremental_vacuum({max_pages})')
+        cursor.fetchall()
+        cursor.execute(f'PRAGMA {schema}.freelist_count')
+        freed += before - cursor.fetchone()[0]
+    return freed
+
+# Function to fetch a single prayer of a community by ID
+def get_prayer_by_id(community_id, prayer_id):
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT p.prayer, p.compressed, p.category_id, c.name
+    FROM all_prayers p
     LEFT JOIN categories c ON p.category_id = c.id
+    WHERE p.id = ? AND p.community_id = ?
+    ''', (prayer_id, community_id))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    prayer, compressed, category_id, category_name = result
+    return decompress_prayer(prayer, compressed), category_id, category_name
+
+# Function to check if a prayer exists in a community
+def prayer_exists(community_id, prayer_id):
+    cursor = get_cursor()
+    cursor.execute('SELECT 1 FROM all_prayers WHERE id = ? AND community_id = ?', (prayer_id, community_id))
+    return cursor.fetchone() is not None
+
+# Function to get the ID of the user who wrote a prayer of a community
+def get_prayer_owner(community_id, prayer_id):
+    cursor = get_cursor()
+    cursor.execute('SELECT user_id FROM all_prayers WHERE id = ? AND community_id = ?', (prayer_id, community_id))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+# Function to fetch a page of the feed of a community from one prayer table
+def _fetch_feed_rows(table, community_id, category_id, limit, offset):
+    cursor = get_cursor()
+    category_filter = 'AND p.category_id = ?' if category_id is not None else ''
+    params = (community_id, category_id) if category_id is not None else (community_id,)
+    cursor.execute(f'''
+    SELECT {LIST_TEXT_COLUMN}, p.username, p.created_at, p.first_name, p.last_name, c.name, p.id, p.user_id,
+           p.compressed != 0
+    FROM {table} p
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE p.community_id = ? AND p.deleted_at IS NULL {category_filter}
     ORDER BY p.created_at DESC
     LIMIT ? OFFSET ?
-    '''
-    
-    cursor.execute(query, (limit, offset))
+    ''', (*params, limit, offset))
     return cursor.fetchall()
 
-# Function to fetch all prayers from all users filtered by category
-def fetch_all_prayers_by_category(category_id, limit=10, offset=0):
+# Number of prayers in main.prayers last counted or seen in a feed, by (community_id, category_id).
+# Pages past the hot prayers use it instead of counting them when counting is too expensive,
+# so it is dropped whenever prayers are added, moved to the archive or removed from the feed.
+_hot_counts = {}
+
+# Drop the cached counts of hot prayers of a community, of all communities by default
+def invalidate_hot_counts(community_id=None):
+    if community_id is None:
+        _hot_counts.clear()
+    else:
+        for key in [key for key in _hot_counts if key[0] == community_id]:
+            del _hot_counts[key]
+
+# Function to fetch a page of the feed, reading the archive only past the hot prayers
+def _fetch_feed(community_id, category_id, limit, offset, count_hot=True):
+    # Hot prayers come first, a page filled by them needs no count
+    prayers = _fetch_feed_rows('main.prayers', community_id, category_id, limit, offset)
+    if len(prayers) == limit:
+        return prayers
+    
+    # The archive continues the feed after the last hot prayer
+    key = (community_id, category_id)
+    if prayers or offset == 0:
+        hot_count = _hot_counts[key] = offset + len(prayers)
+    elif count_hot:
+        hot_count = _hot_counts[key] = _count_prayers('main.prayers', community_id, category_id)
+    else:
+        # Without a known count the archive is read from the start
+        hot_count = _hot_counts.get(key, offset)
+    # Archived prayers are all older than the hot ones, so they continue the feed
+    prayers += _fetch_feed_rows(
+        'archive.prayers', community_id, category_id, limit - len(prayers), max(0, offset - hot_count)
+    )
+    return prayers
+
+# Function to fetch all prayers from all users of a community
+def fetch_all_prayers(community_id, limit=10, offset=0, count_hot=True):
+    """
+    Gets all prayers of a community with pagination to avoid loading too much data at once.
+    
+    Args:
+        community_id: Community ID
+        limit: Maximum number of prayers to load at once
+        offset: Offset from the beginning of the list
+        count_hot: Whether a page past the hot prayers may count them, otherwise
+            the last known count is used (under load)
+        
+    Returns:
+        List of prayers (text, username, created_at, first_name, last_name,
+        category name, id, user_id, is_preview) with the specified limit and offset.
+        For long prayers the text is a short preview (is_preview is true)
+    """
+    return _fetch_feed(community_id, None, limit, offset, count_hot)
+
+# Function to fetch all prayers from all users of a community filtered by category
+def fetch_all_prayers_by_category(community_id, category_id, limit=10, offset=0, count_hot=True):
     """
     Gets all prayers of a specific category with pagination.
     
     Args:
+        community_id: Community ID
         category_id: Category ID
         limit: Maximum number of prayers to load at once
         offset: Offset from the beginning of the list
+        count_hot: Whether a page past the hot prayers may count them (see fetch_all_prayers)
         
     Returns:
-        List of prayers of the specified category with the specified limit and offset
+        List of prayers of the specified category (same fields as fetch_all_prayers)
+        with the specified limit and offset
     """
-    query = '''
-    SELECT p.prayer, p.username, p.created_at, p.first_name, p.last_name, c.name
-    FROM prayers p
-    LEFT JOIN categories c ON p.category_id = c.id
-    WHERE p.category_id = ?
-    ORDER BY p.created_at DESC
-    LIMIT ? OFFSET ?
-    '''
+    return _fetch_feed(community_id, category_id, limit, offset, count_hot)
+
+# Function to search prayers with keyset pagination
+def search_prayers(community_id, category_id=None, text=None, after=None, limit=20):
+    """
+    Gets prayers of a community newest first, optionally filtered by category and text.
     
-    cursor.execute(query, (category_id, limit, offset))
-    return cursor.fetchall()
+    Args:
+        community_id: Community ID
+        category_id: Category ID or None for all categories
+        text: Text the prayer must contain or None
+        after: (created_at, id) of the last prayer of the previous page or None
+        limit: Maximum number of prayers to load at once
+        
+    Returns:
+        List of prayers (same fields as fetch_all_prayers)
+    """
+    conditions = ['p.community_id = ?', 'p.deleted_at IS NULL']
+    params = [community_id]
+    if category_id is not None:
+        conditions.append('p.category_id = ?')
+        params.append(category_id)
+    if text:
+        escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        # Long prayers are searched by their preview
+        conditions.append(f"{LIST_TEXT_COLUMN} LIKE ? ESCAPE '\\'")
+        params.append(f'%{escaped}%')
+    if after is not None:
+        conditions.append('(p.created_at < ? OR (p.created_at = ? AND p.id < ?))')
+        params.extend((after[0], after[0], after[1]))
+    where = f"WHERE {' AND '.join(conditions)}"
+    
+    cursor = get_cursor()
+    prayers = []
+    # Archived prayers are older than the hot ones, the archive is read only when the hot prayers run out
+    for table in PRAYER_TABLES:
+        cursor.execute(f'''
+        SELECT {LIST_TEXT_COLUMN}, p.username, p.created_at, p.first_name, p.last_name, c.name, p.id, p.user_id,
+               p.compressed != 0
+        FROM {table} p
+        LEFT JOIN categories c ON p.category_id = c.id
+        {where}
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT ?
+        ''', (*params, limit - len(prayers)))
+        prayers += cursor.fetchall()
+        if len(prayers) >= limit:
+            break
+    return prayers
+
+# Archived prayers change only when prayers are archived, deleted or restored, so their counts are cached.
+# Keys are community IDs, values are {category_id: count}, None for all categories.
+_archived_counts = {}
 
-# Function to count total prayers
-def count_all_prayers():
+# Drop the cached counts of archived prayers of a community, of all communities by default
+def invalidate_archive_counts(community_id=None):
+    if community_id is None:
+        _archived_counts.clear()
+    else:
+        _archived_counts.pop(community_id, None)
+
+# Function to count prayers of a community in one prayer table, optionally filtered by category
+def _count_prayers(table, community_id, category_id=None):
+    cursor = get_cursor()
+    if category_id is not None:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {table} WHERE community_id = ? AND category_id = ? AND deleted_at IS NULL',
+            (community_id, category_id)
+        )
+    else:
+        cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE community_id = ? AND deleted_at IS NULL', (community_id,))
+    return cursor.fetchone()[0]
+
+# Function to count archived prayers of a community, optionally filtered by category
+def _count_archived_prayers(community_id, category_id=None):
+    counts = _archived_counts.setdefault(community_id, {})
+    if category_id not in counts:
+        counts[category_id] = _count_prayers('archive.prayers', community_id, category_id)
+    return counts[category_id]
+
+# Function to count total prayers of a community
+def count_all_prayers(community_id):
     """
-    Counts the total number of prayers.
+    Counts the total number of prayers of a community.
     
+    Args:
+        community_id: Community ID
+        
     Returns:
         Integer - number of prayers
     """
-    cursor.execute('SELECT COUNT(*) FROM prayers')
-    return cursor.fetchone()[0]
+    hot_count = _hot_counts[(community_id, None)] = _count_prayers('main.prayers', community_id)
+    return hot_count + _count_archived_prayers(community_id)
 
-# Function to count prayers in a specific category
-def count_prayers_by_category(category_id):
+# Function to count prayers of a community in a specific category
+def count_prayers_by_category(community_id, category_id):
     """
-    Counts the number of prayers in a specific category.
+    Counts the number of prayers of a community in a specific category.
     
     Args:
+        community_id: Community ID
         category_id: Category ID
         
     Returns:
         Integer - number of prayers in the category
     """
-    cursor.execute('SELECT COUNT(*) FROM prayers WHERE category_id = ?', (category_id,))
-    return cursor.fetchone()[0] 
\ No newline at end of file
+    hot_count = _hot_counts[(community_id, category_id)] = _count_prayers('main.prayers', community_id, category_id)
+    return hot_count + _count_archived_prayers(community_id, category_id)
+
+# Function to add prayers to the daily stats, called in the transaction that changes the prayers.
+# Prayers without a category are counted under category 0.
+def _update_daily_stats(cursor, community_id, created_at, category_id, delta):
+    cursor.execute('''
+    INSERT INTO daily_stats (community_id, day, category_id, prayers) VALUES (?, ?, ?, ?)
+    ON CONFLICT (community_id, day, category_id) DO UPDATE SET prayers = prayers + excluded.prayers
+    ''', (community_id, (created_at or '')[:10], category_id or 0, delta))
+
+# Function to fetch the daily stats of a community
+def fetch_daily_stats(community_id, since_day=''):
+    """
+    Gets the number of prayers per day and category from the daily stats.
+    
+    Args:
+        community_id: Community ID
+        since_day: First day to include (YYYY-MM-DD), all days by default
+        
+    Returns:
+        List of (day, category_id, prayers), oldest day first
+    """
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT day, category_id, prayers FROM daily_stats
+    WHERE community_id = ? AND day >= ? AND prayers != 0
+    ORDER BY day, category_id
+    ''', (community_id, since_day))
+    return cursor.fetchall()
+
+# Function to fetch the total number of prayers per category of a community from the daily stats
+def fetch_category_totals(community_id):
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT category_id, SUM(prayers) FROM daily_stats
+    WHERE community_id = ?
+    GROUP BY category_id
+    ''', (community_id,))
+    return dict(cursor.fetchall())
+
+# Function to count users of a community who sent prayers in a range of days
+def count_active_users(community_id, since_day, until_day='9999-12-31'):
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT COUNT(DISTINCT user_id) FROM daily_active_users
+    WHERE community_id = ? AND day >= ? AND day <= ?
+    ''', (community_id, since_day, until_day))
+    return cursor.fetchone()[0]
+
+# Function to fetch the number of users of a community who sent prayers per day
+def fetch_daily_active_users(community_id, since_day=''):
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT day, COUNT(*) FROM daily_active_users
+    WHERE community_id = ? AND day >= ?
+    GROUP BY day
+    ''', (community_id, since_day))
+    return dict(cursor.fetchall())
+
+# Function to fill in the daily stats of prayers saved by older versions
+def backfill_daily_stats():
+    """
+    Builds the daily stats from the prayers once, when the stats are empty.
+    After that they are kept up to date by the functions that change prayers.
+    
+    Returns:
+        Number of counted prayers
+    """
+    cursor = get_cursor()
+    cursor.execute('SELECT 1 FROM daily_stats LIMIT 1')
+    if cursor.fetchone():
+        return 0
+    try:
+        cursor.execute('''
+        INSERT INTO daily_stats (community_id, day, category_id, prayers)
+        SELECT community_id, substr(COALESCE(created_at, ''), 1, 10), COALESCE(category_id, 0), COUNT(*)
+        FROM all_prayers
+        GROUP BY 1, 2, 3
+        ''')
+        cursor.execute('''
+        INSERT OR IGNORE INTO daily_active_users (community_id, day, user_id)
+        SELECT DISTINCT community_id, substr(COALESCE(created_at, ''), 1, 10), user_id
+        FROM all_prayers
+        WHERE user_id IS NOT NULL
+        ''')
+        cursor.execute('SELECT COALESCE(SUM(prayers), 0) FROM daily_stats')
+        total = cursor.fetchone()[0]
+        get_connection().commit()
+    except Exception as e:
+        get_connection().rollback()
+        logger.error(f"Error building daily stats: {str(e)}")
+        raise
+    if total:
+        logger.info(f"Built daily stats for {total} prayers")
+    return total
+
+# Function to create a reminder or update the existing reminder of the user for the prayer
+def upsert_reminder(user_id, chat_id, prayer_id, interval_seconds, next_run_at):
+    """
+    Creates or updates a reminder about a prayer.
+    
+    Args:
+        user_id: ID of the user to remind
+        chat_id: Chat to send reminders to
+        prayer_id: Prayer ID
+        interval_seconds: Interval between reminders
+        next_run_at: Unix timestamp of the first reminder
+        
+    Returns:
+        ID of the reminder
+    """
+    now = datetime.now().isoformat()
+    with transaction() as cursor:
+        cursor.execute('''
+        INSERT INTO reminders (user_id, chat_id, prayer_id, interval_seconds, next_run_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, prayer_id) DO UPDATE SET
+            chat_id = excluded.chat_id,
+            interval_seconds = excluded.interval_seconds,
+            next_run_at = excluded.next_run_at
+        ''', (user_id, chat_id, prayer_id, interval_seconds, next_run_at, now))
+        cursor.execute('SELECT id FROM reminders WHERE user_id = ? AND prayer_id = ?', (user_id, prayer_id))
+        return cursor.fetchone()[0]
+
+# Function to delete a reminder of a user
+def delete_reminder(reminder_id, user_id):
+    cursor = get_cursor()
+    cursor.execute('DELETE FROM reminders WHERE id = ? AND user_id = ?', (reminder_id, user_id))
+    get_connection().commit()
+    return cursor.rowcount > 0
+
+# Function to fetch reminders in next_run_at order
+def fetch_reminders_until(until, after=(0, 0), limit=500):
+    """
+    Gets reminders due not later than the given time, using a keyset cursor.
+    
+    Args:
+        until: Unix timestamp, reminders with a later next_run_at are skipped
+        after: (next_run_at, id) of the last already loaded reminder
+        limit: Maximum number of reminders to load at once
+        
+    Returns:
+        List of reminders (id, next_run_at)
+    """
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT id, next_run_at
+    FROM reminders
+    WHERE (next_run_at > ? OR (next_run_at = ? AND id > ?)) AND next_run_at <= ?
+    ORDER BY next_run_at, id
+    LIMIT ?
+    ''', (after[0], after[0], after[1], until, limit))
+    return cursor.fetchall()
+
+# Function to fetch reminders together with the prayers to send
+def fetch_reminders_by_ids(reminder_ids):
+    """
+    Gets reminders with prayer text and category name.
+    
+    Args:
+        reminder_ids: IDs of reminders
+        
+    Returns:
+        List of reminders (id, chat_id, prayer_id, interval_seconds, next_run_at, prayer text, category name,
+        whether the prayer is deleted but not purged yet)
+    """
+    if not reminder_ids:
+        return []
+    cursor = get_cursor()
+    placeholders = ','.join('?' * len(reminder_ids))
+    cursor.execute(f'''
+    SELECT r.id, r.chat_id, r.prayer_id, r.interval_seconds, r.next_run_at, p.prayer, p.compressed, c.name,
+           p.id IS NULL AND (
+               EXISTS (SELECT 1 FROM main.prayers d WHERE d.id = r.prayer_id AND d.deleted_at IS NOT NULL)
+               OR EXISTS (SELECT 1 FROM archive.prayers d WHERE d.id = r.prayer_id AND d.deleted_at IS NOT NULL)
+           )
+    FROM reminders r
+    LEFT JOIN all_prayers p ON r.prayer_id = p.id
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE r.id IN ({placeholders})
+    ''', tuple(reminder_ids))
+    return [(*row[:5], decompress_prayer(row[5], row[6]), row[7], bool(row[8])) for row in cursor.fetchall()]
+
+# Function to move reminders to their next run
+def claim_reminders(claims):
+    """
+    Moves due reminders to their next run in one transaction.
+    A reminder is claimed only if its next_run_at is still the expected one,
+    so a reminder is never sent twice, even after a restart.
+    
+    Args:
+        claims: List of (reminder_id, expected next_run_at, new next_run_at)
+        
+    Returns:
+        Set of IDs of the claimed reminders
+    """
+    claimed = set()
+    try:
+        with transaction() as cursor:
+            for reminder_id, expected_run_at, next_run_at in claims:
+                cursor.execute('''
+                UPDATE reminders SET next_run_at = ?
+                WHERE id = ? AND next_run_at = ?
+                ''', (next_run_at, reminder_id, expected_run_at))
+                if cursor.rowcount:
+                    claimed.add(reminder_id)
+    except Exception as e:
+        logger.error(f"Error claiming reminders: {str(e)}")
+        return set()
+    return claimed
+
+# Function to delete reminders whose prayer no longer exists
+def delete_reminders(reminder_ids):
+    if not reminder_ids:
+        return
+    cursor = get_cursor()
+    placeholders = ','.join('?' * len(reminder_ids))
+    cursor.execute(f'DELETE FROM reminders WHERE id IN ({placeholders})', tuple(reminder_ids))
+    get_connection().commit()
+
+# Function to check if a user already prayed for a prayer
+def has_prayed(user_id, prayer_id):
+    cursor = get_cursor()
+    cursor.execute('SELECT 1 FROM prayed_marks WHERE prayer_id = ? AND user_id = ?', (prayer_id, user_id))
+    return cursor.fetchone() is not None
+
+# Function to fetch "I prayed" counts of prayers
+def fetch_prayed_counts(prayer_ids):
+    """
+    Gets the number of users who prayed for each prayer.
+    
+    Args:
+        prayer_ids: IDs of prayers
+        
+    Returns:
+        Dictionary {prayer_id: count}, prayers without marks are included with 0
+    """
+    counts = dict.fromkeys(prayer_ids, 0)
+    if not prayer_ids:
+        return counts
+    cursor = get_cursor()
+    placeholders = ','.join('?' * len(prayer_ids))
+    cursor.execute(f'SELECT prayer_id, count FROM prayed_counts WHERE prayer_id IN ({placeholders})', tuple(prayer_ids))
+    counts.update(cursor.fetchall())
+    return counts
+
+# Function to save "I prayed" marks and update the counts
+def save_prayed_marks(marks):
+    """
+    Saves marks in one transaction. Marks of prayers that no longer exist
+    and repeated marks are ignored, deleted prayers keep their marks until
+    they are purged, so a restore brings them back.
+    
+    Args:
+        marks: List of (user_id, prayer_id, created_at)
+        
+    Returns:
+        Dictionary {prayer_id: number of new marks}
+    """
+    deltas = {}
+    try:
+        with transaction() as cursor:
+            for user_id, prayer_id, created_at in marks:
+                cursor.execute('''
+                INSERT OR IGNORE INTO prayed_marks (prayer_id, user_id, created_at)
+                SELECT ?, ?, ?
+                WHERE EXISTS (SELECT 1 FROM main.prayers WHERE id = ?) OR EXISTS (SELECT 1 FROM archive.prayers WHERE id = ?)
+                ''', (prayer_id, user_id, created_at, prayer_id, prayer_id))
+                if cursor.rowcount > 0:
+                    deltas[prayer_id] = deltas.get(prayer_id, 0) + 1
+            cursor.executemany('''
+            INSERT INTO prayed_counts (prayer_id, count) VALUES (?, ?)
+            ON CONFLICT (prayer_id) DO UPDATE SET count = count + excluded.count
+            ''', deltas.items())
+    except Exception as e:
+        logger.error(f"Error saving prayed marks: {str(e)}")
+        raise
+    return deltas
+
+# Function to fill in content hashes of prayers saved by older versions
+def backfill_content_hashes(batch_size=500):
+    cursor = get_cursor()
+    total = 0
+    while True:
+        cursor.execute('SELECT id, prayer, compressed FROM prayers WHERE content_hash IS NULL LIMIT ?', (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            'UPDATE prayers SET content_hash = ? WHERE id = ?',
+            [(compute_content_hash(decompress_prayer(prayer, compressed)), prayer_id) for prayer_id, prayer, compressed in rows]
+        )
+        get_connection().commit()
+        total += len(rows)
+    if total:
+        logger.info(f"Computed content hashes for {total} prayers")
+    return total
+
+# Function to find duplicate prayers of a community
+def find_duplicate_prayers(community_id):
+    """
+    Finds prayers with the same content sent more than once by the same user,
+    among both the hot and the archived prayers.
+    
+    Args:
+        community_id: Community ID
+        
+    Returns:
+        List of groups, each is a list of prayer IDs, oldest first
+    """
+    cursor = get_cursor()
+    cursor.execute('''
+    SELECT GROUP_CONCAT(id)
+    FROM all_prayers
+    WHERE community_id = ? AND content_hash IS NOT NULL
+    GROUP BY user_id, content_hash
+    HAVING COUNT(*) > 1
+    ''', (community_id,))
+    return [sorted(int(prayer_id) for prayer_id in row[0].split(',')) for row in cursor.fetchall()]
+
+# Function to merge duplicate prayers into the oldest one of each group
+def merge_duplicate_prayers(groups):
+    """
+    Deletes all prayers of each group except the oldest one in one transaction.
+    Reminders and "I prayed" marks of the deleted copies are moved to the kept prayer,
+    their revisions are deleted with them.
+    
+    Args:
+        groups: Groups of prayer IDs as returned by find_duplicate_prayers
+        
+    Returns:
+        Number of deleted prayers
+    """
+    deleted = 0
+    with transaction() as cursor:
+        for group in groups:
+            keep_id, duplicate_ids = group[0], group[1:]
+            for duplicate_id in duplicate_ids:
+                # Rows that would conflict with existing ones of the kept prayer are dropped below
+                cursor.execute('UPDATE OR IGNORE reminders SET prayer_id = ? WHERE prayer_id = ?', (keep_id, duplicate_id))
+                cursor.execute('UPDATE OR IGNORE prayed_marks SET prayer_id = ? WHERE prayer_id = ?', (keep_id, duplicate_id))
+                for related_table in ('reminders', 'prayed_marks', 'prayed_counts', 'prayer_revisions'):
+                    cursor.execute(f'DELETE FROM {related_table} WHERE prayer_id = ?', (duplicate_id,))
+                # The copy is in one of the tables
+                for table in PRAYER_TABLES:
+                    cursor.execute(
+                        f'SELECT community_id, created_at, category_id FROM {table} WHERE id = ? AND deleted_at IS NULL',
+                        (duplicate_id,)
+                    )
+                    prayer = cursor.fetchone()
+                    if prayer:
+                        cursor.execute(f'DELETE FROM {table} WHERE id = ?', (duplicate_id,))
+                        _update_daily_stats(cursor, *prayer, -1)
+                        deleted += 1
+                        break
+            cursor.execute('''
+            INSERT OR REPLACE INTO prayed_counts (prayer_id, count)
+            SELECT ?, COUNT(*) FROM prayed_marks WHERE prayer_id = ?
+            ''', (keep_id, keep_id))
+    invalidate_archive_counts()
+    invalidate_hot_counts()
+    logger.info(f"Merged {deleted} duplicate prayers in {len(groups)} groups")
+    return deleted
+
+# Function to compress long prayers saved by older versions
+def compress_existing_prayers(batch_size=100):
+    cursor = get_cursor()
+    total = 0
+    last_id = 0
+    while True:
+        cursor.execute('''
+        SELECT id, prayer FROM prayers
+        WHERE id > ? AND compressed = 0 AND length(prayer) > ?
+        ORDER BY id
+        LIMIT ?
+        ''', (last_id, COMPRESSION_THRESHOLD, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = []
+        for prayer_id, prayer in rows:
+            stored, compressed, preview = compress_prayer(prayer)
+            if compressed != COMPRESSION_NONE:
+                updates.append((stored, compressed, preview, prayer_id))
+        cursor.executemany('UPDATE prayers SET prayer = ?, compressed = ?, preview = ? WHERE id = ?', updates)
+        get_connection().commit()
+        total += len(updates)
+    if total:
+        logger.info(f"Compressed {total} long prayers")
+    return total
+
+# Function to move old prayers to the archive
+def archive_prayers_batch(created_before, batch_size=500):
+    """
+    Moves the oldest prayers created before the given time to the archive
+    database in one transaction.
+    
+    Args:
+        created_before: ISO timestamp, older prayers are archived
+        batch_size: Maximum number of prayers to move at once
+        
+    Returns:
+        Number of archived prayers
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute(
+                'SELECT id FROM main.prayers WHERE created_at < ? ORDER BY created_at, id LIMIT ?',
+                (created_before, batch_size)
+            )
+            prayer_ids = tuple(row[0] for row in cursor.fetchall())
+            if not prayer_ids:
+                return 0
+            
+            placeholders = ','.join('?' * len(prayer_ids))
+            cursor.execute(f'''
+            INSERT OR REPLACE INTO archive.prayers ({PRAYER_COLUMNS})
+            SELECT {PRAYER_COLUMNS} FROM main.prayers WHERE id IN ({placeholders})
+            ''', prayer_ids)
+            cursor.execute(f'DELETE FROM main.prayers WHERE id IN ({placeholders})', prayer_ids)
+    except Exception as e:
+        logger.error(f"Error archiving prayers: {str(e)}")
+        raise
+    invalidate_archive_counts()
+    invalidate_hot_counts()
+    return len(prayer_ids)
+
+# Function to append entries to the audit log
+def save_audit_entries(entries):
+    """
+    Saves audit entries in one transaction.
+    
+    Args:
+        entries: List of (community_id, actor_id, action, target_id, before_hash, after_hash, details, created_at)
+    """
+    try:
+        with transaction() as cursor:
+            cursor.executemany('''
+            INSERT INTO audit_log (community_id, actor_id, action, target_id, before_hash, after_hash, details, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', entries)
+    except Exception as e:
+        logger.error(f"Error saving audit entries: {str(e)}")
+        raise
+
+# Function to fetch the latest audit entries of a community
+def fetch_audit_entries(community_id, actor_id=None, limit=20):
+    """
+    Gets audit entries newest first, optionally only those of one actor.
+    
+    Args:
+        community_id: Community ID
+        actor_id: ID of the user who made the changes or None for all users
+        limit: Maximum number of entries
+        
+    Returns:
+        List of (actor_id, action, target_id, before_hash, after_hash, details, created_at)
+    """
+    cursor = get_cursor()
+    actor_filter = 'AND actor_id = ?' if actor_id is not None else ''
+    params = (community_id, actor_id) if actor_id is not None else (community_id,)
+    cursor.execute(f'''
+    SELECT actor_id, action, target_id, before_hash, after_hash, details, created_at
+    FROM audit_log
+    WHERE community_id = ? {actor_filter}
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+    ''', (*params, limit))
+    return cursor.fetchall()
+
+# Function to subscribe a user to new prayers of a category
+def subscribe(user_id, community_id, category_id):
+    with transaction() as cursor:
+        cursor.execute(
+            'INSERT OR IGNORE INTO subscriptions (user_id, community_id, category_id, created_at) VALUES (?, ?, ?, ?)',
+            (user_id, community_id, category_id, datetime.now().isoformat())
+        )
+        return cursor.rowcount > 0
+
+# Function to unsubscribe a user from new prayers of a category
+def unsubscribe(user_id, community_id, category_id):
+    cursor = get_cursor()
+    cursor.execute(
+        'DELETE FROM subscriptions WHERE user_id = ? AND community_id = ? AND category_id = ?',
+        (user_id, community_id, category_id)
+    )
+    get_connection().commit()
+    return cursor.rowcount > 0
+
+# Function to fetch IDs of the categories of a community a user is subscribed to
+def fetch_user_subscriptions(user_id, community_id):
+    cursor = get_cursor()
+    cursor.execute(
+        'SELECT category_id FROM subscriptions WHERE user_id = ? AND community_id = ?', (user_id, community_id)
+    )
+    return frozenset(row[0] for row in cursor.fetchall())
+
+# Function to remove all subscriptions of a user, e.g. after the user blocked the bot
+def delete_user_subscriptions(user_id):
+    cursor = get_cursor()
+    cursor.execute('DELETE FROM subscriptions WHERE user_id = ?', (user_id,))
+    get_connection().commit()
+    return cursor.rowcount
+
+# Function to fetch subscribers of categories in user order
+def fetch_subscribers(community_id, category_ids, after=(0, 0), limit=1000):
+    """
+    Gets subscriptions to any of the categories of a community, using a keyset cursor.
+    
+    Args:
+        community_id: Community ID
+        category_ids: IDs of the categories
+        after: (user_id, category_id) of the last already loaded subscription
+        limit: Maximum number of subscriptions to load at once
+        
+    Returns:
+        List of subscriptions (user_id, category_id)
+    """
+    cursor = get_cursor()
+    placeholders = ','.join('?' * len(category_ids))
+    cursor.execute(f'''
+    SELECT user_id, category_id
+    FROM subscriptions
+    WHERE community_id = ? AND category_id IN ({placeholders})
+      AND (user_id > ? OR (user_id = ? AND category_id > ?))
+    ORDER BY user_id, category_id
+    LIMIT ?
+    ''', (community_id, *category_ids, after[0], after[0], after[1], limit))
+    return cursor.fetchall()
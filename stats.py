@@ -0,0 +1,110 @@
+import csv
+import html
+import io
+from datetime import date, timedelta
+
+from database import get_all_categories
+from services import fetch_daily_stats, fetch_category_totals, count_active_users, fetch_daily_active_users
+
+# Number of days and weeks shown in the report
+STATS_DAYS = 7
+STATS_WEEKS = 4
+
+# Name of category 0 in the stats, prayers without a category
+NO_CATEGORY_NAME = 'Без категорії'
+
+# Get names of the categories of a community by ID
+def _category_names(community_id):
+    names = dict(get_all_categories(community_id))
+    names[0] = NO_CATEGORY_NAME
+    return names
+
+# Format the change between two periods, e.g. "+25%"
+def _format_growth(current, previous):
+    if not previous:
+        return '—' if not current else 'нові'
+    return f"{(current - previous) * 100 / previous:+.0f}%"
+
+# Build the /stats report of a community
+def build_stats_report(community, today=None):
+    """
+    Builds the text of the /stats report from the daily stats, so it takes
+    the same time for any number of prayers.
+
+    Args:
+        community: Community
+        today: Date the report ends with, today by default
+
+    Returns:
+        HTML text of the report
+    """
+    today = today or date.today()
+    # Enough days for the previous 30 days and the last STATS_WEEKS weeks
+    since = min(today - timedelta(days=29), today - timedelta(days=today.weekday() + 7 * (STATS_WEEKS - 1)))
+    names = _category_names(community.id)
+
+    daily = {}
+    category_days = {}
+    for day, category_id, prayers in fetch_daily_stats(community.id, since.isoformat()):
+        daily[day] = daily.get(day, 0) + prayers
+        category_days.setdefault(category_id, {})[day] = prayers
+    totals = fetch_category_totals(community.id)
+
+    def total_since(days, counts=daily, before=0):
+        first = (today - timedelta(days=days + before - 1)).isoformat()
+        last = (today - timedelta(days=before)).isoformat()
+        return sum(count for day, count in counts.items() if first <= day <= last)
+
+    last_week, previous_week = total_since(7), total_since(7, before=7)
+    lines = [
+        f"📊 <b>Статистика спільноти «{html.escape(community.title)}»</b>\n",
+        f"Всього молитов: <b>{sum(totals.values())}</b>",
+        f"За 7 днів: <b>{last_week}</b> ({_format_growth(last_week, previous_week)} до попередніх 7 днів)",
+        f"За 30 днів: <b>{total_since(30)}</b>",
+        f"Активних користувачів: 7 днів — <b>{count_active_users(community.id, (today - timedelta(days=6)).isoformat())}</b>, "
+        f"30 днів — <b>{count_active_users(community.id, (today - timedelta(days=29)).isoformat())}</b>",
+        "",
+        "<b>По днях:</b>",
+    ]
+    for offset in range(STATS_DAYS - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        lines.append(f"{day.strftime('%d.%m')} — {daily.get(day.isoformat(), 0)}")
+
+    lines += ["", "<b>По тижнях:</b>"]
+    week_start = today - timedelta(days=today.weekday())
+    for week in range(STATS_WEEKS - 1, -1, -1):
+        first = week_start - timedelta(weeks=week)
+        count = sum(daily.get((first + timedelta(days=i)).isoformat(), 0) for i in range(7))
+        lines.append(f"з {first.strftime('%d.%m')} — {count}")
+
+    lines += ["", "<b>Категорії (7 днів / 30 днів / всього):</b>"]
+    rows = [
+        (total_since(30, category_days.get(category_id, {})), category_id)
+        for category_id in set(totals) | set(category_days)
+    ]
+    for month_count, category_id in sorted(rows, key=lambda row: (-row[0], -totals.get(row[1], 0))):
+        week_count = total_since(7, category_days.get(category_id, {}))
+        name = names.get(category_id, f"#{category_id}")
+        lines.append(f"{html.escape(name)}: {week_count} / {month_count} / {totals.get(category_id, 0)}")
+
+    lines.append("\nЕкспорт у CSV: /stats csv")
+    return "\n".join(lines)
+
+# Build a CSV file with the daily stats of a community: one row per day, one column per category
+def build_stats_csv(community_id):
+    names = _category_names(community_id)
+    daily = {}
+    for day, category_id, prayers in fetch_daily_stats(community_id):
+        daily.setdefault(day, {})[category_id] = prayers
+    active_users = fetch_daily_active_users(community_id)
+    category_ids = sorted({category_id for counts in daily.values() for category_id in counts},
+                          key=lambda category_id: names.get(category_id, ''))
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['day', 'prayers', 'active_users'] + [names.get(category_id, f"#{category_id}") for category_id in category_ids])
+    for day in sorted(daily):
+        counts = daily[day]
+        writer.writerow([day, sum(counts.values()), active_users.get(day, 0)] + [counts.get(category_id, 0) for category_id in category_ids])
+    # BOM so spreadsheet apps detect UTF-8
+    return output.getvalue().encode('utf-8-sig')
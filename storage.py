@@ -0,0 +1,120 @@
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import get_cursor, transaction
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Number of FSM keys kept in memory, most of them belong to users without a state
+FSM_CACHE_SIZE = 10000
+
+# Build the key of a row in fsm_states
+def _row_key(key: StorageKey):
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.business_connection_id or ''}:{key.destiny}"
+
+# Restore the key from the key of a row, the destiny never contains ':'
+def _parse_row_key(row_key):
+    bot_id, chat_id, user_id, thread_id, rest = row_key.split(':', 4)
+    business_connection_id, destiny = rest.rsplit(':', 1)
+    return StorageKey(
+        bot_id=int(bot_id), chat_id=int(chat_id), user_id=int(user_id),
+        thread_id=int(thread_id) if thread_id else None,
+        business_connection_id=business_connection_id or None, destiny=destiny,
+    )
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in the fsm_states table of the main database, so states and
+    drafts survive restarts of the bot. States and data are cached in memory
+    and written through on every change, reads don't touch the database.
+    A key without a state and data has no row.
+    """
+
+    def __init__(self, cache_size=FSM_CACHE_SIZE):
+        self.cache_size = cache_size
+        # row key -> (state, data)
+        self._cache = OrderedDict()
+
+    def _load(self, row_key):
+        entry = self._cache.get(row_key)
+        if entry is None:
+            cursor = get_cursor()
+            cursor.execute('SELECT state, data FROM fsm_states WHERE key = ?', (row_key,))
+            row = cursor.fetchone()
+            entry = (row[0], json.loads(row[1])) if row else (None, {})
+            self._remember(row_key, entry)
+        else:
+            self._cache.move_to_end(row_key)
+        return entry
+
+    def _remember(self, row_key, entry):
+        self._cache[row_key] = entry
+        self._cache.move_to_end(row_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _save(self, row_key, state, data):
+        with transaction() as cursor:
+            if state is None and not data:
+                cursor.execute('DELETE FROM fsm_states WHERE key = ?', (row_key,))
+            else:
+                cursor.execute('''
+                INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data,
+                                                updated_at = excluded.updated_at
+                ''', (row_key, state, json.dumps(data, ensure_ascii=False), datetime.now().isoformat()))
+        self._remember(row_key, (state, data))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        row_key = _row_key(key)
+        _, data = self._load(row_key)
+        self._save(row_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(_row_key(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        row_key = _row_key(key)
+        state, _ = self._load(row_key)
+        self._save(row_key, state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict(self._load(_row_key(key))[1])
+
+    def find_states(self, state):
+        """
+        Finds conversations in the given state, e.g. to resume drafts after a restart.
+
+        Returns:
+            List of (StorageKey, data)
+        """
+        cursor = get_cursor()
+        cursor.execute('SELECT key, data FROM fsm_states WHERE state = ?', (state,))
+        return [(_parse_row_key(row_key), json.loads(data)) for row_key, data in cursor.fetchall()]
+
+    def delete_stale(self, updated_before):
+        """
+        Removes states not changed since the given time, e.g. drafts abandoned long ago.
+
+        Returns:
+            Number of removed states
+        """
+        with transaction() as cursor:
+            cursor.execute('DELETE FROM fsm_states WHERE updated_at < ?', (updated_before,))
+            removed = cursor.rowcount
+        if removed:
+            self._cache.clear()
+        return removed
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+# Shared FSM storage
+fsm_storage = SQLiteStorage()
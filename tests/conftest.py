@@ -0,0 +1,116 @@
+import datetime
+import itertools
+import os
+import sys
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+# The bot is a set of top-level modules, tests import them from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import communities
+import database
+import services
+from callbacks import encode_callback
+from config import ADMIN_USER_ID
+
+_ids = itertools.count(1000)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Every test gets its own main and archive databases and empty caches
+    monkeypatch.chdir(tmp_path)
+    database._conn = None
+    for cache in (
+        database._categories, database._categories_versions, services._recent_hashes, services._archived_counts,
+        services._hot_counts, communities._communities, communities._communities_by_chat, communities._admins,
+        communities._selected,
+    ):
+        cache.clear()
+    database.create_table()
+    yield database
+    database._conn.close()
+    database._conn = None
+
+
+class FakeSession(BaseSession):
+    # Records Bot API calls instead of making them
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        if type(method).__name__.startswith(('Send', 'Edit')):
+            return Message(
+                message_id=next(_ids), date=datetime.datetime.now(), text=getattr(method, 'text', None),
+                chat=Chat(id=method.chat_id, type='private'),
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class PrivateChat:
+    # Private chat of a user with the bot: sends messages, presses buttons and reads the answers
+    def __init__(self, dispatcher, user_id):
+        self.dispatcher = dispatcher
+        self.user = User(id=user_id, is_bot=False, first_name='User', username=f'user{user_id}')
+        self.chat = Chat(id=user_id, type='private')
+        self.bot = Bot(token='42:TEST', session=FakeSession())
+
+    async def send(self, text):
+        entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}] if text.startswith('/') else None
+        message = Message(
+            message_id=next(_ids), date=datetime.datetime.now(), chat=self.chat, from_user=self.user,
+            text=text, entities=entities,
+        )
+        await self.dispatcher.feed_update(self.bot, Update(update_id=next(_ids), message=message))
+
+    async def press(self, kind, *args):
+        message = Message(message_id=next(_ids), date=datetime.datetime.now(), chat=self.chat, text='-')
+        callback_query = CallbackQuery(
+            id=str(next(_ids)), from_user=self.user, chat_instance='-', message=message,
+            data=encode_callback(kind, *args),
+        )
+        await self.dispatcher.feed_update(self.bot, Update(update_id=next(_ids), callback_query=callback_query))
+
+    @property
+    def texts(self):
+        return [call.text for call in self.bot.session.calls if type(call).__name__ == 'SendMessage']
+
+    @property
+    def alerts(self):
+        return [call.text for call in self.bot.session.calls if type(call).__name__ == 'AnswerCallbackQuery' and call.text]
+
+
+@pytest.fixture(scope='session')
+def _dispatcher():
+    # Handlers are attached to module-level routers, which can be included in one dispatcher only
+    import bot
+    from handlers import register_handlers
+    dispatcher = Dispatcher()
+    register_handlers(dispatcher, bot.AdminFilter(), bot.AdminFilter(owner_only=True))
+    whitelist_middleware = bot.WhitelistMiddleware()
+    dispatcher.message.outer_middleware(whitelist_middleware)
+    dispatcher.callback_query.outer_middleware(whitelist_middleware)
+    return dispatcher
+
+
+@pytest.fixture
+def admin_chat(db, _dispatcher):
+    # Fresh FSM storage for every test, the owner of the bot has access to the default community.
+    # Chats are locked by the shared scheduler, as handlers lock them outside of updates too
+    from scheduling import chat_scheduler
+    _dispatcher.fsm.storage = MemoryStorage()
+    _dispatcher.fsm.events_isolation = chat_scheduler
+    return PrivateChat(_dispatcher, ADMIN_USER_ID)
@@ -0,0 +1,41 @@
+import pytest
+
+from callbacks import (
+    ALL_CATEGORIES, CALLBACK_ARITY, MAX_CALLBACK_DATA_LENGTH, Callback, CallbackKind, decode_callback,
+    encode_callback,
+)
+
+
+@pytest.mark.parametrize('kind', list(CallbackKind))
+@pytest.mark.parametrize('value', [0, 1, 127, 128, 2 ** 31, 2 ** 63 - 1])
+def test_every_kind_round_trips(kind, value):
+    args = (value,) * CALLBACK_ARITY[kind]
+    data = encode_callback(kind, *args)
+    assert len(data) <= MAX_CALLBACK_DATA_LENGTH
+    assert decode_callback(data) == Callback(kind, args)
+
+
+def test_invalid_arguments_are_rejected():
+    with pytest.raises(ValueError):
+        encode_callback(CallbackKind.EDIT)
+    with pytest.raises(ValueError):
+        encode_callback(CallbackKind.EDIT, -1)
+
+
+@pytest.mark.parametrize('data', [
+    '', 'garbage', encode_callback(CallbackKind.EDIT, 5) + 'AA', encode_callback(CallbackKind.EDIT, 5)[:-1],
+])
+def test_invalid_data_is_ignored(data):
+    assert decode_callback(data) is None
+
+
+@pytest.mark.parametrize('data, expected', [
+    ('main_menu', Callback(CallbackKind.MAIN_MENU, ())),
+    ('edit_42', Callback(CallbackKind.EDIT, (42,))),
+    ('editcat_42_3', Callback(CallbackKind.EDIT_CATEGORY, (42, 3))),
+    ('myprayers_cat_all', Callback(CallbackKind.MY_PRAYERS_CATEGORY, (ALL_CATEGORIES,))),
+    ('cat_page_3_20', Callback(CallbackKind.CATEGORY_PAGE, (3, 20))),
+    ('edit_x', None),
+])
+def test_legacy_buttons_are_decoded(data, expected):
+    assert decode_callback(data) == expected
@@ -0,0 +1,20 @@
+import asyncio
+
+from audit import audit_log
+from communities import create_community
+
+
+def test_community_titles_are_escaped_in_messages(db, admin_chat):
+    create_community(-100, 'A<B & C')
+    db.get_cursor().execute("UPDATE communities SET title = 'A<B & C' WHERE id = 1")
+    db.get_connection().commit()
+
+    async def run():
+        for command in ('/stats', '/community', '/whitelist_list', '/admin_add 7'):
+            await admin_chat.send(command)
+        audit_log.flush()
+        await admin_chat.send('/audit')
+
+    asyncio.run(run())
+    assert len([text for text in admin_chat.texts if 'A&lt;B &amp; C' in text]) == 5
+    assert not any('A<B' in text for text in admin_chat.texts)
@@ -0,0 +1,93 @@
+import asyncio
+import random
+
+import backup
+import services
+
+WORKERS = 50
+OPERATIONS = 40
+
+
+def test_concurrent_operations_on_the_shared_connection(db, tmp_path):
+    """
+    Many coroutines insert, read, edit, delete and restore prayers on the one
+    shared connection while a backup copies it from a worker thread. Every
+    operation must see only its own result set and leave the stats consistent.
+    """
+    categories = [category_id for category_id, _ in db.get_all_categories(1)]
+    inserted = {}
+    read_rows = []
+
+    async def worker(user_id):
+        random_ = random.Random(user_id)
+        own = []
+        for number in range(OPERATIONS):
+            operation = random_.random()
+            if operation < 0.4 or not own:
+                text = f"user {user_id} prayer {number}"
+                prayer_id = services.insert_prayer(1, user_id, f'user{user_id}', text, random_.choice(categories))
+                assert prayer_id is not None
+                inserted[prayer_id] = text
+                own.append(prayer_id)
+            elif operation < 0.7:
+                read_rows.extend(services.fetch_all_prayers(1, limit=20, offset=random_.randrange(0, 200)))
+                for row in services.fetch_user_prayers_page(1, user_id, limit=5):
+                    assert row[1].startswith(f"user {user_id} prayer ")
+            elif operation < 0.8:
+                prayer_id = random_.choice(own)
+                text = f"user {user_id} prayer {number} edited"
+                assert services.update_prayer(1, prayer_id, text, random_.choice(categories)) is not None
+                inserted[prayer_id] = text
+            elif operation < 0.9:
+                prayer_id = own.pop()
+                assert services.delete_prayer(1, prayer_id) is not None
+                if random_.random() < 0.5:
+                    assert services.restore_prayer(1, prayer_id) is not None
+                    own.append(prayer_id)
+                else:
+                    del inserted[prayer_id]
+            else:
+                # A category cache miss in the middle of other operations
+                db.add_category(1, f"category {user_id}")
+            await asyncio.sleep(0)
+
+    async def run():
+        backup_task = asyncio.create_task(asyncio.to_thread(backup.create_backup_sync, str(tmp_path / 'backups')))
+        await asyncio.gather(*(worker(user_id) for user_id in range(1, WORKERS + 1)))
+        return await backup_task
+
+    backup_path = asyncio.run(run())
+
+    cursor = db.get_cursor()
+    cursor.execute('SELECT id, prayer FROM prayers WHERE deleted_at IS NULL')
+    assert dict(cursor.fetchall()) == inserted
+
+    # Rows read by one operation belong to the prayers they describe
+    for row in read_rows:
+        assert row[0].startswith(f"user {row[7]} prayer ")
+
+    # The daily stats follow every insert, edit, delete and restore
+    cursor.execute('SELECT category_id, SUM(prayers) FROM daily_stats WHERE community_id = 1 GROUP BY category_id HAVING SUM(prayers) != 0')
+    stats = dict(cursor.fetchall())
+    cursor.execute('SELECT category_id, COUNT(*) FROM prayers WHERE deleted_at IS NULL GROUP BY category_id')
+    assert stats == dict(cursor.fetchall())
+
+    assert backup_path.endswith('.db.gz')
+    assert cursor.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+
+
+def test_failed_write_leaves_nothing_for_the_next_commit(db, monkeypatch):
+    def failing_stats(*args):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(services, '_update_daily_stats', failing_stats)
+        try:
+            services.insert_prayer(1, 10, 'user10', 'interrupted prayer', None)
+        except KeyboardInterrupt:
+            pass
+    services.subscribe(10, 1, 1)
+
+    cursor = db.get_cursor()
+    assert cursor.execute('SELECT COUNT(*) FROM prayers').fetchone()[0] == 0
+    assert cursor.execute('SELECT COUNT(*) FROM subscriptions').fetchone()[0] == 1
@@ -0,0 +1,187 @@
+import asyncio
+
+import handlers
+from callbacks import CallbackKind
+from services import get_prayer_by_id, insert_prayer
+
+
+def prayers(db):
+    return db.get_cursor().execute('SELECT prayer, category_id FROM prayers ORDER BY id').fetchall()
+
+
+def category_id(db, name):
+    return next(category_id for category_id, category_name in db.get_all_categories(1) if category_name == name)
+
+
+def test_parts_of_a_draft_are_saved_as_one_prayer(db, admin_chat):
+    category = category_id(db, 'Подяки')
+
+    async def run():
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('first part')
+        await admin_chat.send('second part')
+        assert prayers(db) == []
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert prayers(db) == [('first part\nsecond part', category)]
+    assert admin_chat.alerts == ["Цю чернетку вже збережено або скасовано."]
+
+
+def test_abandoned_draft_is_not_joined_to_the_next_prayer(db, admin_chat):
+    category = category_id(db, 'Подяки')
+
+    async def run():
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('abandoned text')
+        # The user starts over without saving the draft
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('new prayer')
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert prayers(db) == [('new prayer', category)]
+
+
+def test_abandoned_edit_does_not_change_the_prayer(db, admin_chat):
+    category = category_id(db, 'Подяки')
+    edited_id = insert_prayer(1, admin_chat.user.id, 'admin', 'edited prayer', category)
+
+    async def run():
+        await admin_chat.press(CallbackKind.EDIT_CATEGORY, edited_id, category)
+        # The user leaves the edit for a new prayer
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('new prayer')
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert get_prayer_by_id(1, edited_id)[0] == 'edited prayer'
+    assert prayers(db) == [('edited prayer', category), ('new prayer', category)]
+
+
+def test_draft_is_kept_when_the_prayer_could_not_be_saved(db, admin_chat, monkeypatch):
+    category = category_id(db, 'Подяки')
+
+    async def run():
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('kept text')
+        with monkeypatch.context() as patch:
+            patch.setattr(handlers, 'insert_prayer', lambda *args: None)
+            await admin_chat.press(CallbackKind.DRAFT_DONE)
+        assert admin_chat.texts[-1].startswith("⚠️ Не вдалося зберегти молитву")
+        # "Done" works again once the database is back
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert prayers(db) == [('kept text', category)]
+
+
+def test_repeated_prayer_is_reported_as_already_saved(db, admin_chat):
+    category = category_id(db, 'Подяки')
+
+    async def run():
+        for _ in range(2):
+            await admin_chat.send('/send_prayer')
+            await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+            await admin_chat.send('same prayer')
+            await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert prayers(db) == [('same prayer', category)]
+    assert admin_chat.texts[-1] == "Цю молитву вже записано."
+
+
+def test_edit_of_a_deleted_prayer_is_not_reported_as_saved(db, admin_chat):
+    category = category_id(db, 'Подяки')
+    prayer_id = insert_prayer(1, admin_chat.user.id, 'admin', 'edited prayer', category)
+
+    async def run():
+        await admin_chat.press(CallbackKind.EDIT_CATEGORY, prayer_id, category)
+        await admin_chat.send('new text')
+        db.get_cursor().execute('DELETE FROM prayers')
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert admin_chat.texts[-1].startswith("⚠️ Молитву не знайдено")
+
+
+def test_preview_lost_in_a_restart_is_shown_again(db, admin_chat, monkeypatch):
+    from storage import SQLiteStorage
+    category = category_id(db, 'Подяки')
+    monkeypatch.setattr(handlers, 'DRAFT_DEBOUNCE', 0)
+    admin_chat.dispatcher.fsm.storage = SQLiteStorage()
+
+    async def run():
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('interrupted draft')
+        # The bot stops before the preview is shown, then starts with an empty cache
+        await handlers.cancel_draft_previews()
+        admin_chat.dispatcher.fsm.storage = SQLiteStorage()
+        await handlers.resume_draft_previews(admin_chat.bot, admin_chat.dispatcher)
+        await asyncio.sleep(0.01)
+        previews = [text for text in admin_chat.texts if text.startswith("📝")]
+        # A shown preview is not sent again after the next restart
+        await handlers.resume_draft_previews(admin_chat.bot, admin_chat.dispatcher)
+        await asyncio.sleep(0.01)
+        return previews
+
+    previews = asyncio.run(run())
+    assert len(previews) == 1 and 'interrupted draft' in previews[0]
+    assert [text for text in admin_chat.texts if text.startswith("📝")] == previews
+
+
+def test_pending_previews_are_cancelled_on_shutdown(db, admin_chat):
+    category = category_id(db, 'Подяки')
+
+    async def run():
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('draft')
+        timers = list(handlers._draft_timers.values())
+        await handlers.cancel_draft_previews()
+        return timers
+
+    timers = asyncio.run(run())
+    assert len(timers) == 1 and timers[0].cancelled()
+    assert handlers._draft_timers == {}
+
+
+def test_draft_saved_while_its_preview_is_sent_stays_saved(db, admin_chat, monkeypatch):
+    from storage import SQLiteStorage
+    category = category_id(db, 'Подяки')
+    monkeypatch.setattr(handlers, 'DRAFT_DEBOUNCE', 0)
+    admin_chat.dispatcher.fsm.storage = SQLiteStorage()
+    session = admin_chat.bot.session
+    make_request = session.make_request
+
+    async def run():
+        preview_started, preview_sent = asyncio.Event(), asyncio.Event()
+
+        async def slow_preview(bot, method, timeout=None):
+            if (getattr(method, 'text', None) or '').startswith("📝"):
+                preview_started.set()
+                await preview_sent.wait()
+            return await make_request(bot, method, timeout)
+
+        monkeypatch.setattr(session, 'make_request', slow_preview)
+        await admin_chat.send('/send_prayer')
+        await admin_chat.press(CallbackKind.SELECT_CATEGORY, category)
+        await admin_chat.send('saved prayer')
+        await preview_started.wait()
+        # "Done" is pressed while the preview is on its way
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+        preview_sent.set()
+        await asyncio.sleep(0.01)
+        await admin_chat.press(CallbackKind.DRAFT_DONE)
+
+    asyncio.run(run())
+    assert prayers(db) == [('saved prayer', category)]
+    assert db.get_cursor().execute('SELECT COUNT(*) FROM fsm_states').fetchone()[0] == 0
+    assert admin_chat.alerts == ["Цю чернетку вже збережено або скасовано."]
@@ -0,0 +1,26 @@
+import services
+
+
+def add_copy(text):
+    # Copies sent long ago are not merged on insert
+    services._recent_hashes.clear()
+    return services.insert_prayer(1, 10, 'user10', text, None)
+
+
+def test_archived_copies_are_merged_with_their_dependent_rows(db):
+    first_id, second_id = add_copy('same prayer'), add_copy('Same prayer')
+    services.archive_prayers_batch('9999')
+    third_id = add_copy('same  prayer')
+    services.upsert_reminder(10, 10, second_id, 86400, '2000-01-01T00:00:00')
+    services.update_prayer(1, third_id, 'SAME prayer')
+
+    groups = services.find_duplicate_prayers(1)
+    assert groups == [[first_id, second_id, third_id]]
+    assert services.merge_duplicate_prayers(groups) == 2
+
+    cursor = db.get_cursor()
+    assert cursor.execute('SELECT id FROM all_prayers').fetchall() == [(first_id,)]
+    assert cursor.execute('SELECT prayer_id FROM reminders').fetchall() == [(first_id,)]
+    assert cursor.execute('SELECT prayer_id FROM prayer_revisions').fetchall() == []
+    assert cursor.execute('SELECT SUM(prayers) FROM daily_stats').fetchone()[0] == 1
+    assert services.count_all_prayers(1) == 1
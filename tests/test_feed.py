@@ -0,0 +1,57 @@
+import services
+
+
+def add_prayers(texts):
+    for text in texts:
+        services.insert_prayer(1, 10, 'user10', text, None)
+
+
+def page_texts(offset, limit, count_hot=True):
+    return [row[0] for row in services.fetch_all_prayers(1, limit=limit, offset=offset, count_hot=count_hot)]
+
+
+def record_counts(db):
+    statements = []
+    db.get_connection().set_trace_callback(statements.append)
+    return lambda: [statement for statement in statements if 'COUNT(' in statement]
+
+
+def test_feed_continues_from_hot_prayers_into_the_archive(db):
+    add_prayers(f'archived {i}' for i in range(7))
+    services.archive_prayers_batch('9999')
+    add_prayers(f'hot {i}' for i in range(5))
+    expected = [f'hot {i}' for i in reversed(range(5))] + [f'archived {i}' for i in reversed(range(7))]
+
+    pages = [page_texts(offset, 3) for offset in range(0, 12, 3)]
+    assert sum(pages, []) == expected
+
+
+def test_pages_of_hot_prayers_are_not_counted(db):
+    add_prayers(f'archived {i}' for i in range(7))
+    services.archive_prayers_batch('9999')
+    add_prayers(f'hot {i}' for i in range(5))
+    counts = record_counts(db)
+
+    # A full page and the page where the hot prayers end need no count
+    page_texts(0, 3)
+    page_texts(3, 3)
+    assert counts() == []
+
+    # A page past all hot prayers counts them only when counting is allowed
+    assert page_texts(6, 3, count_hot=False) == ['archived 5', 'archived 4', 'archived 3']
+    assert counts() == []
+    services.invalidate_hot_counts(1)
+    assert page_texts(6, 3) == ['archived 5', 'archived 4', 'archived 3']
+    assert len(counts()) == 1
+
+
+def test_new_prayer_does_not_shift_the_archive_in_degraded_mode(db):
+    add_prayers(f'archived {i}' for i in range(7))
+    services.archive_prayers_batch('9999')
+    add_prayers(f'hot {i}' for i in range(5))
+    page_texts(0, 3)
+    page_texts(3, 3)
+
+    # The feed has one more hot prayer than the count seen on the last page
+    add_prayers(['hot 5'])
+    assert page_texts(6, 3, count_hot=False) == ['archived 6', 'archived 5', 'archived 4']
@@ -0,0 +1,37 @@
+import asyncio
+import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+
+from lifecycle import Lifecycle
+from scheduling import ChatScheduler
+
+
+def test_updates_waiting_for_their_chat_are_drained(admin_chat):
+    chat_scheduler = ChatScheduler()
+    dispatcher = Dispatcher(storage=MemoryStorage(), events_isolation=chat_scheduler)
+    lifecycle = Lifecycle(drain_timeout=1)
+    lifecycle.setup(dispatcher)
+    dispatcher.update.outer_middleware(chat_scheduler)
+    message = Message(
+        message_id=1, date=datetime.datetime.now(), chat=Chat(id=1, type='private'),
+        from_user=User(id=1, is_bot=False, first_name='User'), text='waiting',
+    )
+
+    async def run():
+        key = StorageKey(bot_id=42, chat_id=1, user_id=1)
+        async with chat_scheduler.lock(key):
+            update = asyncio.create_task(dispatcher.feed_update(admin_chat.bot, Update(update_id=1, message=message)))
+            await asyncio.sleep(0.01)
+            waiting = lifecycle.in_flight
+            drained = asyncio.create_task(lifecycle.drain())
+            await asyncio.sleep(0.01)
+            drained_early = drained.done()
+        await update
+        await drained
+        return waiting, drained_early
+
+    assert asyncio.run(run()) == (1, False)
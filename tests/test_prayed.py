@@ -0,0 +1,36 @@
+import asyncio
+
+import counters
+import handlers
+import purge
+from callbacks import CallbackKind
+from services import insert_prayer
+
+
+def test_marks_survive_a_restored_delete_and_go_with_a_purge(db, admin_chat, monkeypatch):
+    prayed_counter = counters.PrayedCounter()
+    monkeypatch.setattr(handlers, 'prayed_counter', prayed_counter)
+    monkeypatch.setattr(purge, 'prayed_counter', prayed_counter)
+    flushed_id = insert_prayer(1, admin_chat.user.id, 'admin', 'flushed in the undo window', None)
+    pending_id = insert_prayer(1, admin_chat.user.id, 'admin', 'pending until the restore', None)
+
+    async def run():
+        await admin_chat.press(CallbackKind.PRAYED, flushed_id)
+        await admin_chat.press(CallbackKind.DELETE, flushed_id)
+        prayed_counter.flush()
+        await admin_chat.press(CallbackKind.PRAYED, pending_id)
+        await admin_chat.press(CallbackKind.DELETE, pending_id)
+        for prayer_id in (flushed_id, pending_id):
+            await admin_chat.press(CallbackKind.UNDO_DELETE, prayer_id)
+        counts = prayed_counter.get_counts([flushed_id, pending_id])
+
+        # Once the prayer is purged, its marks are gone too
+        await admin_chat.press(CallbackKind.DELETE, pending_id)
+        db.get_cursor().execute("UPDATE prayers SET deleted_at = '2000-01-01T00:00:00' WHERE id = ?", (pending_id,))
+        await purge.PurgeManager().purge()
+        return counts
+
+    assert asyncio.run(run()) == {flushed_id: 1, pending_id: 1}
+    assert prayed_counter._pending == {}
+    prayed_counter.flush()
+    assert db.get_cursor().execute('SELECT prayer_id FROM prayed_marks').fetchall() == [(flushed_id,)]
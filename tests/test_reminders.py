@@ -0,0 +1,31 @@
+import asyncio
+
+import reminders
+import services
+
+
+def test_reminder_of_deleted_prayer_survives_until_restore(db, monkeypatch):
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(reminders.sender, 'send_message', send_message)
+    scheduler = reminders.ReminderScheduler()
+    prayer_id = services.insert_prayer(1, 10, 'user10', 'deleted prayer', None)
+    purged_id = services.insert_prayer(1, 10, 'user10', 'purged prayer', None)
+    reminder_id = services.upsert_reminder(10, 10, prayer_id, 100, 1000)
+    purged_reminder_id = services.upsert_reminder(10, 10, purged_id, 100, 1000)
+    cursor = db.get_cursor()
+    cursor.execute('DELETE FROM prayers WHERE id = ?', (purged_id,))
+
+    # The reminder fires during the undo window
+    services.delete_prayer(1, prayer_id)
+    asyncio.run(scheduler._fire([(1000, reminder_id), (1000, purged_reminder_id)], 1050))
+    assert sent == []
+    assert cursor.execute('SELECT id, next_run_at FROM reminders').fetchall() == [(reminder_id, 1100)]
+
+    services.restore_prayer(1, prayer_id)
+    asyncio.run(scheduler._fire([(1100, reminder_id)], 1150))
+    assert len(sent) == 1 and 'deleted prayer' in sent[0][1]
+    assert cursor.execute('SELECT next_run_at FROM reminders').fetchall() == [(1200,)]
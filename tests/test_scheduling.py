@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+import itertools
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+
+from scheduling import ChatScheduler
+
+_ids = itertools.count(1)
+
+
+class Flow(StatesGroup):
+    waiting = State()
+
+
+def message_update(chat_id, text):
+    return Update(update_id=next(_ids), message=Message(
+        message_id=next(_ids), date=datetime.datetime.now(), text=text,
+        chat=Chat(id=chat_id, type='private'), from_user=User(id=chat_id, is_bot=False, first_name='User'),
+    ))
+
+
+def build_dispatcher(scheduler, router):
+    dp = Dispatcher(storage=MemoryStorage(), events_isolation=scheduler)
+    dp.update.outer_middleware(scheduler)
+    dp.include_router(router)
+    return dp
+
+
+def test_next_update_of_a_chat_sees_the_state_set_by_the_previous_one():
+    seen = []
+    router = Router()
+
+    @router.message(F.text == 'start')
+    async def start(message: Message, state: FSMContext):
+        # The second update arrives while the first one is still being handled
+        await asyncio.sleep(0.05)
+        await state.set_state(Flow.waiting)
+        seen.append('start')
+
+    @router.message(Flow.waiting)
+    async def in_state(message: Message):
+        seen.append('in state')
+
+    @router.message()
+    async def without_state(message: Message):
+        seen.append('without state')
+
+    async def run():
+        scheduler = ChatScheduler()
+        dp = build_dispatcher(scheduler, router)
+        bot = Bot(token='42:TEST')
+        await asyncio.gather(
+            dp.feed_update(bot, message_update(1, 'start')),
+            dp.feed_update(bot, message_update(1, 'prayer text')),
+        )
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert seen == ['start', 'in state']
+    assert scheduler.waiting == 0 and not scheduler._chats
+
+
+def test_updates_of_a_chat_are_ordered_and_chats_share_the_workers():
+    handled = []
+    running = [0, 0]
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        running[0] += 1
+        running[1] = max(running[1], running[0])
+        await asyncio.sleep(0.001 * (int(message.text) % 3))
+        handled.append((message.chat.id, int(message.text)))
+        running[0] -= 1
+
+    async def run():
+        dp = build_dispatcher(ChatScheduler(workers=3), router)
+        bot = Bot(token='42:TEST')
+        await asyncio.gather(*(dp.feed_update(bot, message_update(100 + i % 10, str(i))) for i in range(100)))
+
+    asyncio.run(run())
+    by_chat = {}
+    for chat_id, number in handled:
+        by_chat.setdefault(chat_id, []).append(number)
+    assert len(handled) == 100
+    assert all(numbers == sorted(numbers) for numbers in by_chat.values())
+    assert running[1] == 3
@@ -0,0 +1,52 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from handlers import PrayerStates
+from storage import SQLiteStorage
+
+
+def key(chat_id, thread_id=None, business_connection_id=None):
+    return StorageKey(
+        bot_id=42, chat_id=chat_id, user_id=chat_id, thread_id=thread_id,
+        business_connection_id=business_connection_id,
+    )
+
+
+def test_states_and_data_survive_a_restart(db):
+    async def save():
+        storage = SQLiteStorage()
+        await storage.set_state(key(1), PrayerStates.expecting_prayer)
+        await storage.set_data(key(1), {'draft_parts': ['перша', 'друга']})
+        await storage.set_state(key(2, 7, 'biz:1'), PrayerStates.expecting_prayer)
+        await storage.set_data(key(3), {'selected_category_id': 5})
+        await storage.close()
+
+    async def load():
+        storage = SQLiteStorage()
+        return (
+            await storage.get_state(key(1)), await storage.get_data(key(1)),
+            await storage.get_state(key(3)), await storage.get_data(key(3)),
+            sorted(storage.find_states(PrayerStates.expecting_prayer.state), key=lambda found: found[0].chat_id),
+        )
+
+    asyncio.run(save())
+    assert asyncio.run(load()) == (
+        PrayerStates.expecting_prayer.state, {'draft_parts': ['перша', 'друга']},
+        None, {'selected_category_id': 5},
+        [(key(1), {'draft_parts': ['перша', 'друга']}), (key(2, 7, 'biz:1'), {})],
+    )
+
+
+def test_cleared_and_stale_states_are_removed(db):
+    async def run():
+        storage = SQLiteStorage(cache_size=1)
+        await storage.set_state(key(1), PrayerStates.expecting_prayer)
+        await storage.set_data(key(1), {'draft_parts': ['текст']})
+        await storage.set_state(key(1))
+        await storage.set_data(key(1), {})
+        await storage.set_state(key(2), PrayerStates.expecting_prayer)
+        count = db.get_cursor().execute('SELECT COUNT(*) FROM fsm_states').fetchone()[0]
+        return count, storage.delete_stale('9999'), await storage.get_state(key(2))
+
+    assert asyncio.run(run()) == (1, 1, None)
@@ -0,0 +1,37 @@
+import asyncio
+import datetime
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, User
+
+import bot
+from handlers import PrayerStates
+
+
+def test_sixth_quick_prayer_part_is_rejected(admin_chat):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.text)
+
+    async def run():
+        throttling_middleware = bot.ThrottlingMiddleware()
+        state = FSMContext(MemoryStorage(), StorageKey(bot_id=42, chat_id=1, user_id=1))
+        user, chat = User(id=1, is_bot=False, first_name='User'), Chat(id=1, type='private')
+
+        async def send(text):
+            message = Message(message_id=1, date=datetime.datetime.now(), chat=chat, from_user=user, text=text)
+            await throttling_middleware(handler, message.as_(admin_chat.bot), {'state': state})
+
+        await send('before the prayer')
+        await state.set_state(PrayerStates.expecting_prayer)
+        for part in range(6):
+            await send(f'part {part}')
+        await state.clear()
+        await send('after the prayer')
+
+    asyncio.run(run())
+    assert handled == ['before the prayer'] + [f'part {part}' for part in range(5)] + ['after the prayer']
+    assert admin_chat.texts == ["⏳ Забагато запитів. Будь ласка, зачекайте трохи та спробуйте знову."]
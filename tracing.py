@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from logs import correlation_id
+
+# Get logger
+logger = logging.getLogger(__name__)
+
+# Share of updates that are traced, 0 disables tracing
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+
+# File the finished traces are appended to, one span per line in the OTLP JSON span layout
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+
+# Spans waiting for the writer thread, when the queue is full new traces are dropped
+TRACE_QUEUE_SIZE = 10000
+
+# SQL statements are cut to this length in span attributes
+TRACE_STATEMENT_LENGTH = 200
+
+# Span being recorded in the current update, None if the update is not traced
+_current_span: ContextVar = ContextVar('current_span', default=None)
+
+# Returned instead of a span when the update is not traced
+_NO_SPAN = nullcontext()
+
+class Span:
+    """
+    Timed operation of a traced update. Spans of one update form a tree
+    under the span of the update and are exported together when it ends.
+    """
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent', 'name', 'attributes', 'start_ns', 'end_ns',
+                 'error', 'spans', '_token')
+
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.trace_id = parent.trace_id if parent else f'{random.getrandbits(128):032x}'
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_ns = self.end_ns = 0
+        self.error = None
+        # All spans of the trace, kept by the root span
+        self.spans = parent.spans if parent else []
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        self.spans.append(self)
+        if self.parent is None:
+            self.tracer.export(self.spans)
+        return False
+
+    def to_json(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent.span_id if self.parent else '',
+            'name': self.name,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'attributes': self.attributes,
+        }
+        if self.error:
+            span['status'] = {'code': 'ERROR', 'message': self.error}
+        return span
+
+class Tracer:
+    """
+    Samples updates and records spans of the sampled ones. Finished traces
+    are written to TRACE_FILE by a background thread, so the event loop
+    only puts them into a queue. For updates that are not sampled, span()
+    costs one context variable lookup.
+    """
+
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, path=TRACE_FILE):
+        self.sample_rate = sample_rate
+        self.path = path
+        self._queue = queue.Queue(TRACE_QUEUE_SIZE)
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start_trace(self, name, **attributes):
+        # Root span of an update, only for sampled updates
+        if not self.enabled or random.random() >= self.sample_rate:
+            return _NO_SPAN
+        return Span(self, name, attributes=attributes)
+
+    def span(self, name, **attributes):
+        # Child span of the current span, only inside a traced update
+        parent = _current_span.get()
+        if parent is None:
+            return _NO_SPAN
+        return Span(self, name, parent, attributes)
+
+    def export(self, spans):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write, name='trace-writer', daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait([span.to_json() for span in spans])
+        except queue.Full:
+            pass
+
+    def stop(self):
+        # Write the traces left in the queue
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _write(self):
+        while True:
+            spans = self._queue.get()
+            if spans is None:
+                return
+            try:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    for span in spans:
+                        file.write(json.dumps(span, ensure_ascii=False, default=str) + '\n')
+            except Exception as e:
+                logger.error(f"Error writing traces: {str(e)}")
+
+# Shared tracer
+tracer = Tracer()
+
+# Check if the current update is traced
+def is_traced():
+    return _current_span.get() is not None
+
+# Start a child span of the current span, does nothing if the update is not traced
+def span(name, **attributes):
+    return tracer.span(name, **attributes)
+
+# Cursor that records a span for every statement of a traced update
+class TracedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, parameters=()):
+        with span('db.execute', statement=' '.join(sql.split())[:TRACE_STATEMENT_LENGTH]):
+            self._cursor.execute(sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        with span('db.executemany', statement=' '.join(sql.split())[:TRACE_STATEMENT_LENGTH]):
+            self._cursor.executemany(sql, seq_of_parameters)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# Connection that records spans for commits and statements of a traced update
+class TracedConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return TracedCursor(self._connection.cursor())
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def commit(self):
+        with span('db.commit'):
+            self._connection.commit()
+
+    def rollback(self):
+        with span('db.rollback'):
+            self._connection.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+# Middleware that records a span for every sampled update
+class TracingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        with tracer.start_trace(f'update {event.event_type}', update_id=event.update_id,
+                                correlation_id=correlation_id.get()):
+            return await handler(event, data)
+
+# Middleware that records a span for the handler of a traced message, callback or inline query
+class HandlerTracingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not is_traced():
+            return await handler(event, data)
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'handler')
+        with span(f'handler {name}'):
+            return await handler(event, data)
+
+# Bot session middleware that records a span for every Bot API call of a traced update
+class BotRequestTracingMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        if not is_traced():
+            return await make_request(bot, method)
+        with span(f'bot {type(method).__name__}'):
+            return await make_request(bot, method)